@@ -0,0 +1,142 @@
+"""
+Headless benchmark of the audiogram estimators with simulated listeners.
+
+Each simulated listener has true thresholds at every FREQS entry, a
+logistic 2AFC psychometric function (slope, lapse rate) and answers the
+trials chosen by the real TrackScheduler / estimator classes from gui.py.
+Thousands of audiograms are spread over a process pool.
+
+Reported per configuration:
+  - trials per frequency and per audiogram
+  - bias / RMS error of threshold() against the true threshold
+  - bias / RMS error of the EQ gains that compute_eq_from_thresholds()
+    derives from the estimated vs. the true thresholds
+
+    python benchmark.py -n 2000
+    python benchmark.py --method "Psi (Bayesian)" --interleave
+    python benchmark.py --set STEP_SMALL=1 --sweep STOP_REVERSALS=4,6,8
+"""
+import argparse, itertools, time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import gui
+import psi_estimator
+from overrides import overridden, parse_value
+
+CHUNK = 50   # audiograms per pool task
+
+
+# =========================
+# Simulated listener
+# =========================
+def draw_thresholds(rng, n):
+    """(n, len(FREQS)) true thresholds: flat base + sloping high-frequency loss."""
+    freqs = np.asarray(gui.FREQS, dtype=float)
+    base = rng.uniform(-65.0, -45.0, size=(n, 1))
+    hf = np.clip(np.log2(freqs / 1000.0), 0.0, None)[None, :] / 3.0
+    loss = rng.uniform(0.0, 25.0, size=(n, 1)) * hf
+    return np.clip(base + loss + rng.normal(0.0, 2.0, size=(n, len(freqs))), gui.MIN_DB + 5, gui.MAX_DB - 5)
+
+
+def run_audiogram(thr, rng, method, slope, lapse, interleave, tracks):
+    """One simulated audiogram. Returns (estimated thresholds, trials per freq)."""
+    true = dict(zip(gui.FREQS, thr))
+    sched = gui.TrackScheduler(gui.FREQS, method=method, interleave=interleave, tracks_per_freq=tracks)
+    est = {}
+    while not sched.done():
+        t = sched.next_track()
+        p = psi_estimator.p_correct(t.est.level_db, true[t.freq], slope, lapse=lapse)
+        t.est.update(rng.random() < p)
+        r = sched.trial_done(t)
+        if r is not None:
+            est[t.freq] = r
+    trials = [sum(tr.trials for tr in sched.tracks[f]) for f in gui.FREQS]
+    return [est[f] for f in gui.FREQS], trials
+
+
+def _eq(thr_row):
+    g500, g2000, g4000, _ = gui.compute_eq_from_thresholds(dict(zip(gui.FREQS, thr_row)))
+    return (g500, g2000, g4000)
+
+
+def _run_chunk(args):
+    seed, n, cfg, overrides = args
+    rng = np.random.default_rng(seed)
+    true = draw_thresholds(rng, n)
+    est = np.empty_like(true)
+    trials = np.empty(true.shape, dtype=np.int32)
+    with overridden(overrides):   # pool processes run the chunks of several configurations
+        for i in range(n):
+            est[i], trials[i] = run_audiogram(true[i], rng, **cfg)
+        eq_true = np.array([_eq(r) for r in true])
+        eq_est = np.array([_eq(r) for r in est])
+    return true, est, trials, eq_true, eq_est
+
+
+# =========================
+# Runner / report
+# =========================
+def run(n, cfg, overrides=None, workers=None, seed=0):
+    overrides = overrides or {}
+    tasks = [(seed + i, min(CHUNK, n - i * CHUNK), cfg, overrides) for i in range((n + CHUNK - 1) // CHUNK)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_run_chunk, tasks))
+    return [np.concatenate(x) for x in zip(*parts)]
+
+
+def report(label, true, est, trials, eq_true, eq_est, elapsed):
+    err = est - true
+    eq_err = eq_est - eq_true
+    n = len(true)
+    print(f"\n== {label}  ({n} audiograms, {elapsed:.1f} s, {n / elapsed:.0f} audiograms/s)")
+    print(f"trials/audiogram: mean {trials.sum(axis=1).mean():.0f}, p95 {np.percentile(trials.sum(axis=1), 95):.0f}")
+    print(f"{'freq':>6} {'trials':>7} {'bias dB':>8} {'RMS dB':>7}")
+    for j, f in enumerate(gui.FREQS):
+        print(f"{f:>6} {trials[:, j].mean():>7.1f} {err[:, j].mean():>8.2f} {np.sqrt((err[:, j] ** 2).mean()):>7.2f}")
+    print(f"{'all':>6} {trials.mean():>7.1f} {err.mean():>8.2f} {np.sqrt((err ** 2).mean()):>7.2f}")
+    print("EQ gain error (estimated vs true thresholds):")
+    for j, band in enumerate(("EQ500", "EQ2000", "EQ4000")):
+        print(f"  {band:>6}: bias {eq_err[:, j].mean():+.2f} dB, RMS {np.sqrt((eq_err[:, j] ** 2).mean()):.2f} dB")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulated-listener benchmark of the audiogram estimators")
+    ap.add_argument("-n", type=int, default=1000, help="audiograms per configuration")
+    ap.add_argument("--method", default=gui.METHOD_STAIRCASE, choices=list(gui.METHODS))
+    ap.add_argument("--interleave", action="store_true")
+    ap.add_argument("--tracks", type=int, default=1, choices=(1, 2))
+    ap.add_argument("--slope", type=float, default=0.3, help="listener psychometric slope (1/dB)")
+    ap.add_argument("--lapse", type=float, default=0.02, help="listener lapse rate")
+    ap.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                    help="override a gui.py / psi_estimator.py constant, e.g. STEP_SMALL=1")
+    ap.add_argument("--sweep", action="append", default=[], metavar="NAME=V1,V2",
+                    help="run every combination of these values")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    fixed = {}
+    for item in args.set:
+        k, v = item.split("=", 1)
+        fixed[k] = parse_value(v)
+    sweep_names, sweep_vals = [], []
+    for item in args.sweep:
+        k, v = item.split("=", 1)
+        sweep_names.append(k)
+        sweep_vals.append([parse_value(x) for x in v.split(",")])
+
+    cfg = dict(method=args.method, slope=args.slope, lapse=args.lapse,
+               interleave=args.interleave, tracks=args.tracks)
+    for combo in itertools.product(*sweep_vals):
+        overrides = dict(fixed, **dict(zip(sweep_names, combo)))
+        label = f"{args.method}{' interleaved' if args.interleave else ''}, {args.tracks} track(s)"
+        if overrides:
+            label += " | " + ", ".join(f"{k}={v}" for k, v in overrides.items())
+        t0 = time.perf_counter()
+        res = run(args.n, cfg, overrides, workers=args.workers, seed=args.seed)
+        report(label, *res, time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Binary framing of the hearing.ino serial protocol.
+
+After "CAPS" lists BIN, the host sends "BIN ON" (ASCII); from the OK on,
+both directions use frames instead of text lines:
+
+    COBS( opcode u8 | seq u8 | payload | CRC-16/CCITT-FALSE u16 LE ) 0x00
+
+The CRC covers opcode..payload. Replies echo the seq of their command;
+DONE has seq 0. Floats are little-endian float32, like on the Teensy.
+The firmware falls back to ASCII on reset, when the port is closed (DTR)
+and on OP_ASCII.
+
+TeensyLink keeps its text API: encode_command() turns a command line
+("SET 1.000 3.0 6.0 9.0") into the matching frame. Standard library only,
+so the emulator can use it too.
+
+The profile bank slot format (STORE) is defined here as well, in both
+modes the same bytes with the same content hash.
+"""
+import binascii, struct, zlib
+
+# =========================
+# Opcodes
+# =========================
+OP_TEST = 0x01      # u8 on
+OP_FREQ = 0x02      # f32 hz
+OP_LEVEL = 0x03     # f32 db
+OP_SET = 0x04       # f32 gain, g500, g2000, g4000
+OP_TRIAL = 0x05     # f32 hz, f32 db, u8 interval, u16 tone_ms, u16 gap_ms
+OP_STATUS = 0x06    # -
+OP_COEF = 0x07      # f32 gain, g500, g2000, g4000, u8 n, n COEF records
+OP_PROFILE = 0x08   # profile name or bank slot number (ASCII)
+OP_BANK = 0x09      # -
+OP_STORE = 0x0A     # u8 slot, u32 hash, slot body
+OP_ERASE = 0x0B     # u8 slot
+OP_ASCII = 0x0F     # back to text lines (after the OK)
+
+OP_OK = 0x80
+OP_ERR = 0x81           # message (ASCII)
+OP_STATUS_REPLY = 0x82  # f32 gain, g500, g2000, g4000
+OP_DONE = 0x83
+OP_BANK_REPLY = 0x84    # i8 active slot, u32 hash per slot
+
+STATUS_KEYS = ("GAIN", "EQ500", "EQ2000", "EQ4000")
+COEF_CHECKSUM_BYTES = 1   # the ASCII COEF payload ends with a checksum, frames have the CRC
+
+_F4 = struct.Struct("<4f")
+_TRIAL = struct.Struct("<ffBHH")
+_COEF_HEAD = struct.Struct("<4fB")
+_STORE_HEAD = struct.Struct("<BI")
+
+
+# =========================
+# COBS + CRC
+# =========================
+def crc16(data: bytes) -> int:
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF)."""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def cobs_encode(data: bytes) -> bytes:
+    out = bytearray()
+    for block in data.split(b"\x00"):
+        while len(block) >= 254:
+            out.append(255)
+            out += block[:254]
+            block = block[254:]
+        out.append(len(block) + 1)
+        out += block
+    return bytes(out)
+
+
+def cobs_decode(data: bytes) -> bytes:
+    out = bytearray()
+    i, n = 0, len(data)
+    while i < n:
+        code = data[i]
+        if code == 0 or i + code > n:
+            raise ValueError("bad COBS frame")
+        out += data[i + 1:i + code]
+        i += code
+        if code < 255 and i < n:
+            out.append(0)
+    return bytes(out)
+
+
+def frame(op: int, seq: int, payload: bytes = b"") -> bytes:
+    body = bytes((op, seq & 0xFF)) + payload
+    return cobs_encode(body + struct.pack("<H", crc16(body))) + b"\x00"
+
+
+def decode_frame(raw: bytes):
+    """(opcode, seq, payload) of one frame without its 0x00. ValueError if corrupt."""
+    body = cobs_decode(raw)
+    if len(body) < 4:
+        raise ValueError("short frame")
+    data, (crc,) = body[:-2], struct.unpack("<H", body[-2:])
+    if crc16(data) != crc:
+        raise ValueError("CRC mismatch")
+    return data[0], data[1], data[2:]
+
+
+# =========================
+# Commands (text line <-> frame)
+# =========================
+def encode_command(cmd: str, seq: int, payload: bytes = b"") -> bytes:
+    """Frame for one TeensyLink command line. ValueError if it has no binary form."""
+    name, _, arg = cmd.strip().partition(" ")
+    name = name.upper()
+    args = arg.split()
+    try:
+        if name == "TEST":
+            return frame(OP_TEST, seq, bytes((arg.strip().upper() == "ON",)))
+        if name == "FREQ":
+            return frame(OP_FREQ, seq, struct.pack("<f", float(args[0])))
+        if name == "LEVEL":
+            return frame(OP_LEVEL, seq, struct.pack("<f", float(args[0])))
+        if name == "SET":
+            return frame(OP_SET, seq, _F4.pack(*map(float, args[:4])))
+        if name == "TRIAL":
+            hz, db, interval, tone_ms, gap_ms = map(float, args[:5])
+            return frame(OP_TRIAL, seq, _TRIAL.pack(hz, db, int(interval), round(tone_ms), round(gap_ms)))
+        if name == "STATUS":
+            return frame(OP_STATUS, seq)
+        if name == "COEF":
+            records = payload[:len(payload) - COEF_CHECKSUM_BYTES]
+            return frame(OP_COEF, seq, _COEF_HEAD.pack(*map(float, args[:4]), int(float(args[4]))) + records)
+        if name == "PROFILE":
+            return frame(OP_PROFILE, seq, arg.strip().encode("ascii"))
+        if name == "BANK":
+            return frame(OP_BANK, seq)
+        if name == "STORE":
+            body = payload[:len(payload) - COEF_CHECKSUM_BYTES]
+            return frame(OP_STORE, seq, _STORE_HEAD.pack(int(args[0]), int(args[1], 16)) + body)
+        if name == "ERASE":
+            return frame(OP_ERASE, seq, bytes((int(args[0]),)))
+        if name == "BIN" and arg.strip().upper() == "OFF":
+            return frame(OP_ASCII, seq)
+    except (IndexError, ValueError, struct.error) as e:
+        raise ValueError(f"{cmd}: {e}") from None
+    raise ValueError(f"{cmd}: no binary form")
+
+
+def decode_command(op: int, payload: bytes):
+    """Inverse of encode_command: (command line, binary payload). ValueError if malformed."""
+    try:
+        if op == OP_TEST:
+            return ("TEST ON" if payload[0] else "TEST OFF"), b""
+        if op == OP_FREQ:
+            return f"FREQ {struct.unpack('<f', payload)[0]}", b""
+        if op == OP_LEVEL:
+            return f"LEVEL {struct.unpack('<f', payload)[0]}", b""
+        if op == OP_SET:
+            return "SET " + " ".join(str(v) for v in _F4.unpack(payload)), b""
+        if op == OP_TRIAL:
+            return "TRIAL " + " ".join(str(v) for v in _TRIAL.unpack(payload)), b""
+        if op == OP_STATUS:
+            return "STATUS", b""
+        if op == OP_COEF:
+            *vals, n = _COEF_HEAD.unpack(payload[:_COEF_HEAD.size])
+            records = payload[_COEF_HEAD.size:]
+            line = "COEF " + " ".join(str(v) for v in vals) + f" {n}"
+            return line, records + bytes([sum(records) & 0xFF])
+        if op == OP_PROFILE:
+            return f"PROFILE {payload.decode('ascii')}", b""
+        if op == OP_BANK:
+            return "BANK", b""
+        if op == OP_STORE:
+            slot, h = _STORE_HEAD.unpack(payload[:_STORE_HEAD.size])
+            body = payload[_STORE_HEAD.size:]
+            return f"STORE {slot} {h:08X} {body[16]}", body + bytes([sum(body) & 0xFF])
+        if op == OP_ERASE:
+            return f"ERASE {payload[0]}", b""
+        if op == OP_ASCII:
+            return "BIN OFF", b""
+    except (IndexError, UnicodeDecodeError, struct.error) as e:
+        raise ValueError(f"opcode {op:#x}: {e}") from None
+    raise ValueError(f"unknown opcode {op:#x}")
+
+
+# =========================
+# Replies
+# =========================
+def encode_reply(lines, seq: int) -> bytes:
+    """Frames for the text reply lines of one command (OK / ERR ... / STATUS ... END)."""
+    if not lines:
+        return b""
+    first = lines[0]
+    if first.startswith("OK BANK "):
+        active, *hashes = first.split()[2:]
+        return frame(OP_BANK_REPLY, seq, struct.pack(f"<b{len(hashes)}I", int(active), *(int(h, 16) for h in hashes)))
+    if first == "OK" or first.startswith("OK "):
+        return frame(OP_OK, seq)
+    if first.startswith("ERR"):
+        return frame(OP_ERR, seq, first[4:].encode("utf-8"))
+    if first == "STATUS":
+        vals = dict(l.split(" ", 1) for l in lines[1:-1])
+        return frame(OP_STATUS_REPLY, seq, _F4.pack(*(float(vals[k]) for k in STATUS_KEYS)))
+    if first == "DONE":
+        return frame(OP_DONE, 0)
+    raise ValueError(f"no binary form for reply {first!r}")
+
+
+def status_dict(payload: bytes) -> dict:
+    return dict(zip(STATUS_KEYS, _F4.unpack(payload)))
+
+
+def bank_line(payload: bytes) -> str:
+    """The text reply ("OK BANK <active> <hash> ...") of an OP_BANK_REPLY payload."""
+    n = (len(payload) - 1) // 4
+    active, *hashes = struct.unpack(f"<b{n}I", payload[:1 + 4 * n])
+    return f"OK BANK {active}" + "".join(f" {h:08X}" for h in hashes)
+
+
+# =========================
+# Profile bank slots
+# =========================
+BANK_NAME_BYTES = 12
+BANK_MAX_RECORDS = 8
+_BANK_HEAD = struct.Struct(f"<4fB{BANK_NAME_BYTES}s")   # gain g500 g2000 g4000, n records, name
+BANK_HEAD_BYTES = _BANK_HEAD.size
+COEF_RECORD_BYTES = 22
+
+
+def bank_slot(name: str, params, records: bytes = b""):
+    """
+    (hash, body) of a bank slot. params = (gain, g500, g2000, g4000);
+    records are COEF stage records (without checksum), empty to let the
+    firmware compute the stages. hash is the CRC-32 of body, 0 never
+    (0 marks an empty slot).
+    """
+    n = len(records) // COEF_RECORD_BYTES
+    if n > BANK_MAX_RECORDS:
+        raise ValueError(f"a bank slot holds at most {BANK_MAX_RECORDS} stages")
+    label = name.encode("ascii", "replace")[:BANK_NAME_BYTES - 1]
+    body = _BANK_HEAD.pack(*map(float, params), n, label) + records[:n * COEF_RECORD_BYTES]
+    h = zlib.crc32(body)
+    if h == 0:
+        raise ValueError("bank slot hash is 0")   # 1 in 2**32: rename the profile
+    return h, body
+
+
+def bank_slot_info(body: bytes):
+    """(name, params, stage count) of a slot body."""
+    *params, n, label = _BANK_HEAD.unpack(body[:_BANK_HEAD.size])
+    return label.rstrip(b"\x00").decode("ascii", "replace"), tuple(params), n
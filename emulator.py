@@ -0,0 +1,569 @@
+"""
+Teensy emulator speaking the hearing.ino serial protocol.
+
+Opens a pseudo-terminal and answers on it like the firmware does, so
+TeensyLink (and the whole GUI) can connect to it as if it were a real
+board. Linux/macOS only (pty).
+
+    python emulator.py                 # print the port path and serve forever
+    python emulator.py --bench         # benchmark TeensyLink against it
+    python emulator.py --latency 0.002 --jitter 0.001 --baud 115200
+    python emulator.py --devices 8 --latency 0.005   # fitting station, 8 units
+"""
+import argparse, os, pty, random, struct, threading, time, tty, zlib
+
+import binary_protocol
+
+# =========================
+# Firmware model
+# =========================
+EQ_MIN_DB, EQ_MAX_DB = -20.0, 30.0
+GAIN_MIN, GAIN_MAX = 0.0, 4.0
+TEST_FREQ_MIN, TEST_FREQ_MAX = 50.0, 12000.0
+TEST_DB_MIN, TEST_DB_MAX = -90.0, -3.0
+NUM_EQ, MAX_STAGES = 3, 4
+
+# COEF payload record: filter, stage, b0 b1 b2 -a1 -a2 (Q30), then a checksum byte
+COEF_RECORD = struct.Struct("<BB5i")
+
+CAPS = ("COEF", "BIN", "BANK")   # optional commands of the current firmware
+
+# factory programs bank.cpp writes to a freshly formatted bank
+FACTORY_PROFILES = (
+    ("ALICE", (1.0, 6.0, 12.0, 18.0)),
+    ("BOB",   (1.0, 0.0,  8.0, 10.0)),
+)
+BANK_SLOTS = 8   # Teensy 4.1 EEPROM (4.0: 5)
+
+
+def clampf(x, lo, hi):
+    return lo if x < lo else hi if x > hi else x
+
+
+def to_float(s: str) -> float:
+    # Arduino String::toFloat(): leading number, 0.0 if none
+    s = s.strip()
+    for i in range(len(s), 0, -1):
+        try:
+            return float(s[:i])
+        except ValueError:
+            pass
+    return 0.0
+
+
+class ProfileBank:
+    """bank.cpp: slot bodies with their CRC-32, kept across resets like the EEPROM."""
+
+    def __init__(self, slots=BANK_SLOTS):
+        self.hashes = [0] * slots
+        self.bodies = [b""] * slots
+        self.active = -1
+        for i, (name, params) in enumerate(FACTORY_PROFILES):
+            self.store(i, *binary_protocol.bank_slot(name, params))
+
+    def store(self, slot, h, body) -> bool:
+        if not (0 <= slot < len(self.hashes)) or h == 0 or len(body) < binary_protocol.BANK_HEAD_BYTES:
+            return False
+        if body[16] > binary_protocol.BANK_MAX_RECORDS or len(body) != binary_protocol.BANK_HEAD_BYTES + body[16] * COEF_RECORD.size:
+            return False
+        if zlib.crc32(body) != h:
+            return False
+        self.hashes[slot], self.bodies[slot] = h, bytes(body)
+        return True
+
+    def erase(self, slot) -> bool:
+        if not 0 <= slot < len(self.hashes):
+            return False
+        self.hashes[slot], self.bodies[slot] = 0, b""
+        if self.active == slot:
+            self.active = -1
+        return True
+
+    def find(self, name) -> int:
+        for i, body in enumerate(self.bodies):
+            if body and binary_protocol.bank_slot_info(body)[0].upper() == name.upper():
+                return i
+        return -1
+
+
+class FirmwareState:
+    """Same state and clamping as dsp.cpp (dspApply / dspSetTest*)."""
+
+    def __init__(self, bank=None):
+        self.gain_global = 1.0
+        self.g500 = 0.0
+        self.g2000 = 0.0
+        self.g4000 = 0.0
+        self.test_mode = False
+        self.test_freq = 1000.0
+        self.test_db = -90.0
+        self.trial_id = 0          # bumped by every TRIAL
+        self.trial_running = False
+        self.trial_seconds = 0.0   # duration of the last TRIAL
+        self.coefs = {}            # (filter, stage) -> Q30 ints loaded by COEF
+        self.caps = CAPS
+        self.binary = False        # BIN ON: frames instead of text lines
+        self.bank = bank if bank is not None else ProfileBank()
+        if self.bank.active >= 0:
+            self.load_slot(self.bank.active)   # power-up: last program used
+
+    def apply(self, gain_global, g500, g2000, g4000):
+        self.gain_global = clampf(gain_global, GAIN_MIN, GAIN_MAX)
+        self.g500 = clampf(g500, EQ_MIN_DB, EQ_MAX_DB)
+        self.g2000 = clampf(g2000, EQ_MIN_DB, EQ_MAX_DB)
+        self.g4000 = clampf(g4000, EQ_MIN_DB, EQ_MAX_DB)
+
+    def params(self):
+        return (self.gain_global, self.g500, self.g2000, self.g4000)
+
+    def load_stages(self, records):
+        """setCoefficients() per record: the stage written last ends that filter's cascade."""
+        for f, st, *c in records:
+            for k in [k for k in self.coefs if k[0] == f and k[1] > st]:
+                del self.coefs[k]
+            self.coefs[(f, st)] = tuple(c)
+
+    def load_slot(self, slot) -> bool:
+        """bankLoad(): apply a bank program and remember it as active."""
+        if not (0 <= slot < len(self.bank.hashes)) or not self.bank.hashes[slot]:
+            return False
+        body = self.bank.bodies[slot]
+        _, params, n = binary_protocol.bank_slot_info(body)
+        self.apply(*params)
+        self.load_stages(COEF_RECORD.iter_unpack(body[binary_protocol.BANK_HEAD_BYTES:][:n * COEF_RECORD.size]))
+        self.bank.active = slot
+        return True
+
+
+def payload_size(line: str) -> int:
+    """Binary bytes following this command line (COEF ... n)."""
+    parts = line.split()
+    if len(parts) == 4 and parts[0].upper() == "STORE":
+        try:
+            n = int(parts[3])
+        except ValueError:
+            return 0
+        if 0 <= n <= binary_protocol.BANK_MAX_RECORDS:
+            return binary_protocol.BANK_HEAD_BYTES + n * COEF_RECORD.size + 1
+        return 0
+    if len(parts) == 6 and parts[0].upper() == "COEF":
+        try:
+            n = int(float(parts[5]))
+        except ValueError:
+            return 0
+        if 0 <= n <= NUM_EQ * MAX_STAGES:
+            return n * COEF_RECORD.size + 1
+    return 0
+
+
+def handle_line(state: FirmwareState, line: str, payload: bytes = b""):
+    """parseCommand() from hearing.ino. Returns the list of reply lines."""
+    line = line.strip()
+    if not line:
+        return []
+    cmd, _, arg = line.partition(" ")
+    cmd = cmd.upper()
+    arg = arg.strip()
+    gain, g500, g2000, g4000 = state.params()
+
+    if cmd == "TEST":
+        if arg.upper() == "ON":
+            state.test_mode = True
+            return ["OK"]
+        if arg.upper() == "OFF":
+            state.test_mode = False
+            return ["OK"]
+        return ["ERR TEST expects ON/OFF"]
+
+    if cmd == "FREQ":
+        state.test_freq = clampf(to_float(arg), TEST_FREQ_MIN, TEST_FREQ_MAX)
+        return ["OK"]
+
+    if cmd == "LEVEL":
+        state.test_db = clampf(to_float(arg), TEST_DB_MIN, TEST_DB_MAX)
+        state.trial_running = False   # LEVEL cancels a running trial
+        return ["OK"]
+
+    if cmd == "TRIAL":
+        try:
+            hz, db, interval, tone_ms, gap_ms = [float(v) for v in arg.split()[:5]]
+        except ValueError:
+            return ["ERR TRIAL expects freq level interval tone_ms gap_ms"]
+        if int(interval) not in (1, 2):
+            return ["ERR TRIAL interval must be 1 or 2"]
+        state.test_freq = clampf(hz, TEST_FREQ_MIN, TEST_FREQ_MAX)
+        state.test_db = clampf(db, TEST_DB_MIN, TEST_DB_MAX)
+        tone_ms = clampf(tone_ms, 10.0, 5000.0)
+        gap_ms = clampf(gap_ms, 0.0, 5000.0)
+        state.trial_id += 1
+        state.trial_running = True
+        state.trial_seconds = (2 * tone_ms + gap_ms) / 1000.0
+        return ["OK"]
+
+    if cmd == "GAIN":
+        state.apply(to_float(arg), g500, g2000, g4000)
+        return ["OK"]
+    if cmd == "EQ500":
+        state.apply(gain, to_float(arg), g2000, g4000)
+        return ["OK"]
+    if cmd == "EQ2000":
+        state.apply(gain, g500, to_float(arg), g4000)
+        return ["OK"]
+    if cmd == "EQ4000":
+        state.apply(gain, g500, g2000, to_float(arg))
+        return ["OK"]
+
+    if cmd == "SET":
+        try:
+            vals = [float(v) for v in arg.split()[:4]]
+        except ValueError:
+            vals = []
+        if len(vals) != 4:
+            return ["ERR SET expects gain g500 g2000 g4000"]
+        state.apply(*vals)
+        return ["OK"]
+
+    if cmd == "COEF":
+        try:
+            vals = [float(v) for v in arg.split()[:5]]
+        except ValueError:
+            vals = []
+        if len(vals) != 5 or not payload_size(line):
+            return ["ERR COEF expects gain g500 g2000 g4000 n"]
+        data, check = payload[:-1], payload[-1:]
+        if len(payload) != payload_size(line) or bytes([sum(data) & 0xFF]) != check:
+            return ["ERR COEF bad payload"]
+        records = list(COEF_RECORD.iter_unpack(data))
+        if any(f >= NUM_EQ or st >= MAX_STAGES for f, st, *_ in records):
+            return ["ERR COEF bad filter/stage"]
+        state.apply(*vals[:4])
+        state.load_stages(records)
+        return ["OK"]
+
+    if cmd == "CAPS":
+        return [" ".join(("OK",) + tuple(state.caps))]
+
+    if cmd == "BIN" and "BIN" in state.caps:
+        if arg.upper() in ("ON", "OFF"):
+            state.binary = arg.upper() == "ON"   # after this reply
+            return ["OK"]
+        return ["ERR BIN expects ON/OFF"]
+
+    if cmd == "PROFILE":
+        slot = int(arg) if arg.isdigit() else state.bank.find(arg)   # "1a" is a name
+        if not state.load_slot(slot):
+            return ["ERR Unknown profile"]
+        return ["OK"]
+
+    if cmd == "BANK" and "BANK" in state.caps:
+        return [f"OK BANK {state.bank.active}" + "".join(f" {h:08X}" for h in state.bank.hashes)]
+
+    if cmd == "STORE" and "BANK" in state.caps:
+        parts = arg.split()
+        need = payload_size(line)
+        if len(parts) != 3 or not need:
+            return ["ERR STORE expects slot hash n"]
+        body, check = payload[:-1], payload[-1:]
+        if len(payload) != need or bytes([sum(body) & 0xFF]) != check:
+            return ["ERR STORE bad payload"]
+        try:
+            slot, h = int(parts[0]), int(parts[1], 16)
+        except ValueError:
+            return ["ERR STORE expects slot hash n"]
+        if not state.bank.store(slot, h, body):
+            return ["ERR STORE bad slot/body"]
+        if state.bank.active == slot:
+            state.load_slot(slot)   # the running program was updated
+        return ["OK"]
+
+    if cmd == "ERASE" and "BANK" in state.caps:
+        if not arg.isdigit() or not state.bank.erase(int(arg)):
+            return ["ERR ERASE bad slot"]
+        return ["OK"]
+
+    if cmd == "STATUS":
+        return [
+            "STATUS",
+            f"GAIN {state.gain_global:.3f}",
+            f"EQ500 {state.g500:.2f}",
+            f"EQ2000 {state.g2000:.2f}",
+            f"EQ4000 {state.g4000:.2f}",
+            "END",
+        ]
+
+    return ["ERR Unknown command"]
+
+
+# =========================
+# pty transport
+# =========================
+class TeensyEmulator:
+    """
+    Serves the firmware protocol on a pty.
+
+    latency      base processing time per command (s)
+    jitter       extra uniform random delay 0..jitter (s)
+    cmd_latency  per-command overrides, e.g. {"SET": 0.004}
+    baud         if set, throttle both directions to baud/10 bytes/s
+    link         stable symlink to the pty, so unplug()/replug() look like
+                 the same board disappearing and coming back
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, cmd_latency=None, baud=None, seed=None, link=None, caps=CAPS):
+        self.latency = latency
+        self.jitter = jitter
+        self.cmd_latency = dict(cmd_latency or {})
+        self.baud = baud
+        self.link = link
+        self.caps = tuple(caps)
+        self.bank = ProfileBank()   # EEPROM: survives replug()
+        self.state = FirmwareState(self.bank)
+        self.state.caps = self.caps
+        self.commands = []          # (monotonic time, line) of every command received
+        self.rx_bytes = 0           # bytes received from the host
+        self.drop_replies = 0       # replies still to swallow, like a lost USB packet
+        self._rng = random.Random(seed)
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def port(self) -> str:
+        return self.link or os.ttyname(self._slave)
+
+    def start(self) -> str:
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        if self.link:
+            if os.path.lexists(self.link):
+                os.remove(self.link)
+            os.symlink(os.ttyname(self._slave), self.link)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._write_lines(["READY"])
+        return self.port
+
+    def stop(self):
+        self._running = False
+        for fd in (self._slave, self._master):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        if self.link and os.path.lexists(self.link):
+            os.remove(self.link)
+
+    def unplug(self):
+        """Cable pulled: the port disappears."""
+        self.stop()
+
+    def replug(self) -> str:
+        """Board plugged back in: fresh firmware state, READY banner."""
+        self.state = FirmwareState(self.bank)
+        self.state.caps = self.caps
+        return self.start()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _throttle(self, nbytes):
+        if self.baud:
+            time.sleep(nbytes * 10.0 / self.baud)
+
+    def _delay(self, line):
+        cmd = line.split(" ", 1)[0].upper()
+        d = self.cmd_latency.get(cmd, self.latency)
+        if self.jitter:
+            d += self._rng.uniform(0.0, self.jitter)
+        if d > 0:
+            time.sleep(d)
+
+    def _write_lines(self, lines):
+        data = "".join(l + "\r\n" for l in lines).encode("utf-8")
+        self._write(data)
+
+    def _write(self, data):
+        self._throttle(len(data))
+        os.write(self._master, data)
+
+    def _run(self):
+        buf = b""
+        while self._running:
+            try:
+                chunk = os.read(self._master, 4096)
+            except OSError:
+                break
+            if not chunk:
+                break
+            self._throttle(len(chunk))
+            self.rx_bytes += len(chunk)
+            buf += chunk
+            while True:
+                if self.state.binary:
+                    if b"\x00" not in buf:
+                        break
+                    raw, buf = buf.split(b"\x00", 1)
+                    try:
+                        op, seq, body = binary_protocol.decode_frame(raw)
+                        line, payload = binary_protocol.decode_command(op, body)
+                    except ValueError:
+                        continue   # like the firmware: bad frames are dropped
+                else:
+                    if b"\n" not in buf:
+                        break
+                    raw, rest = buf.split(b"\n", 1)
+                    line = raw.decode("utf-8", errors="replace").strip()
+                    need = payload_size(line)
+                    if len(rest) < need:
+                        break   # rest of the binary payload not here yet
+                    payload, buf = rest[:need], rest[need:]
+                    seq = None
+                    if not line:
+                        continue
+                self.commands.append((time.monotonic(), line))
+                self._delay(line)
+                trial_id = self.state.trial_id
+                try:
+                    replies = handle_line(self.state, line, payload)
+                    if self.drop_replies and replies:
+                        self.drop_replies -= 1
+                    elif seq is None:
+                        self._write_lines(replies)
+                    else:
+                        self._write(binary_protocol.encode_reply(replies, seq))
+                except (OSError, TypeError):   # stopped meanwhile
+                    return
+                if self.state.trial_id != trial_id:
+                    self._schedule_done(self.state.trial_id, self.state.trial_seconds)
+
+    def _schedule_done(self, trial_id, seconds):
+        # DONE is printed by loop() once the audio clock finished both intervals
+        def fire():
+            st = self.state
+            if st.trial_running and st.trial_id == trial_id and self._running:
+                st.trial_running = False
+                try:
+                    if st.binary:
+                        self._write(binary_protocol.frame(binary_protocol.OP_DONE, 0))
+                    else:
+                        self._write_lines(["DONE"])
+                except (OSError, TypeError):
+                    pass
+        t = threading.Timer(seconds, fire)
+        t.daemon = True
+        t.start()
+
+
+# =========================
+# Benchmark
+# =========================
+def _percentile(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+def bench(emu: TeensyEmulator, n_eq=200, trials_per_freq=20, binary=True):
+    from gui import TeensyLink, FREQS
+
+    link = TeensyLink()
+    link.use_binary = binary
+    link.connect(emu.port)
+    try:
+        print(f"protocol: {'binary frames' if link.binary else 'ASCII lines'}")
+        times = []
+        for i in range(n_eq):
+            t0 = time.perf_counter()
+            link.apply_eq(i % 10, 2.0, 3.0, gain_global=1.0)
+            times.append(time.perf_counter() - t0)
+        print(f"apply_eq x{n_eq}: mean {1e3 * sum(times) / len(times):.2f} ms, "
+              f"p95 {1e3 * _percentile(times, 0.95):.2f} ms")
+
+        # command traffic of an audiogram (TEST/FREQ + LEVEL on/off per interval), no tone waits
+        n0, b0 = len(emu.commands), emu.rx_bytes
+        t0 = time.perf_counter()
+        link.set_test_mode(True)
+        for f in FREQS:
+            link.set_freq(f)
+            for _ in range(trials_per_freq):
+                for _interval in (1, 2):
+                    link.set_level_db(-40.0)
+                    link.set_level_db(-90.0)
+        link.set_test_mode(False)
+        dt = time.perf_counter() - t0
+        n = len(emu.commands) - n0
+        print(f"audiogram traffic: {n} commands in {dt * 1e3:.1f} ms "
+              f"({1e3 * dt / n:.3f} ms/command, {(emu.rx_bytes - b0) / n:.1f} bytes/command)")
+    finally:
+        link.close()
+
+
+def bench_devices(n, latency=0.0, jitter=0.0, baud=None, rounds=20):
+    """DeviceManager against n emulated units: broadcast time vs. a single unit."""
+    from gui import DeviceManager
+
+    emus = [TeensyEmulator(latency=latency, jitter=jitter, baud=baud, seed=i) for i in range(n)]
+    ports = [e.start() for e in emus]
+    mgr = DeviceManager()
+    try:
+        t0 = time.perf_counter()
+        res = mgr.open(ports)
+        print(f"open x{n}: {1e3 * (time.perf_counter() - t0):.0f} ms, "
+              f"{sum(ok for ok, _, _ in res.values())}/{n} OK")
+        for targets in (ports[:1], ports):
+            times = []
+            for i in range(rounds):
+                t0 = time.perf_counter()
+                mgr.apply_eq(i % 10, 2.0, 3.0, ports=targets)
+                times.append(time.perf_counter() - t0)
+            print(f"apply_eq to {len(targets)} device(s): mean {1e3 * sum(times) / len(times):.2f} ms, "
+                  f"p95 {1e3 * _percentile(times, 0.95):.2f} ms")
+    finally:
+        mgr.shutdown()
+        for e in emus:
+            e.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Teensy hearing-aid firmware emulator (pty)")
+    ap.add_argument("--latency", type=float, default=0.0, help="per-command latency (s)")
+    ap.add_argument("--jitter", type=float, default=0.0, help="extra random latency 0..J (s)")
+    ap.add_argument("--baud", type=int, default=None, help="throttle to this baud rate")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--link", default=None, metavar="PATH", help="also expose the port as this symlink")
+    ap.add_argument("--bench", action="store_true", help="run the TeensyLink benchmark and exit")
+    ap.add_argument("--ascii", action="store_true", help="benchmark with ASCII lines instead of binary frames")
+    ap.add_argument("--devices", type=int, default=0, metavar="N",
+                    help="benchmark DeviceManager against N emulated units and exit")
+    args = ap.parse_args()
+
+    if args.devices:
+        bench_devices(args.devices, latency=args.latency, jitter=args.jitter, baud=args.baud)
+        return
+
+    emu = TeensyEmulator(latency=args.latency, jitter=args.jitter, baud=args.baud, seed=args.seed, link=args.link)
+    port = emu.start()
+    try:
+        if args.bench:
+            bench(emu, binary=not args.ascii)
+            return
+        print(f"Emulated Teensy on {port} (Ctrl+C to quit)")
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emu.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
+import time
+_T_START = time.perf_counter()   # for the startup-time report
 import tkinter as tk
 from tkinter import ttk, messagebox
-import time, threading, random, json, os
+import threading, random, json, os, queue, heapq, bisect, csv, sys, importlib
+from collections import deque
+from concurrent.futures import Future, CancelledError, ThreadPoolExecutor
 import serial
 from serial.tools import list_ports
-import matplotlib
-matplotlib.use("TkAgg")
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
+
+import binary_protocol
+from profile_db import (bands_from_profile, delete_profile, list_profiles, load_profile,
+                        profile_store, save_profile)
+# matplotlib (and numpy/scipy) are imported lazily: prewarmed in the
+# background after startup and used by show_audiogram_window only
 
 # =========================
 # Config audiogram (8 freqs)
@@ -17,6 +23,10 @@ TONE_DUR = 0.9
 GAP_DUR  = 0.6
 PAUSE_BETWEEN_TRIALS = 0.25
 
+# trial timing: tone on/off and trial starts are absolute time.monotonic() deadlines
+TIMING_MARGIN_S = 0.0005  # Event.wait until this close to a deadline, time.sleep the rest (finer)
+TIMING_LEAD_ALPHA = 0.2   # EWMA weight of the measured command latency sent ahead of a deadline
+
 START_DB = -10.0
 MIN_DB   = -80.0
 MAX_DB   = -3
@@ -28,6 +38,11 @@ STEP_SMALL = 2.0
 STOP_REVERSALS = 6
 AVG_LAST_REVERSALS = 4
 
+TRACE_MAX_TRIALS = 40   # initial x range of the live level trace
+
+# second track of a frequency (dual-track mode) starts this much lower
+DUAL_TRACK_OFFSET_DB = 20.0
+
 # Map thresholds -> 3 EQ bands
 BAND_EQ500  = [250, 500]
 BAND_EQ2000 = [1000, 2000, 3000]
@@ -37,48 +52,983 @@ GAIN_FACTOR = 0.4
 GAIN_MAX_DB = 25.0
 GAIN_MIN_DB = 0.0
 
-PROFILES_DIR = "profiles"
+BANK_FILE = "bank.json"   # which saved profile goes to which on-device bank slot
+
+SESSIONS_DIR = "sessions"   # trial-level logs of every audiogram (replay.py)
+SESSION_FLUSH_S = 2.0       # max seconds a logged trial stays in the write buffer
+
+
+# =========================
+# Serial link config
+# =========================
+CMD_TIMEOUT = 1.0      # s to wait for the OK/ERR reply of one command
+MAX_IN_FLIGHT = 8      # commands written but not yet acknowledged
+LIVE_RATE_HZ = 20      # max EQ updates/s while dragging the sliders
+LATENCY_WINDOW = 500   # commands per type in the rolling percentiles
+LATENCY_KEEP = 20000   # raw latency records kept for export
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50)   # histogram bucket edges; the last bucket is open
+RECONNECT_POLL = 0.5   # s between port scans of the hot-plug watcher
+READY_TIMEOUT = 3.0    # s to wait for the firmware's READY banner after a reconnect
+RESUME_TIMEOUT = 60.0  # s a running audiogram waits for the Teensy to come back
+BANK_STORE_TIMEOUT = 3.0   # s for one STORE/ERASE (EEPROM writes)
 
 
 # =========================
 # Serial helpers
 # =========================
+class TeensyError(RuntimeError):
+    """The firmware answered a command with ERR ..."""
+
+
+class LinkLost(ConnectionError):
+    """The Teensy went away (reset, cable); TeensyLink is trying to reconnect."""
+
+
+def usb_id(port):
+    """(vid, pid, serial number) of a USB serial port, None if unknown."""
+    for p in list_ports.comports():
+        if p.device == port and p.vid is not None:
+            return (p.vid, p.pid, p.serial_number)
+    return None
+
+
+class _Pending:
+    # one command written to the Teensy, waiting for its reply
+    __slots__ = ("cmd", "future", "multiline", "lines", "seq", "t_submit", "t_acquired", "t_written", "t_flushed")
+
+    def __init__(self, cmd: str, multiline: bool = False):
+        self.cmd = cmd
+        self.future = Future()
+        self.multiline = multiline   # STATUS answers with STATUS ... END instead of OK
+        self.lines = {}
+        self.seq = None   # frame sequence number in binary mode
+        # time.perf_counter() stamps: submit() called, window slot free, write() and flush() returned
+        self.t_submit = self.t_acquired = self.t_written = self.t_flushed = None
+
+
+class LatencyTracer:
+    """
+    Round-trip timing of every TeensyLink command.
+
+    Each command is split into queue (waiting for a window slot), write,
+    flush (OS -> USB) and reply (flushed -> OK/ERR received, i.e. cable +
+    firmware). Rolling p50/p95/p99 and a histogram (LATENCY_BUCKETS_MS)
+    are kept per command type over the last LATENCY_WINDOW commands; the
+    last LATENCY_KEEP raw records can be exported as CSV or JSONL.
+    """
+
+    FIELDS = ("time", "cmd", "ok", "queue_ms", "write_ms", "flush_ms", "reply_ms", "total_ms")
+
+    def __init__(self, window=LATENCY_WINDOW, keep=LATENCY_KEEP):
+        self.window = window
+        self._totals = {}                   # cmd type -> deque of total_ms
+        self._records = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def record(self, p: _Pending, ok: bool, t_reply: float):
+        t_written = p.t_written or t_reply
+        t_flushed = min(p.t_flushed or t_reply, t_reply)
+        rec = (
+            time.time(),
+            p.cmd.split(" ", 1)[0].upper(),
+            ok,
+            1e3 * (p.t_acquired - p.t_submit),
+            1e3 * (t_written - p.t_acquired),
+            1e3 * max(0.0, t_flushed - t_written),
+            1e3 * (t_reply - t_flushed),
+            1e3 * (t_reply - p.t_submit),
+        )
+        with self._lock:
+            self._records.append(rec)
+            d = self._totals.get(rec[1])
+            if d is None:
+                d = self._totals[rec[1]] = deque(maxlen=self.window)
+            d.append(rec[-1])
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+            self._records.clear()
+
+    def stats(self):
+        """{cmd type: (n, p50, p95, p99)} in ms over the rolling window."""
+        with self._lock:
+            snap = {k: sorted(v) for k, v in self._totals.items()}
+        out = {}
+        for k, xs in sorted(snap.items()):
+            n = len(xs)
+            pct = lambda q: xs[min(n - 1, int(q * n))]
+            out[k] = (n, pct(0.50), pct(0.95), pct(0.99))
+        return out
+
+    def histogram(self):
+        """{cmd type: counts per LATENCY_BUCKETS_MS bucket} over the rolling window; x < edge goes below it."""
+        with self._lock:
+            snap = {k: list(v) for k, v in self._totals.items()}
+        out = {}
+        for k, xs in sorted(snap.items()):
+            counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            for x in xs:
+                counts[bisect.bisect_right(LATENCY_BUCKETS_MS, x)] += 1
+            out[k] = counts
+        return out
+
+    def breakdown(self):
+        """{cmd type: mean (queue, write, flush, reply) ms} of the kept records."""
+        with self._lock:
+            recs = list(self._records)
+        sums = {}
+        for r in recs:
+            acc = sums.setdefault(r[1], [0, 0.0, 0.0, 0.0, 0.0])
+            acc[0] += 1
+            for i in range(4):
+                acc[i + 1] += r[3 + i]
+        return {k: tuple(x / v[0] for x in v[1:]) for k, v in sums.items()}
+
+    def export_csv(self, path):
+        with self._lock:
+            recs = list(self._records)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(self.FIELDS)
+            w.writerows(recs)
+
+    def export_jsonl(self, path):
+        with self._lock:
+            recs = list(self._records)
+        with open(path, "w", encoding="utf-8") as f:
+            for r in recs:
+                f.write(json.dumps(dict(zip(self.FIELDS, r))) + "\n")
+
+
 class TeensyLink:
-    def __init__(self):
+    """
+    Serial link to the Teensy.
+
+    parseCommand answers every line with exactly one reply (OK / ERR ...,
+    or a STATUS ... END block), in order. A reader thread matches each reply
+    to the oldest pending command and resolves its Future. At most
+    MAX_IN_FLIGHT commands may be unacknowledged; submit() blocks when the
+    window is full (backpressure).
+
+    Hot-plug: while connected, a watcher thread looks for the port's USB
+    VID/PID/serial number. When the board disappears (or prints READY again
+    after a reset) pending commands and a running trial fail with LinkLost;
+    when it comes back, possibly under another port name, the link reopens
+    it, waits for READY and replays the last EQ and the TEST/FREQ state
+    before accepting commands again (`online` is set).
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT):
         self.ser = None
+        self.port = None               # set from connect() to close(), also while reconnecting
+        self.baud = 115200
+        self.usb_id = None
+        self.auto_reconnect = True
+        self.on_state = None           # callback(state, detail) from link threads: "lost", "reconnected"
+        self.online = threading.Event()
+        self.max_in_flight = max_in_flight
+        self.last_unsolicited = None   # e.g. the READY banner after a reset
+        self.has_set_cmd = True        # cleared if the firmware rejects SET
+        self.has_trial_cmd = True      # cleared if the firmware rejects TRIAL
+        self.caps = None               # optional commands from CAPS, None = not asked yet
+        self.use_binary = True         # switch to binary frames if the firmware offers BIN
+        self.binary = False            # commands are sent as frames
+        self._rx_binary = False        # replies are parsed as frames (switches at the OK of BIN ON)
+        self._seq = 0
+        # device state replayed after a reconnect
+        self.dsp_params = None         # (gain_global, g500, g2000, g4000) of the last apply_eq
+        self.dsp_bands = None          # its N-band stage gains, None for 3 bands
+        self.test_mode = False
+        self.test_freq = None
+        self._trial_done = None        # Future resolved by the DONE line of a running TRIAL
+        self._pending = deque()
+        self._write_lock = threading.Lock()
+        self._conn_lock = threading.RLock()
+        self._window = threading.BoundedSemaphore(max_in_flight)
+        self._reader = None
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._sync_ends = 0            # END lines still to drop while resyncing ASCII replies
+        self._synced = threading.Event()
+        self._watcher = None
+        self._watch_stop = threading.Event()
+        self._restorer = None          # thread negotiating/replaying, may send while offline
+        self.tracer = LatencyTracer()
 
     def connect(self, port, baud=115200):
-        self.ser = serial.Serial(port, baud, timeout=0.2)
-        time.sleep(0.25)
+        self.port, self.baud = port, baud
+        self.usb_id = usb_id(port)
+        self.dsp_params = self.dsp_bands = None
+        self.test_mode = False
+        self.test_freq = None
+        self._open(port)
+        self._restorer = threading.current_thread()
+        try:
+            self._negotiate()
+        except:
+            self.close()
+            raise
+        finally:
+            self._restorer = None
+        self.online.set()
+        self._watch_stop = threading.Event()
+        self._watcher = threading.Thread(target=self._watch_run, args=(self._watch_stop,), daemon=True)
+        self._watcher.start()
+
+    def _open(self, port, wait_ready=False):
+        ser = serial.Serial(port, self.baud, timeout=0.2)
+        if not wait_ready:
+            time.sleep(0.25)
+            ser.reset_input_buffer()
+        self.has_set_cmd = True
+        self.has_trial_cmd = True
+        self.caps = None
+        self.binary = self._rx_binary = False
+        self._trial_done = None
+        self._pending = deque()
+        self._window = threading.BoundedSemaphore(self.max_in_flight)
+        self._stop = threading.Event()
+        self._ready.clear()
+        self._sync_ends = 0
+        self.ser = ser
+        self._reader = threading.Thread(target=self._reader_run, args=(ser, self._stop), daemon=True)
+        self._reader.start()
+        if wait_ready:
+            # setup() prints READY; it may be gone already if the board booted before we opened
+            self._ready.wait(READY_TIMEOUT)
 
     def close(self):
-        if self.ser:
+        self.port = None
+        self.online.clear()
+        self._watch_stop.set()
+        with self._conn_lock:   # not in the middle of a reconnect
+            self._stop.set()
+            if self.ser:
+                try:
+                    if self.binary:   # leave the firmware in ASCII mode (it also drops back on DTR)
+                        with self._write_lock:
+                            self.ser.write(binary_protocol.frame(binary_protocol.OP_ASCII, 0))
+                            self.ser.flush()
+                except:
+                    pass
+                try:
+                    self.ser.close()
+                except:
+                    pass
+            self.ser = None
+        for t in (self._reader, self._watcher):
+            if t and t is not threading.current_thread():
+                t.join(timeout=1.0)
+        self._reader = self._watcher = None
+        self._fail_pending(RuntimeError("Serial link closed"))
+        self.cancel_trial()
+
+    # ---------- hot-plug ----------
+    def _notify(self, state, detail=""):
+        if self.on_state:
+            try:
+                self.on_state(state, detail)
+            except:
+                pass
+
+    def _lost(self, error, ser=None):
+        """The port died under us: drop it and let the watcher bring it back."""
+        with self._conn_lock:
+            if self.ser is None or (ser is not None and ser is not self.ser):
+                return
+            self.online.clear()
+            self._stop.set()
             try:
                 self.ser.close()
             except:
                 pass
-        self.ser = None
+            self.ser = None
+        self._fail_all(LinkLost(f"Teensy disconnected ({error})"))
+        self._notify("lost", str(error))
+
+    def _fail_all(self, error):
+        self._fail_pending(error)
+        done, self._trial_done = self._trial_done, None
+        if done is not None and not done.done():
+            done.set_exception(error)
+
+    def _find_port(self):
+        """Current device path of our board, None while it is unplugged."""
+        ports = list_ports.comports()
+        if self.usb_id is not None:
+            for p in ports:
+                if (p.vid, p.pid, p.serial_number) == self.usb_id:
+                    return p.device
+            return None
+        # no USB id (e.g. a pty): the same path has to come back
+        port = self.port
+        if port and (os.path.exists(port) or any(p.device == port for p in ports)):
+            return port
+        return None
+
+    def _watch_run(self, stop):
+        while not stop.wait(RECONNECT_POLL):
+            port = self._find_port()
+            if self.ser is not None:
+                if port is None:
+                    self._lost("unplugged")
+                continue
+            if port is None or not self.auto_reconnect:
+                continue
+            try:
+                with self._conn_lock:
+                    if stop.is_set() or self.ser is not None:
+                        continue
+                    self._open(port, wait_ready=True)
+                    self.port = port
+                self._restore()
+            except Exception as e:
+                self._lost(e)   # not there yet, next scan tries again
 
-    def send(self, cmd: str):
-        if not self.ser:
+    def _restore(self):
+        """Replay EQ and test state, then accept commands again."""
+        self._restorer = threading.current_thread()
+        try:
+            self._negotiate()
+            if self.dsp_params is not None:
+                gg, g500, g2000, g4000 = self.dsp_params
+                self.apply_eq(g500, g2000, g4000, gain_global=gg, bands=self.dsp_bands)
+            if self.test_mode:
+                self.set_test_mode(True)
+            if self.test_freq is not None:
+                self.set_freq(self.test_freq)
+        finally:
+            self._restorer = None
+        self.online.set()
+        self._notify("reconnected", self.port)
+
+    def _on_reset(self):
+        # READY while online: the firmware restarted without the USB port going away
+        self.online.clear()
+        self.caps = None
+        self.binary = self._rx_binary = False   # it talks ASCII again
+        self._fail_all(LinkLost("Teensy reset"))
+        self._notify("lost", "firmware reset")
+
+        def restore():
+            try:
+                self._restore()
+            except Exception as e:
+                self._lost(e)
+        threading.Thread(target=restore, daemon=True).start()
+
+    # ---------- command channel ----------
+    def submit(self, cmd: str, timeout=CMD_TIMEOUT, payload=b"") -> Future:
+        """
+        Write one command and return a Future resolved with its reply.
+        payload: raw bytes written right after the command line (COEF).
+        """
+        if not (self.online.is_set() or threading.current_thread() is self._restorer):
+            if self.port:
+                raise LinkLost("Teensy disconnected, waiting for it to come back")
             raise RuntimeError("Not connected to Teensy")
-        self.ser.write((cmd.strip() + "\n").encode("utf-8"))
+        ser = self.ser
+        t_submit = time.perf_counter()
+        if not self._window.acquire(timeout=timeout):
+            raise TimeoutError(f"Teensy not answering ({self.max_in_flight} commands pending)")
+        cmd = cmd.strip()
+        p = _Pending(cmd, multiline=cmd.upper() == "STATUS")
+        p.t_submit = t_submit
+        try:
+            with self._write_lock:
+                if self.binary:
+                    self._seq = (self._seq + 1) & 0xFF
+                    p.seq = self._seq
+                    data = binary_protocol.encode_command(cmd, p.seq, payload)
+                else:
+                    data = (cmd + "\n").encode("utf-8") + payload
+                # queue before writing so the reader never sees a reply without its command
+                p.t_acquired = time.perf_counter()
+                self._pending.append(p)
+                ser.write(data)
+                p.t_written = time.perf_counter()
+                ser.flush()
+                p.t_flushed = time.perf_counter()
+        except (serial.SerialException, OSError, AttributeError) as e:
+            self._resolve(p, error=e)
+            self._lost(e, ser)
+            raise LinkLost(f"Teensy disconnected ({e})") from e
+        except Exception as e:
+            if p.t_acquired is None:   # no binary form: nothing was queued or written
+                self._window.release()
+                raise
+            self._resolve(p, error=e)
+            raise
+        return p.future
+
+    def send(self, cmd: str, timeout=CMD_TIMEOUT, payload=b""):
+        """Write one command and wait until the Teensy acknowledged it."""
+        return self.wait_all([self.submit(cmd, timeout=timeout, payload=payload)], timeout=timeout)[0]
+
+    def wait_all(self, futures, timeout=CMD_TIMEOUT):
+        results = []
+        for f in futures:
+            try:
+                results.append(f.result(timeout=timeout))
+            except TimeoutError:
+                self._expire(f)
+                raise
+        return results
+
+    def _expire(self, fut: Future):
+        """fut's command got no reply in time: free its window slot, resync ASCII replies."""
+        p = next((q for q in list(self._pending) if q.future is fut), None)
+        if p is None:
+            return   # answered or failed meanwhile
+        error = TimeoutError(f"{p.cmd}: no reply from the Teensy")
+        if self._rx_binary:
+            self._resolve(p, error=error)   # replies carry their seq, a late one is ignored
+        else:
+            self._resync(error)
+
+    def _resync(self, error):
+        """
+        ASCII replies are matched by position, so after one lost or late reply
+        every later one would go to the wrong command. Fail all pending
+        commands, send STATUS as a marker and drop the input up to its END
+        (and the END of every failed STATUS). The marker is written under the
+        write lock but waited for without it. No END: one more marker, which
+        gives up on the ENDs still owed (replies come in order, so after
+        CMD_TIMEOUT they are lost), then reconnect.
+        """
+        ser = self.ser
+        for retry in (False, True):
+            with self._write_lock:
+                if ser is not self.ser:
+                    return   # reconnected meanwhile
+                stale = list(self._pending)
+                if not (stale or retry):
+                    return
+                self._synced.clear()
+                owed = 0 if retry else self._sync_ends
+                self._sync_ends = owed + 1 + sum(q.multiline for q in stale)
+                self._fail_pending(error)
+                try:
+                    ser.write(b"STATUS\n")
+                    ser.flush()
+                except (serial.SerialException, OSError, AttributeError) as e:
+                    self._lost(e, ser)
+                    return
+            if self._synced.wait(CMD_TIMEOUT):
+                return
+        self._sync_ends = 0
+        self._lost("replies out of step", ser)
+
+    def _resolve(self, p: _Pending, result=None, error=None):
+        try:
+            self._pending.remove(p)
+        except ValueError:
+            return
+        self._window.release()
+        if p.t_acquired is not None and (error is None or isinstance(error, TeensyError)):
+            self.tracer.record(p, error is None, time.perf_counter())
+        if p.future.cancelled():
+            return
+        if error is not None:
+            p.future.set_exception(error)
+        else:
+            p.future.set_result(result)
+
+    def _fail_pending(self, error):
+        while self._pending:
+            try:
+                p = self._pending[0]
+            except IndexError:
+                break
+            self._resolve(p, error=error)
+
+    def _reader_run(self, ser, stop):
+        buf = b""
+        while not stop.is_set():
+            try:
+                chunk = ser.read(max(1, ser.in_waiting))
+            except Exception as e:
+                if not stop.is_set():
+                    self._lost(e, ser)
+                break
+            if chunk:
+                buf = self._parse(buf + chunk)
+
+    def _parse(self, buf: bytes) -> bytes:
+        """Handle every complete line/frame in buf, return the incomplete rest."""
+        while True:
+            if self._rx_binary:
+                i = buf.find(b"\x00")
+                if i < 0:
+                    j = buf.find(b"READY\r\n")
+                    if j < 0:
+                        return buf
+                    # the firmware restarted and talks ASCII again
+                    self.binary = self._rx_binary = False
+                    buf = buf[j:]
+                    continue
+                raw, buf = buf[:i], buf[i + 1:]
+                if raw:
+                    self._on_frame(raw)
+            else:
+                i = buf.find(b"\n")
+                if i < 0:
+                    return buf
+                raw, buf = buf[:i], buf[i + 1:]
+                line = raw.decode("utf-8", errors="replace").strip()
+                if line:
+                    self._on_line(line)
+
+    def _on_done(self):
+        # end of a firmware-timed TRIAL, not a command reply
+        done, self._trial_done = self._trial_done, None
+        if done is not None and not done.done():
+            done.set_result("DONE")
+
+    def _on_frame(self, raw: bytes):
+        try:
+            op, seq, payload = binary_protocol.decode_frame(raw)
+        except ValueError:
+            return   # corrupt frame: its command runs into CMD_TIMEOUT (_expire)
+        if op == binary_protocol.OP_DONE:
+            self._on_done()
+            return
+        p = next((q for q in list(self._pending) if q.seq == seq), None)
+        if p is None:
+            return
+        if op == binary_protocol.OP_OK:
+            if p.cmd.upper() == "BIN OFF":
+                self._rx_binary = False
+            self._resolve(p, result="OK")
+        elif op == binary_protocol.OP_ERR:
+            self._resolve(p, error=TeensyError(f"{p.cmd}: ERR {payload.decode('utf-8', errors='replace')}"))
+        elif op == binary_protocol.OP_STATUS_REPLY:
+            self._resolve(p, result=binary_protocol.status_dict(payload))
+        elif op == binary_protocol.OP_BANK_REPLY:
+            self._resolve(p, result=binary_protocol.bank_line(payload))
+
+    def _on_line(self, line: str):
+        if line == "DONE":
+            self._on_done()
+            return
+
+        if line == "READY":
+            self.last_unsolicited = line
+            self._ready.set()
+            if self._sync_ends:   # restarted: nothing old left in the stream
+                self._sync_ends = 0
+                self._synced.set()
+            if self.online.is_set():
+                self._on_reset()
+            return
+
+        if self._sync_ends:
+            if line == "END":
+                self._sync_ends -= 1
+                if not self._sync_ends:
+                    self._synced.set()
+            return
+
+        p = self._pending[0] if self._pending else None
+        if p is None:
+            self.last_unsolicited = line
+            return
 
+        if line.startswith("ERR"):
+            self._resolve(p, error=TeensyError(f"{p.cmd}: {line}"))
+            return
+
+        if p.multiline:
+            if line == "END":
+                self._resolve(p, result=p.lines)
+            elif line != "STATUS":
+                key, _, val = line.partition(" ")
+                try:
+                    p.lines[key] = float(val)
+                except ValueError:
+                    p.lines[key] = val
+            return
+
+        if line == "OK" or line.startswith("OK "):
+            if p.cmd.upper() == "BIN ON":
+                self._rx_binary = True   # everything after this OK is framed
+            self._resolve(p, result=line)
+        else:
+            self.last_unsolicited = line
+
+    # ---------- commands ----------
     def set_test_mode(self, on: bool):
         self.send("TEST ON" if on else "TEST OFF")
+        self.test_mode = on
 
     def set_freq(self, hz: float):
         self.send(f"FREQ {hz}")
+        self.test_freq = hz
 
     def set_level_db(self, db: float):
         self.send(f"LEVEL {db:.1f}")
 
-    def apply_eq(self, g500, g2000, g4000, gain_global=1.0):
-        # Apply in this order
-        self.send(f"GAIN {gain_global:.3f}")
-        self.send(f"EQ500 {g500:.1f}")
-        self.send(f"EQ2000 {g2000:.1f}")
-        self.send(f"EQ4000 {g4000:.1f}")
+    def trial(self, hz, db, interval, tone_s, gap_s) -> Future:
+        """
+        Let the firmware play both 2AFC intervals (tone in `interval`).
+        Returns once the Teensy accepted the trial; the returned Future is
+        resolved by its DONE line, or cancelled by cancel_trial().
+        """
+        done = Future()
+        self._trial_done = done
+        try:
+            self.send(f"TRIAL {hz} {db:.1f} {interval} {tone_s * 1000:.0f} {gap_s * 1000:.0f}")
+            self.test_freq = hz
+        except BaseException as e:   # also LinkLost / TimeoutError: this trial never started
+            if self._trial_done is done:
+                self._trial_done = None
+            if isinstance(e, TeensyError) and "Unknown command" in str(e):
+                self.has_trial_cmd = False   # older firmware: host-timed intervals
+            raise
+        return done
+
+    def cancel_trial(self):
+        done, self._trial_done = self._trial_done, None
+        if done is not None:
+            done.cancel()
+
+    def status(self) -> dict:
+        return self.send("STATUS")
+
+    def query_caps(self) -> set:
+        """Optional commands of the firmware (CAPS), asked once per connection."""
+        if self.caps is None:
+            try:
+                self.caps = set(self.send("CAPS").split()[1:])
+            except TeensyError as e:
+                if "Unknown command" not in str(e):
+                    raise
+                self.caps = set()   # older firmware
+        return self.caps
+
+    def _negotiate(self):
+        """CAPS, then binary frames if both sides want them."""
+        caps = self.query_caps()
+        if "COEF" in caps:
+            try:
+                importlib.import_module("offline_dsp")   # warm-up: NumPy loads here, not in the first apply_eq
+            except ImportError:
+                pass
+        if self.use_binary and "BIN" in caps:
+            self.send("BIN ON")
+            self.binary = True
+
+    def _coef_payload(self, g500, g2000, g4000, bands=None):
+        """(stage count, payload) of a COEF command, None to let the firmware compute."""
+        try:
+            import offline_dsp
+            if bands:
+                payload = offline_dsp.nband_coef_payload(FREQS, bands)
+            else:
+                payload = offline_dsp.coef_payload(g500, g2000, g4000)
+        except (ImportError, OverflowError):
+            return None   # no NumPy here, or a gain beyond the Q30 range
+        return len(payload) // offline_dsp.COEF_RECORD.size, payload
+
+    def apply_eq(self, g500, g2000, g4000, gain_global=1.0, bands=None):
+        """
+        bands: stage gains per FREQS entry (N-band EQ, needs COEF); g500..g4000
+        are then only reported by STATUS and used if COEF is not available.
+        """
+        self.dsp_bands = None
+        # Coefficients computed here and loaded as-is: no pow/sin/cos on the MCU
+        if "COEF" in self.query_caps():
+            coef = self._coef_payload(g500, g2000, g4000, bands)
+            if coef is not None:
+                n, payload = coef
+                self.send(f"COEF {gain_global:.3f} {g500:.1f} {g2000:.1f} {g4000:.1f} {n}", payload=payload)
+                self.dsp_params = (gain_global, g500, g2000, g4000)
+                self.dsp_bands = bands
+                return
+
+        # One atomic SET: the firmware only recomputes the stages that changed
+        if self.has_set_cmd:
+            try:
+                self.send(f"SET {gain_global:.3f} {g500:.1f} {g2000:.1f} {g4000:.1f}")
+                self.dsp_params = (gain_global, g500, g2000, g4000)
+                return
+            except TeensyError as e:
+                if "Unknown command" not in str(e):
+                    raise
+                self.has_set_cmd = False   # older firmware without SET
+
+        # Apply in this order (pipelined, then wait for every OK)
+        futs = [
+            self.submit(f"GAIN {gain_global:.3f}"),
+            self.submit(f"EQ500 {g500:.1f}"),
+            self.submit(f"EQ2000 {g2000:.1f}"),
+            self.submit(f"EQ4000 {g4000:.1f}"),
+        ]
+        self.wait_all(futs)
+        self.dsp_params = (gain_global, g500, g2000, g4000)
+
+    # ---------- profile bank ----------
+    def bank_status(self):
+        """(active slot or -1, [content hash per slot, 0 = empty]) of the on-device bank."""
+        if "BANK" not in self.query_caps():
+            raise TeensyError("This firmware has no profile bank (CAPS lacks BANK)")
+        active, *hashes = self.send("BANK").split()[2:]
+        return int(active), [int(h, 16) for h in hashes]
+
+    def bank_entry(self, name, gain_global, g500, g2000, g4000, bands=None):
+        """(hash, body) of a bank slot holding these settings, rounded like apply_eq sends them."""
+        params = (round(gain_global, 3), round(g500, 1), round(g2000, 1), round(g4000, 1))
+        records = b""
+        if "COEF" in self.query_caps():
+            coef = self._coef_payload(*params[1:], bands=bands)
+            if coef is not None:
+                records = coef[1][:-binary_protocol.COEF_CHECKSUM_BYTES]
+        return binary_protocol.bank_slot(name, params, records)
+
+    def sync_bank(self, entries):
+        """
+        Make slot i hold entries[i] = (name, (gain, g500, g2000, g4000), bands),
+        None = empty. Only slots whose content hash differs are written.
+        Returns {slot: "stored" | "erased" | "same" | "empty"}.
+        """
+        _, hashes = self.bank_status()
+        if len(entries) > len(hashes):
+            raise TeensyError(f"The Teensy has {len(hashes)} profile slots, got {len(entries)} profiles")
+        futs, result = [], {}
+        for slot, have in enumerate(hashes):
+            entry = entries[slot] if slot < len(entries) else None
+            if entry is None:
+                result[slot] = "erased" if have else "empty"
+                if have:
+                    futs.append(self.submit(f"ERASE {slot}", timeout=BANK_STORE_TIMEOUT))
+                continue
+            name, params, bands = entry
+            h, body = self.bank_entry(name, *params, bands=bands)
+            if h == have:
+                result[slot] = "same"
+                continue
+            n = (len(body) - binary_protocol.BANK_HEAD_BYTES) // binary_protocol.COEF_RECORD_BYTES
+            futs.append(self.submit(f"STORE {slot} {h:08X} {n}", timeout=BANK_STORE_TIMEOUT,
+                                    payload=body + bytes([sum(body) & 0xFF])))
+            result[slot] = "stored"
+        self.wait_all(futs, timeout=BANK_STORE_TIMEOUT)
+        return result
+
+    def select_slot(self, slot: int):
+        """PROFILE <slot>: the Teensy switches to a stored program by itself."""
+        self.send(f"PROFILE {int(slot)}")
+        self.dsp_params = None   # it boots into that slot too, nothing to replay after a reset
+
+
+class DeviceIO:
+    """
+    The one thread that talks to the Teensy.
+
+    Every TeensyLink operation (connect, apply, test commands, close) runs
+    here, in submission order, so a slow or stalled port never blocks the
+    Tk loop and the audiogram worker, live sliders and buttons never
+    interleave multi-command sequences on the same serial.Serial.
+
+    submit() returns a Future; on_done/on_error are handed to `post`
+    (App._ui -> root.after) so they run on the Tk thread. call() is the
+    blocking form for background threads - never use it on the Tk thread.
+    """
+
+    def __init__(self, post):
+        self.post = post
+        self._ex = ThreadPoolExecutor(max_workers=1, thread_name_prefix="teensy-io")
+
+    def submit(self, fn, *args, on_done=None, on_error=None, **kwargs) -> Future:
+        fut = self._ex.submit(fn, *args, **kwargs)
+        if on_done or on_error:
+            def done(f):
+                if f.cancelled():
+                    return
+                err = f.exception()
+                if err is None:
+                    if on_done:
+                        self.post(lambda: on_done(f.result()))
+                elif on_error:
+                    self.post(lambda: on_error(err))
+            fut.add_done_callback(done)
+        return fut
+
+    def call(self, fn, *args, **kwargs):
+        return self._ex.submit(fn, *args, **kwargs).result()
+
+    def shutdown(self):
+        self._ex.shutdown(wait=False, cancel_futures=True)
+
+
+class LiveEqSender:
+    """
+    Streams slider values to the Teensy while they are dragged.
+
+    update() never blocks: it only stores the newest value per parameter
+    (latest value wins). A sender thread pushes the current state as one
+    SET command, at most rate_hz times per second. One sender per
+    connection: close() it on disconnect, reset() it after a reconnect.
+    """
+
+    def __init__(self, link: TeensyLink, rate_hz=LIVE_RATE_HZ, on_error=None, io: DeviceIO = None):
+        self.link = link
+        self.io = io
+        self.min_interval = 1.0 / rate_hz
+        self.on_error = on_error
+        self._latest = {}
+        self._dirty = False
+        self._running = True
+        self._last_sent = None
+        self._gen = 0   # bumped by reset(): an apply already running does not set _last_sent
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def update(self, **params):
+        with self._cond:
+            self._latest.update(params)
+            self._dirty = True
+            self._cond.notify()
+
+    def reset(self):
+        """The Teensy came back: forget what it had, send the newest values again."""
+        with self._cond:
+            self._last_sent = None
+            self._gen += 1
+            if self._latest:
+                self._dirty = True
+                self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._latest = {}
+            self._cond.notify()
+
+    def _run(self):
+        next_send = 0.0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._dirty or not self._running)
+                # rate limit: newer updates keep overwriting _latest meanwhile
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    self._cond.wait_for(lambda: not self._running, timeout=delay)
+                if not self._running:
+                    return
+                params = dict(self._latest)
+                self._dirty = False
+                gen, last_sent = self._gen, self._last_sent
+
+            next_send = time.monotonic() + self.min_interval
+            if params == last_sent:
+                continue
+            if not (self.link.ser and self.link.online.is_set()):
+                with self._cond:   # offline: keep it pending, retried at the send rate
+                    self._dirty = True
+                continue
+            try:
+                if self.io:
+                    self.io.call(self.link.apply_eq, **params)
+                else:
+                    self.link.apply_eq(**params)
+                with self._cond:
+                    if self._gen == gen:
+                        self._last_sent = params
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+
+
+class _Device:
+    __slots__ = ("port", "link", "io", "state", "ok", "error", "seconds")
+
+    def __init__(self, port):
+        self.port = port
+        self.link = TeensyLink()
+        self.io = DeviceIO(post=None)   # per-device order, devices run in parallel
+        self.state = "closed"
+        self.ok = None
+        self.error = ""
+        self.seconds = None
+
+
+class DeviceManager:
+    """
+    Several Teensy units at once (fitting station).
+
+    Every device has its own TeensyLink and its own DeviceIO thread: the
+    commands of one unit stay in order, different units work in parallel,
+    so broadcasting to N devices takes about as long as the slowest one.
+    Operations block until all targeted devices answered and return
+    {port: (ok, seconds, error)}; call them off the Tk thread.
+    """
+
+    def __init__(self):
+        self.devices = {}   # port -> _Device
+        self._lock = threading.Lock()
+
+    def _device(self, port) -> _Device:
+        with self._lock:
+            dev = self.devices.get(port)
+            if dev is None:
+                dev = self.devices[port] = _Device(port)
+            return dev
+
+    def open_ports(self):
+        return [p for p, d in self.devices.items() if d.link.ser]
+
+    def _timed(self, dev: _Device, fn):
+        t0 = time.perf_counter()
+        try:
+            fn(dev)
+            dev.ok, dev.error = True, ""
+        except Exception as e:
+            dev.ok, dev.error = False, str(e)
+        dev.seconds = time.perf_counter() - t0
+        dev.state = "open" if dev.link.ser else "closed"
+        return dev.ok, dev.seconds, dev.error
+
+    def _run(self, ports, fn):
+        devs = [self._device(p) for p in ports]
+        futs = [(d.port, d.io.submit(self._timed, d, fn)) for d in devs]
+        return {port: f.result() for port, f in futs}
+
+    def open(self, ports, baud=115200):
+        ports = [p for p in ports if not self._device(p).link.ser]
+        for p in ports:
+            self.devices[p].state = "connecting"
+        return self._run(ports, lambda d: d.link.connect(d.port, baud))
+
+    def close(self, ports=None):
+        ports = self.open_ports() if ports is None else ports
+        return self._run(ports, lambda d: d.link.close())
+
+    def apply_eq(self, g500, g2000, g4000, gain_global=1.0, bands=None, ports=None):
+        """Same EQ (3-band, or N-band with bands) on every targeted device."""
+        ports = self.open_ports() if ports is None else ports
+        return self._run(ports, lambda d: d.link.apply_eq(g500, g2000, g4000, gain_global=gain_global, bands=bands))
+
+    def sync_bank(self, entries, ports=None):
+        """Same profile bank on every targeted device (TeensyLink.sync_bank)."""
+        ports = self.open_ports() if ports is None else ports
+        return self._run(ports, lambda d: d.link.sync_bank(entries))
+
+    def apply_profiles(self, assignment: dict):
+        """{port: profile name}: a different (or the same) saved profile per device."""
+        store = profile_store()
+        params = {name: (store.summary(name)[1], profile_bands(store.load(name))) for name in set(assignment.values())}
+
+        def apply(d):
+            (gg, g500, g2000, g4000), bands = params[assignment[d.port]]
+            d.link.apply_eq(g500, g2000, g4000, gain_global=gg, bands=bands)
+        return self._run(list(assignment), apply)
+
+    def shutdown(self):
+        self.close()
+        for d in self.devices.values():
+            d.io.shutdown()
 
 
 # =========================
@@ -127,6 +1077,10 @@ class Staircase2Down1Up:
     def done(self):
         return len(self.reversals) >= STOP_REVERSALS
 
+    def uncertainty(self):
+        # dB still to be resolved: remaining reversals x current step
+        return max(0, STOP_REVERSALS - len(self.reversals)) * self.step
+
     def threshold(self):
         if not self.reversals:
             return self.level_db
@@ -134,6 +1088,242 @@ class Staircase2Down1Up:
         return sum(tail) / len(tail)
 
 
+# Threshold estimators selectable in the GUI: name -> method stored in profiles
+METHOD_STAIRCASE = "2-down-1-up staircase"
+METHOD_PSI = "Psi (Bayesian)"
+METHODS = {
+    METHOD_STAIRCASE: "2AFC 2-down-1-up (relative)",
+    METHOD_PSI: "2AFC psi Bayesian (relative)",
+}
+
+
+def make_estimator(method=METHOD_STAIRCASE, start_db=START_DB):
+    if method == METHOD_PSI:
+        from psi_estimator import PsiEstimator   # numpy, only when selected
+        return PsiEstimator(start_db=start_db, min_db=MIN_DB, max_db=MAX_DB)
+    return Staircase2Down1Up(start_db=start_db)
+
+
+class _Track:
+    __slots__ = ("freq", "est", "trials")
+
+    def __init__(self, freq, est):
+        self.freq = freq
+        self.est = est
+        self.trials = 0
+
+
+class TrackScheduler:
+    """
+    Runs one (or two) estimator tracks per frequency and decides which
+    track gets the next trial.
+
+    Sequential: frequencies in FREQS order, like the original test.
+    Interleaved: the next trial goes to the track with the widest remaining
+    uncertainty (a heap keyed on est.uncertainty(), so O(log tracks) per
+    trial), avoiding the same frequency twice in a row when possible.
+    With tracks_per_freq=2 the second track starts DUAL_TRACK_OFFSET_DB
+    lower and the threshold is the mean of both tracks.
+    """
+
+    def __init__(self, freqs=FREQS, method=METHOD_STAIRCASE, interleave=False, tracks_per_freq=1):
+        self.interleave = interleave
+        self.freqs = list(freqs)
+        self.tracks = {f: [_Track(f, make_estimator(method, start_db=START_DB - k * DUAL_TRACK_OFFSET_DB))
+                           for k in range(tracks_per_freq)]
+                       for f in self.freqs}
+        self._open = {f: tracks_per_freq for f in self.freqs}   # unfinished tracks per freq
+        self._last_freq = None
+        self._seq = 0
+        self._heap = []
+        self._order = deque(self.freqs)
+        if interleave:
+            for f in self.freqs:
+                for t in self.tracks[f]:
+                    self._push(t)
+
+    def _push(self, t: _Track):
+        self._seq += 1
+        heapq.heappush(self._heap, (-t.est.uncertainty(), self._seq, t))
+
+    def done(self):
+        return not any(self._open.values())
+
+    def finished_count(self):
+        return sum(1 for f in self.freqs if not self._open[f])
+
+    def next_track(self) -> _Track:
+        if not self.interleave:
+            f = self._order[0]
+            # alternate between the tracks of this frequency
+            return min((t for t in self.tracks[f] if not t.est.done()), key=lambda t: t.trials)
+
+        _, _, t = heapq.heappop(self._heap)
+        if t.freq == self._last_freq and self._heap:
+            other = heapq.heappop(self._heap)[2]
+            self._push(t)
+            t = other
+        return t
+
+    def trial_done(self, t: _Track):
+        """Call after t.est.update(). Returns the threshold when t's frequency just finished."""
+        t.trials += 1
+        self._last_freq = t.freq
+        if not t.est.done():
+            if self.interleave:
+                self._push(t)
+            return None
+
+        self._open[t.freq] -= 1
+        if self._open[t.freq]:
+            return None
+        if not self.interleave:
+            self._order.popleft()
+        thrs = [tr.est.threshold() for tr in self.tracks[t.freq]]
+        return sum(thrs) / len(thrs)
+
+
+# =========================
+# Trial timing
+# =========================
+class TrialClock:
+    """
+    Deadline scheduler for the audiogram worker.
+
+    Every event of a trial (tone on/off, next trial start) has an absolute
+    time.monotonic() deadline computed from the trial start, so a late
+    command does not push the ones after it. A command counts as acted on
+    halfway between its write and its OK; the measured write-to-act delay
+    (EWMA) is sent ahead of the next deadline. The error actual - planned
+    of every event is kept per kind for the session stats, as is the
+    oversleep of every wait ("wake").
+    """
+
+    def __init__(self, stop_event, clock=time.monotonic, sleep=time.sleep):
+        self.stop_event = stop_event
+        self.clock = clock
+        self.sleep = sleep
+        self.lead = 0.0
+        self.errors = {}   # kind -> [seconds late (+) / early (-)]
+
+    def wait_until(self, deadline) -> bool:
+        """Sleep until deadline unless Stop is pressed. Returns False if stopped."""
+        dt = deadline - self.clock()
+        if dt > TIMING_MARGIN_S and self.stop_event.wait(dt - TIMING_MARGIN_S):
+            return False
+        dt = deadline - self.clock()
+        if dt > 0:
+            self.sleep(dt)   # at most TIMING_MARGIN_S unless Event.wait woke early
+        self.record("wake", self.clock() - deadline)
+        return not self.stop_event.is_set()
+
+    def at(self, deadline, kind, fn, *args):
+        """fn(*args) so that it takes effect at deadline. Returns (effective time, result), None if stopped."""
+        if not self.wait_until(deadline - self.lead):
+            return None
+        t0 = self.clock()
+        res = fn(*args)
+        t = (t0 + self.clock()) / 2
+        self.lead += TIMING_LEAD_ALPHA * ((t - t0) - self.lead)
+        self.record(kind, t - deadline)
+        return t, res
+
+    def record(self, kind, error):
+        self.errors.setdefault(kind, []).append(error)
+
+    def stats(self) -> dict:
+        """{kind: {n, mean_ms, max_ms}}; mean/max of the overshoot (actual - planned)."""
+        return {k: {"n": len(v),
+                    "mean_ms": round(1e3 * sum(v) / len(v), 2),
+                    "max_ms": round(1e3 * max(v), 2)}
+                for k, v in self.errors.items() if v}
+
+
+# =========================
+# Session log
+# =========================
+# test parameters stored in every session header (replay.py can override them)
+SESSION_PARAMS = ("START_DB", "MIN_DB", "MAX_DB", "STEP_LARGE", "STEP_MED", "STEP_SMALL",
+                  "STOP_REVERSALS", "AVG_LAST_REVERSALS", "DUAL_TRACK_OFFSET_DB", "TONE_DUR", "GAP_DUR")
+
+
+def new_session_path():
+    return os.path.join(SESSIONS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".jsonl")
+
+
+class SessionRecorder:
+    """
+    Append-only JSONL log of one audiogram: a "session" header, one "trial"
+    record per answered trial, a "result" record at the end.
+
+    The worker thread only puts dicts on a queue; a writer thread encodes
+    them into a buffered file, flushed at least every SESSION_FLUSH_S and
+    on close(), so a crash loses at most that much.
+    """
+
+    def __init__(self, path, method, interleave, tracks):
+        self.path = path
+        self._t0 = time.monotonic()
+        self._q = queue.Queue()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8", buffering=1 << 16)
+        self._q.put({
+            "type": "session",
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "method": method,
+            "interleave": interleave,
+            "tracks": tracks,
+            "freqs_hz": FREQS,
+            "params": {k: globals()[k] for k in SESSION_PARAMS},
+        })
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def trial(self, **fields):
+        self._q.put(dict(type="trial", t=round(time.monotonic() - self._t0, 3), **fields))
+
+    def close(self, **fields):
+        self._q.put(dict(type="result", t=round(time.monotonic() - self._t0, 3), **fields))
+        self._q.put(None)
+        self._thread.join(timeout=5.0)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                rec = self._q.get(timeout=SESSION_FLUSH_S)
+            except queue.Empty:
+                rec = False
+            if rec is None:
+                break
+            if rec:
+                self._f.write(json.dumps(rec) + "\n")
+            if time.monotonic() - last_flush >= SESSION_FLUSH_S:
+                self._f.flush()
+                last_flush = time.monotonic()
+        self._f.close()
+
+
+def load_session(path):
+    """(header, trials, result) of a session log; result is None if the test was aborted."""
+    header, trials, result = None, [], None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            kind = rec.get("type")
+            if kind == "session":
+                header = rec
+            elif kind == "trial":
+                trials.append(rec)
+            elif kind == "result":
+                result = rec
+    if header is None:
+        raise ValueError(f"{path}: no session header")
+    return header, trials, result
+
+
 # =========================
 # Audiogram -> EQ
 # =========================
@@ -163,46 +1353,59 @@ def compute_eq_from_thresholds(thresholds):
     return g500, g2000, g4000, details
 
 
+def target_gains_from_thresholds(thresholds):
+    """{freq: gain dB}: the same rule per audiogram frequency, without band averaging (N-band target)."""
+    ref = min(thresholds.values())
+    return {f: max(GAIN_MIN_DB, min(GAIN_MAX_DB, GAIN_FACTOR * (thresholds[f] - ref))) for f in thresholds}
+
+
+def fit_nband_eq(target):
+    """
+    {freq: target gain dB} -> (gain of the stage at every FREQS entry, rms
+    error dB) of the least-squares N-band fit. Frequencies missing from
+    target are interpolated. Needs NumPy (offline_dsp).
+    """
+    import numpy as np
+    import offline_dsp
+    known = sorted(target)
+    t = np.interp(np.log(FREQS), np.log(known), [target[f] for f in known])
+    gains, err = offline_dsp.fit_nband(FREQS, t)
+    return tuple(float(g) for g in gains), err
+
+
+def band_summary(bands):
+    """(g500, g2000, g4000) of an N-band EQ: its stage gains there (STATUS, 3-band fallback)."""
+    g = dict(zip(FREQS, bands))
+    return tuple(g[min(FREQS, key=lambda x: abs(x - f))] for f in (500, 2000, 4000))
+
+
+def profile_bands(data):
+    """Stage gains per FREQS entry of a saved N-band profile, None for a 3-band one or other freqs."""
+    bands = bands_from_profile(data)
+    if bands is None or list(bands[0]) != [float(f) for f in FREQS]:
+        return None
+    return tuple(bands[1])
+
+
 # =========================
-# Profile storage (JSON)
+# Profile bank assignment
 # =========================
-def ensure_profiles_dir():
-    os.makedirs(PROFILES_DIR, exist_ok=True)
-
-def safe_name(name: str) -> str:
-    # keep it simple for filenames
-    name = name.strip()
-    name = "".join(c for c in name if c.isalnum() or c in ("-", "_", " "))
-    name = name.strip().replace(" ", "_")
-    return name
-
-def profile_path(name: str) -> str:
-    ensure_profiles_dir()
-    return os.path.join(PROFILES_DIR, f"{safe_name(name)}.json")
-
-def list_profiles():
-    ensure_profiles_dir()
-    out = []
-    for fn in os.listdir(PROFILES_DIR):
-        if fn.lower().endswith(".json"):
-            out.append(os.path.splitext(fn)[0].replace("_", " "))
-    out.sort(key=lambda s: s.lower())
-    return out
-
-def save_profile(name: str, data: dict):
-    p = profile_path(name)
-    with open(p, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-
-def load_profile(name: str) -> dict:
-    p = profile_path(name)
-    with open(p, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def delete_profile(name: str):
-    p = profile_path(name)
-    if os.path.exists(p):
-        os.remove(p)
+def load_bank_assignment() -> list:
+    """Profile name (or None) per on-device bank slot, as last synced from this PC."""
+    try:
+        with open(BANK_FILE, "r", encoding="utf-8") as f:
+            return list(json.load(f).get("slots", []))
+    except (OSError, ValueError):
+        return []
+
+def save_bank_assignment(slots):
+    with open(BANK_FILE, "w", encoding="utf-8") as f:
+        json.dump({"slots": list(slots)}, f, indent=2)
+
+def bank_entries(slots):
+    """TeensyLink.sync_bank() entries for these slot names."""
+    store = profile_store()
+    return [(name, store.summary(name)[1], profile_bands(store.load(name))) if name else None for name in slots]
 
 
 # =========================
@@ -214,15 +1417,33 @@ class App:
         self.root.title("Hearing Aid – 2AFC Audiogram + Profiles")
 
         self.link = TeensyLink()
+        self.link.on_state = lambda state, detail: self._ui(lambda: self._on_link_state(state, detail))
+        self.io = DeviceIO(self._ui)   # all serial I/O happens on this thread
 
         # audiogram state
         self.worker = None
         self.running = False
         self.awaiting_answer = False
+        self.stop_event = threading.Event()   # set by Stop; interrupts every wait of the worker
+        self.answers = queue.Queue()          # A/B choices from the Tk thread (None = stop)
         self.correct_interval = 1
         self.current_freq = None
         self.current_sc = None
         self.results = {}  # freq -> threshold_db
+        self.trace = {}    # freq -> levels presented so far (live plot)
+        self.method_var = tk.StringVar(value=METHOD_STAIRCASE)
+        self.interleave_var = tk.BooleanVar(value=False)
+        self.dual_var = tk.BooleanVar(value=False)
+        self.results_method = METHOD_STAIRCASE
+        self.session = None   # SessionRecorder of the running audiogram
+        self.session_path = None
+        self.timing_stats = {}   # TrialClock.stats() of the last audiogram
+        self.aud_win = None
+        self.diag_win = None
+        self.devices = DeviceManager()   # fitting station: extra units besides self.link
+        self.station_win = None
+        self.bank_win = None
+        self.bank_slots = load_bank_assignment()
 
         # current EQ settings (GUI sliders)
         self.gain_global = tk.DoubleVar(value=1.0)
@@ -234,9 +1455,20 @@ class App:
         self.profile_var = tk.StringVar(value="")
         self.profile_name_var = tk.StringVar(value="")
 
+        # stream slider changes while dragging
+        self.live_var = tk.BooleanVar(value=True)
+        self.nband_var = tk.BooleanVar(value=False)   # one EQ stage per audiogram frequency
+        self._nband_err = None
+        self.live_sender = None   # one per connection (toggle_connect)
+
+        # startup: show the window first, slow work runs in the background
+        self._startup = {}
         self._build_ui()
+        self._startup_mark("ui")
+        self.root.after(0, lambda: self._startup_mark("window"))
         self._refresh_ports()
-        self._refresh_profiles()
+        self._refresh_profiles_async()
+        threading.Thread(target=self._prewarm_plotting, daemon=True).start()
 
         # Key bindings for fast 2AFC
         self.root.bind("<a>", lambda e: self.answer(1))
@@ -274,31 +1506,34 @@ class App:
 
         ttk.Label(sfrm, text="Gain global (x)").grid(row=0, column=0, sticky="w")
         ttk.Scale(sfrm, from_=0.2, to=3.0, orient="horizontal",
-                  variable=self.gain_global).grid(row=0, column=1, sticky="ew", padx=6)
+                  variable=self.gain_global, command=self._on_slider_drag).grid(row=0, column=1, sticky="ew", padx=6)
         self.lbl_gain = ttk.Label(sfrm, text="1.00")
         self.lbl_gain.grid(row=0, column=2, sticky="w")
 
         ttk.Label(sfrm, text="EQ 500 Hz (dB)").grid(row=1, column=0, sticky="w")
         ttk.Scale(sfrm, from_=-20, to=30, orient="horizontal",
-                  variable=self.eq500).grid(row=1, column=1, sticky="ew", padx=6)
+                  variable=self.eq500, command=self._on_slider_drag).grid(row=1, column=1, sticky="ew", padx=6)
         self.lbl_500 = ttk.Label(sfrm, text="0.0")
         self.lbl_500.grid(row=1, column=2, sticky="w")
 
         ttk.Label(sfrm, text="EQ 2 kHz (dB)").grid(row=2, column=0, sticky="w")
         ttk.Scale(sfrm, from_=-20, to=30, orient="horizontal",
-                  variable=self.eq2000).grid(row=2, column=1, sticky="ew", padx=6)
+                  variable=self.eq2000, command=self._on_slider_drag).grid(row=2, column=1, sticky="ew", padx=6)
         self.lbl_2000 = ttk.Label(sfrm, text="0.0")
         self.lbl_2000.grid(row=2, column=2, sticky="w")
 
         ttk.Label(sfrm, text="EQ 4 kHz (dB)").grid(row=3, column=0, sticky="w")
         ttk.Scale(sfrm, from_=-20, to=30, orient="horizontal",
-                  variable=self.eq4000).grid(row=3, column=1, sticky="ew", padx=6)
+                  variable=self.eq4000, command=self._on_slider_drag).grid(row=3, column=1, sticky="ew", padx=6)
         self.lbl_4000 = ttk.Label(sfrm, text="0.0")
         self.lbl_4000.grid(row=3, column=2, sticky="w")
 
         btnrow = ttk.Frame(frm)
         btnrow.grid(row=5, column=0, columnspan=3, sticky="w", pady=(8, 0))
         ttk.Button(btnrow, text="Apply sliders to Teensy", command=self.apply_sliders).grid(row=0, column=0, padx=(0, 8))
+        ttk.Checkbutton(btnrow, text="Live update while dragging", variable=self.live_var).grid(row=0, column=1, padx=(0, 8))
+        ttk.Checkbutton(btnrow, text="N-band EQ (sliders offset the audiogram fit)", variable=self.nband_var,
+                        command=self._on_nband_toggle).grid(row=0, column=2)
 
         self.gain_global.trace_add("write", lambda *_: self._update_slider_labels())
         self.eq500.trace_add("write", lambda *_: self._update_slider_labels())
@@ -328,7 +1563,10 @@ class App:
         ttk.Button(profbtns, text="Load → sliders", command=self.load_selected_into_sliders).grid(row=0, column=0, padx=(0, 8))
         ttk.Button(profbtns, text="Apply selected to Teensy", command=self.apply_selected_profile).grid(row=0, column=1, padx=(0, 8))
         ttk.Button(profbtns, text="Save/Update from sliders", command=self.save_from_sliders).grid(row=0, column=2, padx=(0, 8))
-        ttk.Button(profbtns, text="Delete selected", command=self.delete_selected).grid(row=0, column=3)
+        ttk.Button(profbtns, text="Delete selected", command=self.delete_selected).grid(row=0, column=3, padx=(0, 8))
+        ttk.Button(profbtns, text="Fitting station…", command=self.show_station_window).grid(row=0, column=4, padx=(0, 8))
+        ttk.Button(profbtns, text="Device bank…", command=self.show_bank_window).grid(row=0, column=5, padx=(0, 8))
+        ttk.Button(profbtns, text="History…", command=self.show_history_window).grid(row=0, column=6)
 
         ttk.Separator(frm).grid(row=10, column=0, columnspan=3, sticky="ew", pady=10)
 
@@ -336,6 +1574,13 @@ class App:
         audfrm = ttk.Frame(frm)
         audfrm.grid(row=11, column=0, columnspan=3, sticky="ew")
         ttk.Label(audfrm, text="Audiogram (2AFC A/B, 8 freqs):").grid(row=0, column=0, sticky="w")
+        ttk.Label(audfrm, text="Method").grid(row=0, column=1, sticky="e", padx=(8, 0))
+        ttk.Combobox(audfrm, textvariable=self.method_var, state="readonly", width=22,
+                     values=list(METHODS)).grid(row=0, column=2, sticky="w", padx=(8, 0))
+        ttk.Checkbutton(audfrm, text="Interleave frequencies", variable=self.interleave_var).grid(
+            row=0, column=3, sticky="w", padx=(8, 0))
+        ttk.Checkbutton(audfrm, text="2 tracks/freq", variable=self.dual_var).grid(
+            row=0, column=4, sticky="w", padx=(8, 0))
 
         self.start_btn = ttk.Button(audfrm, text="Start Audiogram", command=self.start_audiogram)
         self.start_btn.grid(row=1, column=0, sticky="w", pady=(6, 0))
@@ -344,6 +1589,8 @@ class App:
         self.stop_btn.grid(row=1, column=1, sticky="w", pady=(6, 0), padx=(8, 0))
         self.show_aud_btn = ttk.Button(audfrm, text="Show Audiogram", command=self.show_audiogram_window)
         self.show_aud_btn.grid(row=1, column=2, sticky="w", pady=(6, 0), padx=(8, 0))
+        ttk.Button(audfrm, text="Serial diagnostics", command=self.show_diagnostics_window).grid(
+            row=1, column=3, sticky="w", pady=(6, 0), padx=(8, 0))
 
         self.prompt_var = tk.StringVar(value="Keys A/B work during test.")
         ttk.Label(audfrm, textvariable=self.prompt_var, wraplength=620).grid(row=2, column=0, columnspan=3, sticky="w", pady=(8, 0))
@@ -362,6 +1609,8 @@ class App:
         self.tree.column("freq", width=140, anchor="center")
         self.tree.column("thr", width=160, anchor="center")
         self.tree.grid(row=12, column=0, columnspan=3, sticky="nsew", pady=(8, 0))
+        # one persistent row per frequency, updated in place
+        self._tree_rows = {f: self.tree.insert("", "end", values=(f, "—")) for f in FREQS}
         frm.rowconfigure(12, weight=1)
 
         # Buttons after audiogram
@@ -378,19 +1627,106 @@ class App:
         ttk.Label(frm, textvariable=self.eq_info_var).grid(row=14, column=0, columnspan=3, sticky="w", pady=(6, 0))
 
 
+    SLIDERS_ENTRY = "(current sliders)"
+
     def show_audiogram_window(self):
-        """Open audiogram plot in a separate window (does not change any other behavior)."""
-        if not getattr(self, "results", None):
-            messagebox.showinfo("Audiogram", "No results yet.")
+        """
+        Audiogram plot in a separate window, with the EQ response of the
+        sliders or of any saved profile overlaid, and the level trace of the
+        frequency under test. The window and its Figure are built once and
+        follow the running test: finished thresholds update their point,
+        the level trace is blitted after every trial.
+        """
+        if self.aud_win is not None and self.aud_win.winfo_exists():
+            self._update_audiogram_plot()
+            self.aud_win.lift()
             return
 
+        import offline_dsp   # numpy/scipy are only needed for this window
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         win = tk.Toplevel(self.root)
         win.title("Audiogram")
-        win.geometry("800x500")
+        win.geometry("800x720")
+        self.aud_win = win
+
+        top = ttk.Frame(win, padding=(8, 6))
+        top.pack(fill="x")
+        ttk.Label(top, text="EQ response of:").pack(side="left")
+        self.aud_resp_var = tk.StringVar(value=self.SLIDERS_ENTRY)
+        combo = ttk.Combobox(top, textvariable=self.aud_resp_var, state="readonly", width=30,
+                             values=[self.SLIDERS_ENTRY] + list(self.profile_combo["values"]))
+        combo.pack(side="left", padx=6)
+        combo.bind("<<ComboboxSelected>>", lambda e: self._update_response_line())
+
+        fig = Figure(figsize=(8, 7), dpi=100)
+        ax = fig.add_subplot(211)
+
+        self._aud_line, = ax.plot([], [], marker="o", linewidth=1.5, label="Threshold")
+        ax.set_xscale("log")
+        ax.set_xticks([250, 500, 1000, 2000, 3000, 4000, 6000, 8000])
+        ax.set_xticklabels(["250", "500", "1000", "2000", "3000", "4000", "6000", "8000"])
+        ax.set_xlim(200, 9000)
+        # Your thresholds are 'dB rel' (often negative). Keep a stable view:
+        ax.set_ylim(-90, 0)
+
+        ax.set_title("Audiogram (threshold vs frequency)")
+        ax.set_xlabel("Frequency (Hz)")
+        ax.set_ylabel("Threshold (dB rel)")
+        ax.grid(True, which="both", linestyle="--", linewidth=0.6)
+
+        # EQ response on its own axis (gain in dB)
+        ax2 = ax.twinx()
+        self._resp_freqs = offline_dsp.RESPONSE_FREQS
+        self._eq_response_db = offline_dsp.eq_response_db
+        self._resp_line, = ax2.plot(self._resp_freqs, self._resp_freqs * 0.0,
+                                    color="tab:orange", linewidth=1.2, label="EQ response")
+        ax2.set_ylim(-25, 45)
+        ax2.set_ylabel("EQ gain (dB)")
+
+        # current level on the audiogram + level trace of the current frequency (blitted)
+        self._cur_marker, = ax.plot([], [], marker="x", color="tab:red", markersize=10,
+                                    linestyle="none", animated=True)
+        tax = fig.add_subplot(212)
+        self._trace_ax = tax
+        self._trace_line, = tax.plot([], [], marker=".", linewidth=1.0, drawstyle="steps-post", animated=True)
+        self._trace_label = tax.text(0.01, 0.95, "", transform=tax.transAxes, va="top", animated=True)
+        tax.set_xlim(0, TRACE_MAX_TRIALS)
+        tax.set_ylim(-90, 0)
+        tax.set_title("Level trace of the frequency under test")
+        tax.set_xlabel("Trial")
+        tax.set_ylabel("Level (dB rel)")
+        tax.grid(True, linestyle="--", linewidth=0.6)
+
+        fig.tight_layout()
+
+        self._aud_fig = fig
+        self._aud_canvas = FigureCanvasTkAgg(fig, master=win)
+        self._aud_canvas.get_tk_widget().pack(fill="both", expand=True)
+        self._aud_bg = None
+        self._aud_canvas.mpl_connect("draw_event", self._on_audiogram_draw)
+        self._update_audiogram_plot()
 
-        fig = Figure(figsize=(8, 5), dpi=100)
-        ax = fig.add_subplot(111)
+    def _on_audiogram_draw(self, _event):
+        # full redraw happened: keep the static background, then draw the animated artists
+        self._aud_bg = self._aud_canvas.copy_from_bbox(self._aud_fig.bbox)
+        self._draw_trace()
 
+    def _draw_trace(self):
+        self._trace_ax.draw_artist(self._trace_line)
+        self._trace_ax.draw_artist(self._trace_label)
+        self._cur_marker.axes.draw_artist(self._cur_marker)
+
+    def _aud_window_open(self):
+        return self.aud_win is not None and self.aud_win.winfo_exists()
+
+    def _update_audiogram_plot(self):
+        self._set_threshold_data()
+        self._set_trace_data()
+        self._update_response_line()
+
+    def _set_threshold_data(self):
         # Collect numeric points only
         xs, ys = [], []
         for f in sorted(self.results.keys()):
@@ -399,81 +1735,501 @@ class App:
                 ys.append(float(self.results[f]))
             except Exception:
                 continue
+        self._aud_line.set_data(xs, ys)
+
+    def _set_trace_data(self, f=None):
+        f = self.current_freq if f is None else f
+        levels = self.trace.get(f, []) if f is not None else []
+        self._trace_line.set_data(range(len(levels)), levels)
+        self._trace_label.set_text(f"{f} Hz" if f is not None else "")
+        if levels and self.running:
+            self._cur_marker.set_data([f], [levels[-1]])
+        else:
+            self._cur_marker.set_data([], [])
+        # grow the x axis instead of clipping long tracks (needs a full redraw)
+        if len(levels) > self._trace_ax.get_xlim()[1]:
+            self._trace_ax.set_xlim(0, len(levels) + TRACE_MAX_TRIALS // 2)
+            return True
+        return False
+
+    def _on_trial(self, f, level_db):
+        """Called on the Tk thread after every answered trial."""
+        self.trace.setdefault(f, []).append(level_db)
+        self._set_table_row(f, f"… {level_db:.1f}")
+        if not self._aud_window_open():
+            return
+        if self._set_trace_data(f) or self._aud_bg is None:
+            self._aud_canvas.draw_idle()   # x axis grew: full redraw
+            return
+        self._aud_canvas.restore_region(self._aud_bg)
+        self._draw_trace()
+        self._aud_canvas.blit(self._aud_fig.bbox)
+
+    def _on_result(self, f):
+        """Called on the Tk thread when the threshold of f is final."""
+        self._set_table_row(f, f"{self.results[f]:.1f}")
+        if not self._aud_window_open():
+            return
+        # the threshold line is part of the static background: one idle redraw
+        self._set_threshold_data()
+        if self.nband_var.get() and self.aud_resp_var.get() == self.SLIDERS_ENTRY:
+            self._update_response_line(quiet=True)   # the N-band target follows the results
+        self._aud_canvas.draw_idle()
+
+    def _update_response_line(self, quiet=False):
+        """quiet: during a run, a failed lookup keeps the old line instead of a dialog."""
+        name = self.aud_resp_var.get()
+        try:
+            if name == self.SLIDERS_ENTRY:
+                p = self._slider_params()
+                params, bands = (p["gain_global"], p["g500"], p["g2000"], p["g4000"]), p.get("bands")
+            else:
+                _, params = profile_store().summary(name)
+                bands = profile_bands(load_profile(name))
+        except Exception as e:
+            if not quiet:
+                messagebox.showerror("Profile", str(e))
+            return
+        if bands:
+            import offline_dsp
+            self._resp_line.set_ydata(offline_dsp.nband_response_db(params[0], FREQS, bands))
+        else:
+            self._resp_line.set_ydata(self._eq_response_db(*params))
+        self._aud_canvas.draw_idle()
 
-        if not xs:
-            messagebox.showinfo("Audiogram", "No numeric points to plot.")
+    def show_diagnostics_window(self):
+        """Rolling serial round-trip latency per command type (refreshed every second)."""
+        if self.diag_win is not None and self.diag_win.winfo_exists():
+            self.diag_win.lift()
             return
 
-        ax.plot(xs, ys, marker="o", linewidth=1.5)
-        ax.set_xscale("log")
-        ax.set_xticks([250, 500, 1000, 2000, 3000, 4000, 6000, 8000])
-        ax.set_xticklabels(["250", "500", "1000", "2000", "3000", "4000", "6000", "8000"])
-        ax.set_xlim(200, 9000)
-        # Your thresholds are 'dB rel' (often negative). Keep a stable view:
-        ax.set_ylim(-90, 0)
+        win = tk.Toplevel(self.root)
+        win.title("Serial diagnostics")
+        self.diag_win = win
+
+        edges = "/".join(str(e) for e in LATENCY_BUCKETS_MS)
+        cols = ("cmd", "n", "p50", "p95", "p99", "queue", "write", "flush", "reply", "hist")
+        heads = ("Command", "N", "p50 ms", "p95 ms", "p99 ms", "queue ms", "write ms", "flush ms", "reply ms",
+                 f"< {edges} ms, more")
+        tree = ttk.Treeview(win, columns=cols, show="headings", height=10)
+        for c, h in zip(cols, heads):
+            tree.heading(c, text=h)
+            tree.column(c, width={"cmd": 90, "hist": 200}.get(c, 80), anchor="center")
+        tree.pack(fill="both", expand=True, padx=8, pady=(8, 0))
+        ttk.Label(win, text="queue = waiting for a free window slot, write/flush = host + USB driver, "
+                            "reply = flushed → OK/ERR (cable + firmware). Breakdown columns are means.",
+                  wraplength=720).pack(anchor="w", padx=8, pady=4)
+
+        btns = ttk.Frame(win)
+        btns.pack(anchor="w", padx=8, pady=(0, 8))
+        ttk.Button(btns, text="Export CSV…", command=lambda: self._export_latency("csv")).grid(row=0, column=0, padx=(0, 8))
+        ttk.Button(btns, text="Export JSONL…", command=lambda: self._export_latency("jsonl")).grid(row=0, column=1, padx=(0, 8))
+        ttk.Button(btns, text="Reset", command=self.link.tracer.reset).grid(row=0, column=2)
+
+        rows = {}   # cmd type -> tree item, updated in place
+
+        def refresh():
+            if not win.winfo_exists():
+                return
+            means = self.link.tracer.breakdown()
+            hist = self.link.tracer.histogram()
+            for kind, (n, p50, p95, p99) in self.link.tracer.stats().items():
+                q, w, fl, r = means.get(kind, (0.0, 0.0, 0.0, 0.0))
+                vals = (kind, n, f"{p50:.2f}", f"{p95:.2f}", f"{p99:.2f}", f"{q:.2f}", f"{w:.2f}", f"{fl:.2f}", f"{r:.2f}",
+                        " ".join(str(c) for c in hist.get(kind, ())))
+                if kind in rows and tree.exists(rows[kind]):
+                    tree.item(rows[kind], values=vals)
+                else:
+                    rows[kind] = tree.insert("", "end", values=vals)
+            for kind in [k for k in rows if k not in means]:   # after Reset
+                tree.delete(rows.pop(kind))
+            win.after(1000, refresh)
+
+        refresh()
+
+    def _export_latency(self, fmt):
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(parent=self.diag_win, defaultextension=f".{fmt}",
+                                            filetypes=[(fmt.upper(), f"*.{fmt}")])
+        if not path:
+            return
+        try:
+            if fmt == "csv":
+                self.link.tracer.export_csv(path)
+            else:
+                self.link.tracer.export_jsonl(path)
+        except Exception as e:
+            messagebox.showerror("Export failed", str(e))
 
-        ax.set_title("Audiogram (threshold vs frequency)")
-        ax.set_xlabel("Frequency (Hz)")
-        ax.set_ylabel("Threshold (dB rel)")
-        ax.grid(True, which="both", linestyle="--", linewidth=0.6)
+    def show_station_window(self):
+        """Open several Teensy units and push EQ/profiles to a selection of them in parallel."""
+        if self.station_win is not None and self.station_win.winfo_exists():
+            self.station_win.lift()
+            return
 
-        fig.tight_layout()
+        win = tk.Toplevel(self.root)
+        win.title("Fitting station")
+        self.station_win = win
+
+        cols = ("port", "state", "result", "ms")
+        heads = ("Port", "State", "Last result", "ms")
+        tree = ttk.Treeview(win, columns=cols, show="headings", height=8, selectmode="extended")
+        for c, h in zip(cols, heads):
+            tree.heading(c, text=h)
+            tree.column(c, width=260 if c == "result" else 110, anchor="w" if c in ("port", "result") else "center")
+        tree.pack(fill="both", expand=True, padx=8, pady=(8, 0))
+        self._station_tree = tree
+
+        btns = ttk.Frame(win)
+        btns.pack(anchor="w", padx=8, pady=6)
+        ttk.Button(btns, text="Rescan", command=self._station_rescan).grid(row=0, column=0, padx=(0, 8))
+        ttk.Button(btns, text="Open", command=lambda: self._station_run(
+            "open", lambda ports: self.devices.open(ports))).grid(row=0, column=1, padx=(0, 8))
+        ttk.Button(btns, text="Close", command=lambda: self._station_run(
+            "close", lambda ports: self.devices.close(ports))).grid(row=0, column=2, padx=(0, 8))
+        ttk.Button(btns, text="Apply sliders", command=self._station_apply_sliders).grid(row=0, column=3, padx=(0, 8))
+        ttk.Button(btns, text="Apply selected profile", command=self._station_apply_profile).grid(row=0, column=4, padx=(0, 8))
+        ttk.Button(btns, text="Sync bank", command=lambda: self._station_run(
+            "sync bank", lambda ports: self.devices.sync_bank(bank_entries(self.bank_slots), ports=ports))
+                   ).grid(row=0, column=5)
+
+        self.station_var = tk.StringVar(value="Select devices (Ctrl/Shift-click), then Open.")
+        ttk.Label(win, textvariable=self.station_var).pack(anchor="w", padx=8, pady=(0, 8))
+        self._station_rescan()
+
+    def _station_rescan(self):
+        own = self.link.ser.port if self.link.ser else None   # the main connection keeps its port
+
+        def scan():
+            ports = [p.device for p in list_ports.comports() if p.device != own]
+            self._ui(lambda: self._station_set_ports(ports))
+        threading.Thread(target=scan, daemon=True).start()
+
+    def _station_set_ports(self, ports):
+        tree = self._station_tree
+        if not tree.winfo_exists():
+            return
+        for port in set(ports) | set(self.devices.open_ports()):
+            if not tree.exists(port):
+                tree.insert("", "end", iid=port, values=(port, "closed", "", ""))
+        self._station_refresh()
+
+    def _station_refresh(self):
+        tree = self._station_tree
+        for port, d in list(self.devices.devices.items()):
+            if not tree.exists(port):
+                continue
+            result = "" if d.ok is None else ("OK" if d.ok else d.error)
+            ms = "" if d.seconds is None else f"{1e3 * d.seconds:.0f}"
+            tree.item(port, values=(port, d.state, result, ms))
+
+    def _station_run(self, what, op, ports=None):
+        ports = list(self._station_tree.selection()) if ports is None else ports
+        if not ports:
+            messagebox.showerror("Fitting station", "Select at least one device.", parent=self.station_win)
+            return
 
-        canvas = FigureCanvasTkAgg(fig, master=win)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
+        def run():
+            t0 = time.perf_counter()
+            try:
+                res = op(ports)
+            except Exception as e:
+                msg = str(e)   # e is unbound once the except block ends
+                self._ui(lambda: messagebox.showerror("Fitting station", msg, parent=self.station_win))
+                return
+            dt = time.perf_counter() - t0
+            ok = sum(1 for r in res.values() if r[0])
+            msg = f"{what}: {ok}/{len(res)} OK in {1e3 * dt:.0f} ms"
+            self._ui(lambda: (self.station_var.set(msg), self._station_refresh()))
+
+        self.station_var.set(f"{what}…")
+        for port in ports:
+            d = self.devices.devices.get(port)
+            if d is not None and self._station_tree.exists(port):
+                self._station_tree.set(port, "state", "busy")
+        threading.Thread(target=run, daemon=True).start()
+
+    def _station_apply_sliders(self):
+        p = self._slider_params()
+        self._station_run("apply sliders", lambda ports: self.devices.apply_eq(**p, ports=ports))
+
+    def _station_apply_profile(self):
+        name = self._selected_profile_name()
+        if not name:
+            messagebox.showerror("Profile", "No profile selected.", parent=self.station_win)
+            return
+        self._station_run(f"apply '{name}'",
+                          lambda ports: self.devices.apply_profiles({p: name for p in ports}))
+
+    # ---------- Profile bank ----------
+    def show_bank_window(self):
+        """Saved profiles -> EEPROM slots of the Teensy, switchable without the PC."""
+        if self.bank_win is not None and self.bank_win.winfo_exists():
+            self.bank_win.lift()
+            return
+
+        win = tk.Toplevel(self.root)
+        win.title("Device profile bank")
+        self.bank_win = win
+
+        cols = ("slot", "profile", "device")
+        heads = ("Slot", "Profile", "On device")
+        tree = ttk.Treeview(win, columns=cols, show="headings", height=8, selectmode="browse")
+        for c, h in zip(cols, heads):
+            tree.heading(c, text=h)
+            tree.column(c, width=60 if c == "slot" else 180, anchor="center" if c == "slot" else "w")
+        tree.pack(fill="both", expand=True, padx=8, pady=(8, 0))
+        self._bank_tree = tree
+
+        btns = ttk.Frame(win)
+        btns.pack(anchor="w", padx=8, pady=6)
+        ttk.Button(btns, text="Read device", command=self._bank_read).grid(row=0, column=0, padx=(0, 8))
+        ttk.Button(btns, text="Put selected profile here", command=self._bank_assign).grid(row=0, column=1, padx=(0, 8))
+        ttk.Button(btns, text="Clear slot", command=lambda: self._bank_assign(None)).grid(row=0, column=2, padx=(0, 8))
+        ttk.Button(btns, text="Sync", command=self._bank_sync).grid(row=0, column=3, padx=(0, 8))
+        ttk.Button(btns, text="Switch to slot", command=self._bank_switch).grid(row=0, column=4)
+
+        self.bank_var = tk.StringVar(value="Only slots whose content differs are written.")
+        ttk.Label(win, textvariable=self.bank_var).pack(anchor="w", padx=8, pady=(0, 8))
+        self._bank_fill(None)
+        if self.link.ser:
+            self._bank_read()
 
+    def _bank_fill(self, state):
+        """Rows for self.bank_slots; state = (active, device hashes, our hashes) or None if unknown."""
+        tree = self._bank_tree
+        if not tree.winfo_exists():
+            return
+        n = len(state[1]) if state else len(self.bank_slots) + 1
+        sel = tree.selection()
+        tree.delete(*tree.get_children())
+        for slot in range(n):
+            name = self.bank_slots[slot] if slot < len(self.bank_slots) else None
+            dev = ""
+            if state:
+                active, have, mine = state
+                dev = "empty" if not have[slot] else ("in sync" if have[slot] == mine[slot] else "differs")
+                if slot == active:
+                    dev += " (active)"
+            tree.insert("", "end", iid=str(slot), values=(slot, name or "—", dev))
+        if sel and tree.exists(sel[0]):
+            tree.selection_set(sel[0])
+
+    def _bank_state(self):
+        active, have = self.link.bank_status()
+        mine = [self.link.bank_entry(e[0], *e[1], bands=e[2])[0] if e else 0 for e in bank_entries(self.bank_slots[:len(have)])]
+        return active, have, mine + [0] * (len(have) - len(mine))
+
+    def _bank_read(self):
+        if not self.link.ser:
+            messagebox.showerror("Not connected", "Connect to Teensy first.", parent=self.bank_win)
+            return
+        self.io.submit(self._bank_state, on_done=self._bank_fill,
+                       on_error=lambda e: messagebox.showerror("Profile bank", str(e), parent=self.bank_win))
+
+    def _bank_selected_slot(self):
+        sel = self._bank_tree.selection()
+        if not sel:
+            messagebox.showerror("Profile bank", "Select a slot.", parent=self.bank_win)
+            return None
+        return int(sel[0])
+
+    def _bank_assign(self, name=""):
+        slot = self._bank_selected_slot()
+        if slot is None:
+            return
+        if name == "":
+            name = self._selected_profile_name()
+            if not name:
+                messagebox.showerror("Profile", "No profile selected.", parent=self.bank_win)
+                return
+        slots = self.bank_slots + [None] * (slot + 1 - len(self.bank_slots))
+        slots[slot] = name
+        while slots and slots[-1] is None:
+            slots.pop()
+        self.bank_slots = slots
+        try:
+            save_bank_assignment(slots)
+        except OSError as e:
+            messagebox.showerror("Profile bank", str(e), parent=self.bank_win)
+        self._bank_tree.set(str(slot), "profile", name or "—")
+
+    def _bank_sync(self):
+        if not self.link.ser:
+            messagebox.showerror("Not connected", "Connect to Teensy first.", parent=self.bank_win)
+            return
+
+        def sync():
+            res = self.link.sync_bank(bank_entries(self.bank_slots))
+            return res, self._bank_state()
+
+        def done(r):
+            res, state = r
+            written = sum(1 for v in res.values() if v in ("stored", "erased"))
+            self.bank_var.set(f"Synced: {written} slot(s) written, {len(res) - written} unchanged.")
+            self._bank_fill(state)
+
+        self.bank_var.set("Syncing…")
+        self.io.submit(sync, on_done=done,
+                       on_error=lambda e: (self.bank_var.set("Sync failed."),
+                                           messagebox.showerror("Profile bank", str(e), parent=self.bank_win)))
+
+    def _bank_switch(self):
+        slot = self._bank_selected_slot()
+        if slot is None or not self.link.ser:
+            return
+        self.io.submit(lambda: (self.link.select_slot(slot), self._bank_state())[1], on_done=self._bank_fill,
+                       on_error=lambda e: messagebox.showerror("Profile bank", str(e), parent=self.bank_win))
 
     # ---------- Ports / connect ----------
     def _refresh_ports(self):
-        ports = [p.device for p in list_ports.comports()]
+        # comports() can take a while with many USB devices: never on the Tk thread
+        def scan():
+            ports = [p.device for p in list_ports.comports()]
+            self._ui(lambda: self._set_ports(ports))
+        threading.Thread(target=scan, daemon=True).start()
+
+    def _set_ports(self, ports):
         self.port_combo["values"] = ports
         if ports and not self.port_var.get():
             self.port_var.set(ports[0])
+        self._startup_mark("ports")
 
     def toggle_connect(self):
-        if self.link.ser:
-            self.link.close()
-            self.conn_btn.config(text="Connect")
-            self.status_var.set("Not connected.")
+        if self.link.port:   # connected, or waiting for an unplugged board
+            self.conn_btn.config(state="disabled")
+            self.status_var.set("Disconnecting…")
+
+            def closed(_):
+                self.conn_btn.config(text="Connect", state="normal")
+                self.status_var.set("Not connected.")
+            self._close_live_sender()
+            self.io.submit(self.link.close, on_done=closed, on_error=closed)
             return
 
         port = self.port_var.get().strip()
         if not port:
             messagebox.showerror("Port", "Select a serial port.")
             return
-        try:
-            self.link.connect(port)
-            self.conn_btn.config(text="Disconnect")
+
+        def connected(_):
+            self.conn_btn.config(text="Disconnect", state="normal")
             self.status_var.set(f"Connected: {port}")
-        except Exception as e:
+            self._close_live_sender()
+            self.live_sender = LiveEqSender(self.link, io=self.io, on_error=lambda e: self._ui(
+                lambda: self.status_var.set(f"Live update failed: {e}")))
+
+        def failed(e):
+            self.conn_btn.config(state="normal")
+            self.status_var.set("Not connected.")
             messagebox.showerror("Connect failed", str(e))
 
+        self.conn_btn.config(state="disabled")
+        self.status_var.set(f"Connecting to {port}…")
+        self.io.submit(self.link.connect, port, on_done=connected, on_error=failed)
+
     # ---------- Slider apply ----------
+    def _on_link_state(self, state, detail):
+        if not self.link.port:
+            return
+        if state == "lost":
+            self.status_var.set(f"Teensy lost ({detail}) — waiting for it to come back…")
+        elif state == "reconnected":
+            self.status_var.set(f"Reconnected: {detail} (EQ and test state restored)")
+            if self.live_sender:
+                self.live_sender.reset()
+
+    def _close_live_sender(self):
+        if self.live_sender:
+            self.live_sender.close()
+            self.live_sender = None
+
     def _update_slider_labels(self):
         self.lbl_gain.config(text=f"{self.gain_global.get():.2f}")
         self.lbl_500.config(text=f"{self.eq500.get():.1f}")
         self.lbl_2000.config(text=f"{self.eq2000.get():.1f}")
         self.lbl_4000.config(text=f"{self.eq4000.get():.1f}")
 
+    def _slider_params(self):
+        if self.nband_var.get():
+            return self._nband_params((self.eq500.get(), self.eq2000.get(), self.eq4000.get()))
+        return dict(
+            g500=self.eq500.get(),
+            g2000=self.eq2000.get(),
+            g4000=self.eq4000.get(),
+            gain_global=self.gain_global.get(),
+        )
+
+    def _nband_params(self, offsets=(0.0, 0.0, 0.0)):
+        """
+        apply_eq() kwargs of the N-band EQ: least-squares fit of the audiogram
+        target (0 dB without one) plus offsets at 500 / 2k / 4k Hz, both
+        interpolated on log frequency. Takes about a millisecond.
+        """
+        import numpy as np
+        logf = np.log(FREQS)
+        off = np.interp(logf, np.log([500, 2000, 4000]), offsets)
+        bands, self._nband_err = fit_nband_eq(dict(zip(FREQS, self._nband_target(FREQS) + off)))
+        g500, g2000, g4000 = band_summary(bands)
+        self.eq_info_var.set("N-band EQ: " + " | ".join(f"{f}={g:.1f}" for f, g in zip(FREQS, bands))
+                             + f" (fit RMS {self._nband_err:.1f} dB)")
+        return dict(g500=g500, g2000=g2000, g4000=g4000, gain_global=self.gain_global.get(), bands=bands)
+
+    def _nband_target(self, freqs):
+        """Audiogram target gains (0 dB without one) at freqs, interpolated on log frequency."""
+        import numpy as np
+        base = target_gains_from_thresholds(self.results) if self.results else {}
+        known = sorted(base)
+        if not known:
+            return np.zeros(len(freqs))
+        return np.interp(np.log(freqs), np.log(known), [base[f] for f in known])
+
+    def _on_nband_toggle(self):
+        if self.nband_var.get():
+            try:
+                self._slider_params()
+            except ImportError as e:
+                self.nband_var.set(False)
+                messagebox.showerror("N-band EQ", f"The N-band fit needs NumPy: {e}")
+                return
+        else:
+            self.eq_info_var.set("Computed EQ: (none)")
+        self._on_slider_drag()
+
+    def _on_slider_drag(self, _value=None):
+        # only user drags stream; loading a profile into the sliders does not
+        if self.live_var.get() and self.link.ser and self.live_sender:
+            self.live_sender.update(**self._slider_params())
+        elif self.nband_var.get():
+            self._slider_params()   # refit for the info line
+        if self._aud_window_open() and self.aud_resp_var.get() == self.SLIDERS_ENTRY:
+            self._update_response_line()
+
     def apply_sliders(self):
         if not self.link.ser:
             messagebox.showerror("Not connected", "Connect to Teensy first.")
             return
-        try:
-            self.link.apply_eq(
-                self.eq500.get(),
-                self.eq2000.get(),
-                self.eq4000.get(),
-                gain_global=self.gain_global.get()
-            )
-            messagebox.showinfo("Applied", "Sliders applied to Teensy.")
-        except Exception as e:
-            messagebox.showerror("Apply failed", str(e))
+        self.io.submit(self.link.apply_eq, **self._slider_params(),
+                       on_done=lambda _: self.status_var.set("Sliders applied to Teensy."),
+                       on_error=lambda e: messagebox.showerror("Apply failed", str(e)))
 
     # ---------- Profiles ----------
+    def _refresh_profiles_async(self):
+        def load():
+            try:
+                profs = list_profiles()
+            except Exception as e:
+                msg = str(e)
+                self._ui(lambda: messagebox.showerror("Profiles", msg))
+                return
+            self._ui(lambda: self._set_profiles(profs))
+        threading.Thread(target=load, daemon=True).start()
+
     def _refresh_profiles(self):
-        profs = list_profiles()
+        self._set_profiles(list_profiles())
+
+    def _set_profiles(self, profs):
+        self._startup_mark("profiles")
         self.profile_combo["values"] = profs
         # keep selection if still exists
         cur = self.profile_var.get().strip()
@@ -495,12 +2251,23 @@ class App:
         try:
             data = load_profile(name)
             eq = data.get("eq", {})
+            gains = [float(eq.get(k, 0.0)) for k in ("EQ500_db", "EQ2000_db", "EQ4000_db")]
+            if self.nband_var.get():
+                # the sliders are offsets on the audiogram fit: profile minus target
+                import numpy as np
+                bands = bands_from_profile(data)
+                if bands:
+                    gains = np.interp(np.log([500, 2000, 4000]), np.log(bands[0]), bands[1])
+                gains = np.asarray(gains) - self._nband_target([500, 2000, 4000])
             self.gain_global.set(float(eq.get("GAIN_global", 1.0)))
-            self.eq500.set(float(eq.get("EQ500_db", 0.0)))
-            self.eq2000.set(float(eq.get("EQ2000_db", 0.0)))
-            self.eq4000.set(float(eq.get("EQ4000_db", 0.0)))
+            self.eq500.set(float(gains[0]))
+            self.eq2000.set(float(gains[1]))
+            self.eq4000.set(float(gains[2]))
             self.profile_name_var.set(name)
-            self.eq_info_var.set(f"Loaded profile '{name}'.")
+            if self.nband_var.get():
+                self._slider_params()   # shows the refitted bands
+            else:
+                self.eq_info_var.set(f"Loaded profile '{name}'.")
         except Exception as e:
             messagebox.showerror("Load failed", str(e))
 
@@ -513,16 +2280,14 @@ class App:
             messagebox.showerror("Profile", "No profile selected.")
             return
         try:
-            data = load_profile(name)
-            eq = data.get("eq", {})
-            gg = float(eq.get("GAIN_global", 1.0))
-            g500 = float(eq.get("EQ500_db", 0.0))
-            g2000 = float(eq.get("EQ2000_db", 0.0))
-            g4000 = float(eq.get("EQ4000_db", 0.0))
-            self.link.apply_eq(g500, g2000, g4000, gain_global=gg)
-            messagebox.showinfo("Applied", f"Profile '{name}' applied to Teensy.")
+            _, (gg, g500, g2000, g4000) = profile_store().summary(name)
+            bands = profile_bands(load_profile(name))
         except Exception as e:
             messagebox.showerror("Apply failed", str(e))
+            return
+        self.io.submit(self.link.apply_eq, g500, g2000, g4000, gain_global=gg, bands=bands,
+                       on_done=lambda _: messagebox.showinfo("Applied", f"Profile '{name}' applied to Teensy."),
+                       on_error=lambda e: messagebox.showerror("Apply failed", str(e)))
 
     def save_from_sliders(self):
         name = self.profile_name_var.get().strip()
@@ -530,17 +2295,20 @@ class App:
             messagebox.showerror("Profile name", "Enter a profile name (New/Name).")
             return
 
+        p = self._slider_params()
         data = {
             "method": "manual sliders",
             "thresholds_db_rel": None,
             "eq": {
-                "GAIN_global": float(self.gain_global.get()),
-                "EQ500_db": float(self.eq500.get()),
-                "EQ2000_db": float(self.eq2000.get()),
-                "EQ4000_db": float(self.eq4000.get()),
+                "GAIN_global": float(p["gain_global"]),
+                "EQ500_db": float(p["g500"]),
+                "EQ2000_db": float(p["g2000"]),
+                "EQ4000_db": float(p["g4000"]),
             },
             "notes": {}
         }
+        if p.get("bands"):
+            data["eq"]["bands_db"] = {str(f): g for f, g in zip(FREQS, p["bands"])}
         try:
             save_profile(name, data)
             self._refresh_profiles()
@@ -552,6 +2320,46 @@ class App:
         except Exception as e:
             messagebox.showerror("Save failed", str(e))
 
+    def show_history_window(self):
+        """Saved versions of the selected profile; an older one can be made current again."""
+        name = self._selected_profile_name()
+        if not name:
+            messagebox.showerror("Profile", "No profile selected.")
+            return
+        win = tk.Toplevel(self.root)
+        win.title(f"History of '{name}'")
+        cols = ("version", "saved", "kind", "gain", "eq500", "eq2000", "eq4000")
+        heads = ("Version", "Saved", "Kind", "Gain", "500 Hz", "2 kHz", "4 kHz")
+        tree = ttk.Treeview(win, columns=cols, show="headings", height=10, selectmode="browse")
+        for c, h in zip(cols, heads):
+            tree.heading(c, text=h)
+            tree.column(c, width=140 if c == "saved" else 70, anchor="w" if c in ("saved", "kind") else "center")
+        tree.pack(fill="both", expand=True, padx=8, pady=(8, 0))
+        info = tk.StringVar(value="Restoring saves the selected version as the newest one.")
+
+        def fill():
+            tree.delete(*tree.get_children())
+            for version, saved_at, kind, _, (gg, g500, g2000, g4000) in reversed(profile_store().history(name)):
+                saved = time.strftime("%Y-%m-%d %H:%M", time.localtime(saved_at))
+                tree.insert("", "end", iid=str(version),
+                            values=(version, saved, kind, f"{gg:.2f}", f"{g500:.1f}", f"{g2000:.1f}", f"{g4000:.1f}"))
+
+        def restore():
+            sel = tree.selection()
+            if not sel:
+                return
+            try:
+                version = profile_store().restore(name, int(sel[0]))
+            except Exception as e:
+                messagebox.showerror("Restore failed", str(e), parent=win)
+                return
+            fill()
+            info.set(f"Version {sel[0]} restored as version {version}.")
+
+        ttk.Button(win, text="Restore selected version", command=restore).pack(anchor="w", padx=8, pady=6)
+        ttk.Label(win, textvariable=info).pack(anchor="w", padx=8, pady=(0, 8))
+        fill()
+
     def delete_selected(self):
         name = self._selected_profile_name()
         if not name:
@@ -573,9 +2381,16 @@ class App:
             return
 
         self.results = {}
+        self.trace = {}
+        self.current_freq = None
+        self.results_method = self.method_var.get()
         self._refresh_table()
+        if self._aud_window_open():
+            self._update_audiogram_plot()
 
         self.running = True
+        self.stop_event.clear()
+        self.answers = queue.Queue()
         self.start_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
         self.compute_btn.config(state="disabled")
@@ -584,117 +2399,243 @@ class App:
         self.eq_info_var.set("Computed EQ: (none)")
 
         self.prompt_var.set("Entering TEST mode…")
-        try:
-            self.link.set_test_mode(True)
-        except Exception as e:
+
+        def test_mode_on(_):
+            if not self.running:   # Stop pressed meanwhile
+                return
+            if self.worker is not None and self.worker.is_alive():   # started by an earlier Start's callback
+                return
+            self.worker = threading.Thread(target=self._worker_run, daemon=True)
+            self.worker.start()
+
+        def failed(e):
             messagebox.showerror("Serial", str(e))
             self.stop_audiogram()
-            return
 
-        self.worker = threading.Thread(target=self._worker_run, daemon=True)
-        self.worker.start()
+        self.io.submit(self.link.set_test_mode, True, on_done=test_mode_on, on_error=failed)
 
     def stop_audiogram(self):
         self.running = False
         self.awaiting_answer = False
+        self.stop_event.set()
+        self.answers.put(None)   # wake the worker if it waits for an answer
+        self.link.cancel_trial()  # ... or for the end of a firmware-timed trial
         self.btnA.config(state="disabled")
         self.btnB.config(state="disabled")
-
-        self.start_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
 
         if self.link.ser:
-            try:
-                self.link.set_test_mode(False)
-            except:
-                pass
+            self.io.submit(self.link.set_test_mode, False)
 
+        if self.worker is not None and self.worker.is_alive():
+            # Start stays disabled until the worker has left its finally block:
+            # it still owns self.running, self.session and the stop event
+            self.prompt_var.set("Stopping…")
+            return
+        self.start_btn.config(state="normal")
         self.prompt_var.set("Stopped. You can start again.")
 
     def _worker_run(self):
+        interleave = self.interleave_var.get()
+        tracks = 2 if self.dual_var.get() else 1
+        sched = TrackScheduler(FREQS, method=self.results_method,
+                               interleave=interleave, tracks_per_freq=tracks)
         try:
-            for idx, f in enumerate(FREQS, start=1):
-                if not self.running:
-                    break
-
+            self.session = SessionRecorder(new_session_path(), self.results_method, interleave, tracks)
+            self.session_path = self.session.path
+        except OSError as e:
+            self.session = self.session_path = None
+            msg = f"Session log disabled: {e}"
+            self._ui(lambda: self.status_var.set(msg))
+        self.clock = TrialClock(self.stop_event)
+        self._next_start = time.monotonic()
+        tuned = None
+        try:
+            while self.running and not sched.done():
+                track = sched.next_track()
+                f = track.freq
                 self.current_freq = f
-                self.current_sc = Staircase2Down1Up(start_db=START_DB)
-
-                self._ui(lambda: self.prompt_var.set(f"[{idx}/{len(FREQS)}] {f} Hz — answer A/B (keyboard works)."))
-                self.link.set_freq(f)
-                time.sleep(0.15)
+                self.current_sc = track.est
 
-                while self.running and not self.current_sc.done():
-                    self.correct_interval = 1 if random.random() < 0.5 else 2
-                    level_db = self.current_sc.level_db
+                if f != tuned:
+                    idx = sched.finished_count() + 1
+                    self._ui(lambda: self.prompt_var.set(f"[{idx}/{len(FREQS)}] {f} Hz — answer A/B (keyboard works)."))
+                    self._resumable(self.io.call, self.link.set_freq, f)   # returns once the Teensy acknowledged it
+                    tuned = f
 
-                    self._ui(lambda lvl=level_db: self.prompt_var.set(
-                        f"{f} Hz | level {lvl:.1f} dB | Where was the tone? A or B"
-                    ))
-
-                    self._play_interval(1, level_db if self.correct_interval == 1 else -90.0)
-                    time.sleep(GAP_DUR)
-                    self._play_interval(2, level_db if self.correct_interval == 2 else -90.0)
-
-                    self.awaiting_answer = True
-                    self._ui(lambda: (self.btnA.config(state="normal"), self.btnB.config(state="normal")))
-                    while self.running and self.awaiting_answer:
-                        time.sleep(0.02)
-                    self._ui(lambda: (self.btnA.config(state="disabled"), self.btnB.config(state="disabled")))
-
-                    time.sleep(PAUSE_BETWEEN_TRIALS)
-
-                if not self.running:
+                if not self._run_trial(f, track.est, sched.tracks[f].index(track)):
                     break
 
-                thr = self.current_sc.threshold()
-                self.results[f] = thr
-                self._ui(self._refresh_table)
+                thr = sched.trial_done(track)
+                if thr is not None:
+                    self.results[f] = thr
+                    self._ui(lambda f=f: self._on_result(f))
 
             # done
             try:
-                self.link.set_test_mode(False)
+                self.io.call(self.link.set_test_mode, False)
             except:
                 pass
 
             if self.running:
-                self._ui(lambda: self.prompt_var.set("Audiogram complete ✅"))
+                worst = max((v["max_ms"] for v in self.clock.stats().values()), default=0.0)
+                self._ui(lambda: self.prompt_var.set(f"Audiogram complete ✅ (timing: max overshoot {worst:.1f} ms)"))
                 self._ui(lambda: self.compute_btn.config(state="normal"))
                 self._ui(lambda: self.save_auto_btn.config(state="normal"))
                 self._ui(lambda: self.apply_auto_btn.config(state="normal"))
 
         except Exception as e:
-            self._ui(lambda: messagebox.showerror("Error", str(e)))
+            if self.running:
+                msg = str(e)
+                self._ui(lambda: messagebox.showerror("Error", msg))
         finally:
+            self.timing_stats = self.clock.stats()
+            if self.session:
+                self.session.close(completed=sched.done(),
+                                   thresholds_db_rel={str(k): float(v) for k, v in self.results.items()},
+                                   timing=self.timing_stats)
+                self.session = None
+            stopped = self.stop_event.is_set()
+            self.running = False   # before Start is re-enabled, so a new run never sees it reset
             self._ui(lambda: self.start_btn.config(state="normal"))
             self._ui(lambda: self.stop_btn.config(state="disabled"))
-            self.running = False
-
-    def _play_interval(self, interval_num: int, db_level: float):
-        self._ui(lambda n=interval_num: self.prompt_var.set(f"Playing interval {'A' if n==1 else 'B'}…"))
-        self.link.set_level_db(db_level)
-        time.sleep(TONE_DUR)
-        self.link.set_level_db(-90.0)
-        time.sleep(0.05)
+            if stopped:
+                self._ui(lambda: self.prompt_var.set("Stopped. You can start again."))
+
+    def _run_trial(self, f, est, track=0) -> bool:
+        """One 2AFC trial on estimator est. Returns False if the test was stopped."""
+        self.correct_interval = 1 if random.random() < 0.5 else 2
+        level_db = est.level_db
+
+        self._ui(lambda lvl=level_db: self.prompt_var.set(
+            f"{f} Hz | level {lvl:.1f} dB | Where was the tone? A or B"
+        ))
+
+        if not self._resumable(self._play_trial, f, level_db):
+            return False
+
+        # drop key presses made while the tones were playing
+        stale = []
+        while not self.answers.empty():
+            stale.append(self.answers.get_nowait())
+        if None in stale:
+            return False
+        self.awaiting_answer = True
+        t_open = time.monotonic()
+        self._ui(lambda: (self.btnA.config(state="normal"), self.btnB.config(state="normal")))
+        item = self.answers.get()   # blocks without CPU until A/B or Stop
+        self.awaiting_answer = False
+        self._ui(lambda: (self.btnA.config(state="disabled"), self.btnB.config(state="disabled")))
+        if item is None or not self.running:
+            return False
+        choice, t_answer = item
+        correct = choice == self.correct_interval
+        n_rev = len(getattr(est, "reversals", ()))
+        est.update(correct)
+        if self.session:
+            self.session.trial(freq=f, track=track, level_db=level_db, interval=self.correct_interval,
+                               answer=choice, correct=correct, rt=round(t_answer - t_open, 3),
+                               reversal=len(getattr(est, "reversals", ())) > n_rev,
+                               late_ms=round(1e3 * self.clock.errors["start"][-1], 2))
+        self._ui(lambda: self._on_trial(f, level_db))
+
+        # the next trial starts PAUSE_BETWEEN_TRIALS after the answer, whatever happens in between
+        self._next_start = t_answer + PAUSE_BETWEEN_TRIALS
+        return True
+
+    def _resumable(self, fn, *args):
+        """fn(*args); if the Teensy drops out meanwhile, wait for the reconnect and run it again."""
+        while True:
+            try:
+                return fn(*args)
+            except LinkLost:
+                self._await_link()
+
+    def _await_link(self):
+        self._ui(lambda: self.prompt_var.set("Teensy disconnected — the test resumes when it is back…"))
+        deadline = time.monotonic() + RESUME_TIMEOUT
+        while not self.link.online.wait(0.1):
+            if self.stop_event.is_set() or not self.link.port:
+                raise LinkLost("Teensy disconnected")
+            if time.monotonic() > deadline:
+                raise LinkLost(f"Teensy did not come back within {RESUME_TIMEOUT:.0f} s")
+        self._next_start = time.monotonic()   # the outage is not a timing error
+        self._ui(lambda f=self.current_freq: self.prompt_var.set(f"{f} Hz — Teensy back, repeating the trial…"))
+
+    def _play_trial(self, f, level_db) -> bool:
+        """Play intervals A and B, starting at the deadline self._next_start. Returns False if the test was stopped."""
+        clock, t0 = self.clock, self._next_start
+        if self.link.has_trial_cmd:
+            try:
+                r = clock.at(t0, "start", self.io.call, self.link.trial,
+                             f, level_db, self.correct_interval, TONE_DUR, GAP_DUR)
+            except TeensyError:
+                if self.link.has_trial_cmd:
+                    raise
+            else:
+                if r is None or not self.running:
+                    return False
+                self._ui(lambda: self.prompt_var.set("Playing intervals A and B…"))
+                t_on, done = r
+                try:
+                    done.result(timeout=2 * TONE_DUR + GAP_DUR + CMD_TIMEOUT)
+                except CancelledError:
+                    return False
+                # the firmware times the tones itself; this is when the host sees the end
+                clock.record("done", time.monotonic() - (t_on + 2 * TONE_DUR + GAP_DUR))
+                return self.running
+
+        # host-timed fallback for firmware without TRIAL: four LEVEL commands on deadlines
+        edges = []
+        try:
+            for n, on in ((1, t0), (2, t0 + TONE_DUR + GAP_DUR)):
+                db = level_db if self.correct_interval == n else -90.0
+                r = clock.at(on, "start" if n == 1 else "onset", self.io.call, self.link.set_level_db, db)
+                if r is None:
+                    return False
+                edges.append(r[0])
+                self._ui(lambda n=n: self.prompt_var.set(f"Playing interval {'A' if n==1 else 'B'}…"))
+                r = clock.at(on + TONE_DUR, "offset", self.io.call, self.link.set_level_db, -90.0)
+                if r is None:
+                    return False
+                edges.append(r[0])
+        finally:
+            if len(edges) % 2:
+                try:
+                    self.io.call(self.link.set_level_db, -90.0)   # always silence the tone, also on Stop
+                except:
+                    pass
+        clock.record("tone", edges[1] - edges[0] - TONE_DUR)
+        clock.record("tone", edges[3] - edges[2] - TONE_DUR)
+        clock.record("gap", edges[2] - edges[1] - GAP_DUR)
+        return True
 
     def answer(self, choice_interval: int):
         if not (self.running and self.awaiting_answer and self.current_sc):
             return
-        correct = (choice_interval == self.correct_interval)
-        self.current_sc.update(correct)
-        self.awaiting_answer = False
+        self.answers.put((choice_interval, time.monotonic()))
 
     def _refresh_table(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
         for f in FREQS:
-            self.tree.insert("", "end", values=(f, f"{self.results.get(f, '—') if f in self.results else '—'}"))
+            self._set_table_row(f, f"{self.results[f]:.1f}" if f in self.results else "—")
+
+    def _set_table_row(self, f, text):
+        iid = self._tree_rows[f]
+        if self.tree.set(iid, "thr") != text:
+            self.tree.set(iid, "thr", text)
 
     # ---------- After audiogram actions ----------
     def compute_eq_to_sliders(self):
         if not self.results:
             messagebox.showerror("No data", "Run audiogram first.")
             return
+        if self.nband_var.get():
+            # the fit already follows the audiogram; the sliders are offsets
+            self.eq500.set(0.0)
+            self.eq2000.set(0.0)
+            self.eq4000.set(0.0)
+            self._slider_params()
+            return
         g500, g2000, g4000, details = compute_eq_from_thresholds(self.results)
         self.eq500.set(g500)
         self.eq2000.set(g2000)
@@ -708,12 +2649,14 @@ class App:
         if not self.results:
             messagebox.showerror("No data", "Run audiogram first.")
             return
-        g500, g2000, g4000, details = compute_eq_from_thresholds(self.results)
-        try:
-            self.link.apply_eq(g500, g2000, g4000, gain_global=self.gain_global.get())
-            messagebox.showinfo("Applied", "Computed EQ applied to Teensy.")
-        except Exception as e:
-            messagebox.showerror("Apply failed", str(e))
+        if self.nband_var.get():
+            p = self._nband_params()
+        else:
+            g500, g2000, g4000, details = compute_eq_from_thresholds(self.results)
+            p = dict(g500=g500, g2000=g2000, g4000=g4000, gain_global=self.gain_global.get())
+        self.io.submit(self.link.apply_eq, **p,
+                       on_done=lambda _: messagebox.showinfo("Applied", "Computed EQ applied to Teensy."),
+                       on_error=lambda e: messagebox.showerror("Apply failed", str(e)))
 
     def save_audiogram_as_profile(self):
         if not self.results:
@@ -725,8 +2668,13 @@ class App:
             return
 
         g500, g2000, g4000, details = compute_eq_from_thresholds(self.results)
+        bands = None
+        if self.nband_var.get():
+            bands = self._nband_params()["bands"]
+            g500, g2000, g4000 = band_summary(bands)
+            details["nband_fit_rms_db"] = round(self._nband_err, 2)
         data = {
-            "method": "2AFC 2-down-1-up (relative)",
+            "method": METHODS[self.results_method],
             "freqs_hz": FREQS,
             "thresholds_db_rel": {str(k): float(v) for k, v in self.results.items()},
             "eq": {
@@ -737,6 +2685,12 @@ class App:
             },
             "notes": details,
         }
+        if bands:
+            data["eq"]["bands_db"] = {str(f): g for f, g in zip(FREQS, bands)}   # one stage per frequency
+        if self.session_path:
+            data["session"] = self.session_path   # trial log, re-scorable with replay.py
+        if self.timing_stats:
+            data["timing"] = self.timing_stats    # presentation timing of the audiogram (ms overshoot)
         try:
             save_profile(name, data)
             self._refresh_profiles()
@@ -748,10 +2702,33 @@ class App:
     def _ui(self, fn):
         self.root.after(0, fn)
 
+    # ---------- Startup ----------
+    STARTUP_STEPS = ("ui", "window", "ports", "profiles", "plotting")
+
+    def _prewarm_plotting(self):
+        try:   # warm-up: the audiogram window imports these, later that is a dict lookup
+            for name in ("matplotlib.figure", "matplotlib.backends.backend_tkagg", "offline_dsp"):
+                importlib.import_module(name)
+        except ImportError:
+            pass   # reported when the audiogram window is opened
+        self._ui(lambda: self._startup_mark("plotting"))
+
+    def _startup_mark(self, step):
+        if step in self._startup:
+            return
+        self._startup[step] = 1e3 * (time.perf_counter() - _T_START)
+        if "--startup-report" in sys.argv and all(k in self._startup for k in self.STARTUP_STEPS):
+            report = " | ".join(f"{k} {self._startup[k]:.0f} ms" for k in self.STARTUP_STEPS)
+            print(f"startup: {report}", file=sys.stderr)
+            self.root.after(0, self.root.destroy)
+
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = App(root)
     root.mainloop()
+    app._close_live_sender()
+    app.io.shutdown()
+    app.devices.shutdown()
 
 
@@ -0,0 +1,173 @@
+#include "bank.h"
+#include "dsp.h"
+#include <EEPROM.h>
+
+// ===== EEPROM layout =====
+// 0: magic (u32), 4: active slot (u8, 0xFF = none)
+// 8 + i * BANK_SLOT_BYTES: hash (u32, 0 = empty), body
+static const uint32_t BANK_MAGIC = 0x314B4248;   // "HBK1"
+static const int BANK_HEADER_BYTES = 8;
+static const int BANK_SLOT_BYTES = 4 + BANK_BODY_MAX;
+static const uint8_t NO_SLOT = 0xFF;
+
+// factory programs, written to slots 0 and 1 when the bank is formatted
+struct UserProfile {
+  const char* name;
+  float gainGlobal;
+  float g500;
+  float g2000;
+  float g4000;
+};
+
+static const UserProfile FACTORY[] = {
+  {"ALICE", 1.0f,  6.0f, 12.0f, 18.0f},
+  {"BOB",   1.0f,  0.0f,  8.0f, 10.0f},
+};
+
+static uint32_t gHash[BANK_MAX_SLOTS];   // RAM copy, BANK needs no EEPROM read
+static int gActive = -1;
+
+uint32_t crc32(const uint8_t* d, size_t n) {
+  uint32_t crc = 0xFFFFFFFF;
+  while (n--) {
+    crc ^= *d++;
+    for (int i = 0; i < 8; i++) crc = (crc & 1) ? (crc >> 1) ^ 0xEDB88320 : crc >> 1;
+  }
+  return ~crc;
+}
+
+static int slotAddr(int slot) { return BANK_HEADER_BYTES + slot * BANK_SLOT_BYTES; }
+
+// EEPROM.update only writes bytes that changed (less flash wear)
+static void writeBytes(int addr, const void* data, size_t n) {
+  const uint8_t* p = (const uint8_t*)data;
+  for (size_t i = 0; i < n; i++) EEPROM.update(addr + i, p[i]);
+}
+
+static void readBytes(int addr, void* data, size_t n) {
+  uint8_t* p = (uint8_t*)data;
+  for (size_t i = 0; i < n; i++) p[i] = EEPROM.read(addr + i);
+}
+
+static size_t bodyLen(const uint8_t* body) {
+  return BANK_HEAD_BYTES + (size_t)body[16] * BANK_RECORD_BYTES;
+}
+
+static void setActive(int slot) {
+  gActive = slot;
+  EEPROM.update(4, slot < 0 ? NO_SLOT : (uint8_t)slot);
+}
+
+int bankSlots() {
+  const int n = (EEPROM.length() - BANK_HEADER_BYTES) / BANK_SLOT_BYTES;
+  return n < BANK_MAX_SLOTS ? n : BANK_MAX_SLOTS;
+}
+
+int bankActive() { return gActive; }
+
+uint32_t bankHash(int slot) {
+  return (slot >= 0 && slot < bankSlots()) ? gHash[slot] : 0;
+}
+
+bool bankStore(int slot, uint32_t hash, const uint8_t* body, size_t len) {
+  if (slot < 0 || slot >= bankSlots() || hash == 0) return false;
+  if (len < (size_t)BANK_HEAD_BYTES || body[16] > BANK_MAX_RECORDS || len != bodyLen(body)) return false;
+  if (crc32(body, len) != hash) return false;
+  // invalidate, body, hash last: a power cut leaves an empty slot, not a mix
+  const int addr = slotAddr(slot);
+  const uint32_t zero = 0;
+  if (gHash[slot] != 0) writeBytes(addr, &zero, 4);
+  writeBytes(addr + 4, body, len);
+  writeBytes(addr, &hash, 4);
+  gHash[slot] = hash;
+  if (gActive == slot) bankLoad(slot);   // the running program was updated
+  return true;
+}
+
+bool bankErase(int slot) {
+  if (slot < 0 || slot >= bankSlots()) return false;
+  const uint32_t zero = 0;
+  writeBytes(slotAddr(slot), &zero, 4);
+  gHash[slot] = 0;
+  if (gActive == slot) setActive(-1);
+  return true;
+}
+
+bool bankLoad(int slot) {
+  if (slot < 0 || slot >= bankSlots() || gHash[slot] == 0) return false;
+  uint8_t body[BANK_BODY_MAX];
+  const int addr = slotAddr(slot) + 4;
+  readBytes(addr, body, BANK_HEAD_BYTES);
+  if (body[16] > BANK_MAX_RECORDS) return false;
+  const size_t len = bodyLen(body);
+  readBytes(addr + BANK_HEAD_BYTES, body + BANK_HEAD_BYTES, len - BANK_HEAD_BYTES);
+  if (crc32(body, len) != gHash[slot]) return false;   // corrupt: keep the current program
+
+  float v[4];
+  memcpy(v, body, sizeof(v));
+  const DspParams p = {v[0], v[1], v[2], v[3]};
+  const int n = body[16];
+  if (n == 0) {
+    dspApply(p);
+  } else {
+    DspCoef coefs[BANK_MAX_RECORDS];
+    for (int i = 0; i < n; i++) {
+      const uint8_t* r = body + BANK_HEAD_BYTES + i * BANK_RECORD_BYTES;
+      coefs[i].filter = r[0];
+      coefs[i].stage = r[1];
+      memcpy(coefs[i].c, r + 2, sizeof(coefs[i].c));
+    }
+    if (!dspApplyCoefficients(p, coefs, n)) return false;
+  }
+  if (gActive != slot) setActive(slot);
+  return true;
+}
+
+int bankFind(const char* name) {
+  char stored[BANK_NAME_BYTES];
+  for (int i = 0; i < bankSlots(); i++) {
+    if (gHash[i] == 0) continue;
+    readBytes(slotAddr(i) + 4 + 17, stored, BANK_NAME_BYTES);
+    stored[BANK_NAME_BYTES - 1] = 0;
+    if (strcasecmp(stored, name) == 0) return i;
+  }
+  return -1;
+}
+
+int bankNext() {
+  const int n = bankSlots();
+  for (int k = 1; k <= n; k++) {
+    const int i = (gActive + k + n) % n;
+    if (gHash[i] != 0) return i;
+  }
+  return -1;
+}
+
+static void storeFactory(int slot, const UserProfile& u) {
+  uint8_t body[BANK_HEAD_BYTES] = {0};
+  const float v[4] = {u.gainGlobal, u.g500, u.g2000, u.g4000};
+  memcpy(body, v, sizeof(v));
+  body[16] = 0;
+  strncpy((char*)body + 17, u.name, BANK_NAME_BYTES - 1);
+  bankStore(slot, crc32(body, sizeof(body)), body, sizeof(body));
+}
+
+void bankInit() {
+  uint32_t magic;
+  readBytes(0, &magic, 4);
+  if (magic != BANK_MAGIC) {
+    const uint32_t zero = 0;
+    for (int i = 0; i < bankSlots(); i++) writeBytes(slotAddr(i), &zero, 4);
+    memset(gHash, 0, sizeof(gHash));
+    for (int i = 0; i < (int)(sizeof(FACTORY) / sizeof(FACTORY[0])) && i < bankSlots(); i++) {
+      storeFactory(i, FACTORY[i]);
+    }
+    setActive(-1);
+    writeBytes(0, &BANK_MAGIC, 4);
+    return;
+  }
+  for (int i = 0; i < bankSlots(); i++) readBytes(slotAddr(i), &gHash[i], 4);
+  const uint8_t active = EEPROM.read(4);
+  gActive = -1;
+  if (active != NO_SLOT) bankLoad(active);   // power-up: last program used
+}
@@ -0,0 +1,31 @@
+#pragma once
+#include <Arduino.h>
+
+// On-device profile bank: fitted EQ programs kept in EEPROM (flash
+// emulated on Teensy 4), switched with "PROFILE <slot>" or the button,
+// applied again at power-up without a host.
+//
+// A slot body is what the host sends with STORE:
+//   gain g500 g2000 g4000 (f32 LE) | n (u8) | name (12 bytes, NUL padded)
+//   | n COEF records (filter, stage, 5 x int32 Q30)
+// stored with its CRC-32 (the host's content hash). n = 0: the stages
+// are computed by dspApply() instead.
+static const int BANK_MAX_SLOTS = 8;
+static const int BANK_NAME_BYTES = 12;
+static const int BANK_HEAD_BYTES = 16 + 1 + BANK_NAME_BYTES;
+static const int BANK_RECORD_BYTES = 22;       // same record as COEF
+static const int BANK_MAX_RECORDS = 8;         // one stage per audiogram frequency
+static const int BANK_BODY_MAX = BANK_HEAD_BYTES + BANK_MAX_RECORDS * BANK_RECORD_BYTES;
+
+void bankInit();                 // format on first boot, then load the active slot
+int bankSlots();                 // slots that fit in this board's EEPROM
+int bankActive();                // -1 if none
+uint32_t bankHash(int slot);     // 0 = empty
+
+bool bankStore(int slot, uint32_t hash, const uint8_t* body, size_t len);   // false: bad slot/body/hash
+bool bankErase(int slot);
+bool bankLoad(int slot);         // apply and remember as active; false if empty/corrupt
+int bankFind(const char* name);  // slot by name (case-insensitive), -1 if none
+int bankNext();                  // next non-empty slot after the active one, -1 if none
+
+uint32_t crc32(const uint8_t* d, size_t n);
@@ -1,6 +1,66 @@
 #include "dsp.h"
 #include <math.h>
 
+// ===== Trial gate =====
+// Sample-accurate 2AFC intervals driven by the audio block clock:
+//   [interval 1: tone] [gap] [interval 2: tone]
+// Only the chosen interval lets the test tone through, with linear
+// onset/offset ramps. Outside a trial the gate is either open (LEVEL
+// controls the tone as before) or closed (after a trial finished).
+class AudioTrialGate : public AudioStream {
+public:
+  AudioTrialGate() : AudioStream(1, inputQueueArray) {}
+
+  void start(uint32_t toneSamples, uint32_t gapSamples, uint32_t rampSamples, int interval) {
+    __disable_irq();
+    tone = toneSamples;
+    gap = gapSamples;
+    ramp = rampSamples ? rampSamples : 1;
+    sigStart = (interval == 2) ? toneSamples + gapSamples : 0;
+    total = 2 * toneSamples + gapSamples;
+    pos = 0;
+    done = false;
+    mode = GATE_TRIAL;
+    __enable_irq();
+  }
+  void open()  { __disable_irq(); mode = GATE_OPEN; done = false; __enable_irq(); }
+  bool running() const { return mode == GATE_TRIAL; }
+  bool takeDone() {
+    if (!done) return false;
+    done = false;
+    return true;
+  }
+
+  virtual void update(void) {
+    audio_block_t* block = receiveWritable(0);
+    if (!block) return;
+    if (mode == GATE_CLOSED) { release(block); return; }   // nothing transmitted = silence
+    if (mode == GATE_TRIAL) {
+      for (int i = 0; i < AUDIO_BLOCK_SAMPLES; i++, pos++) {
+        block->data[i] = (int16_t)(block->data[i] * envelope(pos));
+      }
+      if (pos >= total) { mode = GATE_CLOSED; done = true; }
+    }
+    transmit(block);
+    release(block);
+  }
+
+private:
+  enum { GATE_OPEN, GATE_CLOSED, GATE_TRIAL };
+
+  float envelope(uint32_t n) const {
+    if (n < sigStart || n >= sigStart + tone) return 0.0f;
+    n -= sigStart;
+    uint32_t edge = (n < tone - n) ? n : tone - n;   // distance to the nearest interval edge
+    return (edge >= ramp) ? 1.0f : (float)edge / (float)ramp;
+  }
+
+  audio_block_t* inputQueueArray[1];
+  volatile uint8_t mode = GATE_OPEN;
+  volatile bool done = false;
+  uint32_t tone = 0, gap = 0, ramp = 1, sigStart = 0, total = 0, pos = 0;
+};
+
 // ===== Audio Shield path =====
 AudioInputUSB        usb_in;
 
@@ -8,6 +68,7 @@ AudioAmplifier       amp;
 AudioFilterBiquad    eq1, eq2, eq3;
 
 AudioSynthWaveform   testTone;
+AudioTrialGate       trialGate;
 AudioMixer4          outMix;        // 0=normal audio, 1=test tone
 
 AudioOutputI2S       i2s_out;
@@ -30,8 +91,9 @@ AudioConnection eq1_to_eq2(eq1, 0, eq2, 0);
 AudioConnection eq2_to_eq3(eq2, 0, eq3, 0);
 AudioConnection eq3_to_out(eq3, 0, outMix, 0);
 
-// test tone -> outMix ch1
-AudioConnection test_to_out(testTone, 0, outMix, 1);
+// test tone -> trial gate -> outMix ch1
+AudioConnection test_to_gate(testTone, 0, trialGate, 0);
+AudioConnection gate_to_out(trialGate, 0, outMix, 1);
 
 // outMix -> Audio Shield L / R
 AudioConnection out_to_L(outMix, 0, i2s_out, 0);
@@ -40,6 +102,7 @@ AudioConnection out_to_R(outMix, 0, i2s_out, 1);
 
 // ===== state =====
 static DspParams gParams = {1.0f, 0.0f, 0.0f, 0.0f};
+static bool  gHostStages = false;   // eq1..eq3 hold COEF stages, not the gParams bands
 static bool  gTestMode = false;
 static float gTestFreq = 1000.0f;
 static float gTestDb   = -90.0f;
@@ -48,6 +111,8 @@ static const float Q_500  = 1.0f;
 static const float Q_2000 = 1.0f;
 static const float Q_4000 = 1.0f;
 
+static const float TRIAL_RAMP_MS = 10.0f;
+
 float clampf(float x, float lo, float hi) {
   if (x < lo) return lo;
   if (x > hi) return hi;
@@ -86,21 +151,38 @@ static void biquadPeaking(AudioFilterBiquad& f, int stage, float freqHz, float Q
   f.setCoefficients((uint32_t)stage, c);
 }
 
-static void applyInternal() {
+static void applyGain() {
   amp.gain(gParams.gainGlobal);
+}
 
-  biquadPeaking(eq1, 0,  500.0f, Q_500,  gParams.g500);
-  biquadPeaking(eq2, 0, 2000.0f, Q_2000, gParams.g2000);
-  biquadPeaking(eq3, 0, 4000.0f, Q_4000, gParams.g4000);
+static AudioFilterBiquad* const eqFilters[DSP_NUM_EQ] = { &eq1, &eq2, &eq3 };
 
-  // routing
+static void applyEq500()  { biquadPeaking(eq1, 0,  500.0f, Q_500,  gParams.g500);  }
+static void applyEq2000() { biquadPeaking(eq2, 0, 2000.0f, Q_2000, gParams.g2000); }
+static void applyEq4000() { biquadPeaking(eq3, 0, 4000.0f, Q_4000, gParams.g4000); }
+
+static void applyRouting() {
   outMix.gain(0, gTestMode ? 0.0f : 1.0f);  // normal
   outMix.gain(1, gTestMode ? 1.0f : 0.0f);  // test tone
+}
 
+static void applyTestTone() {
   testTone.frequency(gTestFreq);
   testTone.amplitude(dbToAmp(gTestDb));
 }
 
+static void applyInternal() {
+  applyGain();
+
+  applyEq500();
+  applyEq2000();
+  applyEq4000();
+
+  // routing
+  applyRouting();
+  applyTestTone();
+}
+
 void dspInit() {
   // Audio Shield init
   sgtl5000.enable();
@@ -124,16 +206,82 @@ void dspInit() {
   applyInternal();
 }
 
+// Only the stages whose value actually changed are recomputed, so one
+// SET command costs at most one amp update + the changed biquads.
 void dspApply(const DspParams& p) {
+  DspParams n;
+  n.gainGlobal = clampf(p.gainGlobal, 0.0f, 4.0f);
+  n.g500  = clampf(p.g500,  -20.0f, 30.0f);
+  n.g2000 = clampf(p.g2000, -20.0f, 30.0f);
+  n.g4000 = clampf(p.g4000, -20.0f, 30.0f);
+
+  // after COEF (possibly N-band) every stage 0 is rewritten, which also
+  // ends each filter's cascade there again
+  const bool all = gHostStages;
+  const bool chGain = n.gainGlobal != gParams.gainGlobal;
+  const bool ch500  = all || n.g500  != gParams.g500;
+  const bool ch2000 = all || n.g2000 != gParams.g2000;
+  const bool ch4000 = all || n.g4000 != gParams.g4000;
+  gParams = n;
+  gHostStages = false;
+
+  // update all changed stages inside one audio block
+  AudioNoInterrupts();
+  if (chGain) applyGain();
+  if (ch500)  applyEq500();
+  if (ch2000) applyEq2000();
+  if (ch4000) applyEq4000();
+  AudioInterrupts();
+}
+
+// COEF: no pow/sin/cos here, the host already did the math.
+bool dspApplyCoefficients(const DspParams& p, const DspCoef* coefs, int n) {
+  for (int i = 0; i < n; i++) {
+    if (coefs[i].filter >= DSP_NUM_EQ || coefs[i].stage >= DSP_MAX_STAGES) return false;
+  }
   gParams.gainGlobal = clampf(p.gainGlobal, 0.0f, 4.0f);
   gParams.g500  = clampf(p.g500,  -20.0f, 30.0f);
   gParams.g2000 = clampf(p.g2000, -20.0f, 30.0f);
   gParams.g4000 = clampf(p.g4000, -20.0f, 30.0f);
-  applyInternal();
+
+  AudioNoInterrupts();
+  applyGain();
+  for (int i = 0; i < n; i++) {
+    eqFilters[coefs[i].filter]->setCoefficients(coefs[i].stage, (const int*)coefs[i].c);
+  }
+  AudioInterrupts();
+  gHostStages = true;
+  return true;
 }
 
 DspParams dspGet() { return gParams; }
 
-void dspSetTestMode(bool on) { gTestMode = on; applyInternal(); }
-void dspSetTestFreq(float hz) { gTestFreq = clampf(hz, 50.0f, 12000.0f); applyInternal(); }
-void dspSetTestLevelDb(float db) { gTestDb = clampf(db, -90.0f, -3.0f); applyInternal(); }
+void dspSetTestMode(bool on) { gTestMode = on; applyRouting(); }
+void dspSetTestFreq(float hz) { gTestFreq = clampf(hz, 50.0f, 12000.0f); applyTestTone(); }
+void dspSetTestLevelDb(float db) {
+  gTestDb = clampf(db, -90.0f, -3.0f);
+  AudioNoInterrupts();
+  applyTestTone();
+  trialGate.open();   // LEVEL takes over the tone again (cancels a running trial)
+  AudioInterrupts();
+}
+
+static uint32_t msToSamples(float ms) {
+  return (uint32_t)(ms * (AUDIO_SAMPLE_RATE_EXACT / 1000.0f) + 0.5f);
+}
+
+void dspStartTrial(float hz, float db, int interval, float toneMs, float gapMs) {
+  gTestFreq = clampf(hz, 50.0f, 12000.0f);
+  gTestDb   = clampf(db, -90.0f, -3.0f);
+  toneMs = clampf(toneMs, 10.0f, 5000.0f);
+  gapMs  = clampf(gapMs, 0.0f, 5000.0f);
+  const float rampMs = (toneMs < 2.0f * TRIAL_RAMP_MS) ? toneMs / 2.0f : TRIAL_RAMP_MS;
+
+  // tone parameters and gate schedule start in the same audio block
+  AudioNoInterrupts();
+  applyTestTone();
+  trialGate.start(msToSamples(toneMs), msToSamples(gapMs), msToSamples(rampMs), interval);
+  AudioInterrupts();
+}
+
+bool dspTrialDone() { return trialGate.takeDone(); }
@@ -19,5 +19,26 @@ void dspSetTestMode(bool on);
 void dspSetTestFreq(float hz);
 void dspSetTestLevelDb(float db);
 
+// Firmware-timed 2AFC trial: tone in `interval` (1 or 2), gap between them.
+// dspTrialDone() returns true once when the second interval has ended.
+void dspStartTrial(float hz, float db, int interval, float toneMs, float gapMs);
+bool dspTrialDone();
+
+// Biquad stage computed by the host (COEF command), in the Teensy Audio
+// integer format: b0 b1 b2 -a1 -a2 as Q30. filter 0..2 = eq1..eq3.
+struct DspCoef {
+  uint8_t filter;
+  uint8_t stage;
+  int32_t c[5];
+};
+static const int DSP_NUM_EQ = 3;
+static const int DSP_MAX_STAGES = 4;   // per AudioFilterBiquad
+
+// Like dspApply, but loads the given stages as-is instead of computing them.
+// p is only stored (STATUS) and used for the amp gain. Per filter, stages
+// must come in ascending order: the last one written ends its cascade, so
+// 3 bands (stage 0 each) and N bands (stages 0..k) replace each other.
+bool dspApplyCoefficients(const DspParams& p, const DspCoef* coefs, int n);
+
 // helpers
 float clampf(float x, float lo, float hi);
@@ -4,17 +4,13 @@
 #include <SPI.h>
 
 #include "dsp.h"
+#include "bank.h"
 
 // ===================== PARAMS / PROFILES =====================
-struct UserProfile {
-  float gainGlobal;
-  float g500;
-  float g2000;
-  float g4000;
-};
-
-UserProfile ALICE = {1.0f,  6.0f, 12.0f, 18.0f};
-UserProfile BOB   = {1.0f,  0.0f,  8.0f, 10.0f};
+// Profiles live in the EEPROM bank (bank.cpp). A push button between this
+// pin and GND steps through the stored programs without a host.
+static const int BANK_BUTTON_PIN = 2;
+static const uint32_t BANK_BUTTON_DEBOUNCE_MS = 30;
 
 static void printStatus() {
   DspParams p = dspGet();
@@ -26,6 +22,246 @@ static void printStatus() {
   Serial.println("END");
 }
 
+// COEF payload: per stage filter(u8) stage(u8) 5 x int32 LE, then one checksum byte
+static const int COEF_RECORD_BYTES = 22;
+static const int COEF_MAX_RECORDS = DSP_NUM_EQ * DSP_MAX_STAGES;
+
+static void decodeCoefRecords(const uint8_t* buf, int n, DspCoef* out) {
+  for (int i = 0; i < n; i++) {
+    const uint8_t* r = buf + i * COEF_RECORD_BYTES;
+    out[i].filter = r[0];
+    out[i].stage = r[1];
+    memcpy(out[i].c, r + 2, sizeof(out[i].c));   // Teensy is little-endian
+  }
+}
+
+static bool readCoefRecords(int n, DspCoef* out) {
+  static uint8_t buf[COEF_MAX_RECORDS * COEF_RECORD_BYTES + 1];
+  const size_t len = (size_t)n * COEF_RECORD_BYTES + 1;
+  if (Serial.readBytes((char*)buf, len) != len) return false;
+  uint8_t sum = 0;
+  for (size_t i = 0; i + 1 < len; i++) sum += buf[i];
+  if (sum != buf[len - 1]) return false;
+  decodeCoefRecords(buf, n, out);
+  return true;
+}
+
+// ===================== BINARY FRAMES =====================
+// Negotiated with "BIN ON" (CAPS lists BIN). Each frame is COBS encoded and
+// ends with 0x00; decoded it is opcode, seq, payload, CRC-16/CCITT-FALSE (LE)
+// over opcode..payload. Replies echo seq. No String, no strtof, no heap.
+// Back to ASCII on OP_ASCII, when the host closes the port (DTR) and on reset.
+enum : uint8_t {
+  OP_TEST = 0x01, OP_FREQ = 0x02, OP_LEVEL = 0x03, OP_SET = 0x04,
+  OP_TRIAL = 0x05, OP_STATUS = 0x06, OP_COEF = 0x07, OP_PROFILE = 0x08,
+  OP_BANK = 0x09, OP_STORE = 0x0A, OP_ERASE = 0x0B,
+  OP_ASCII = 0x0F,
+  OP_OK = 0x80, OP_ERR = 0x81, OP_STATUS_REPLY = 0x82, OP_DONE = 0x83,
+  OP_BANK_REPLY = 0x84,
+};
+
+static const int FRAME_MAX = 2 + 17 + COEF_MAX_RECORDS * COEF_RECORD_BYTES + 2;
+static_assert(2 + 5 + BANK_BODY_MAX + 2 <= FRAME_MAX, "STORE frame must fit");
+static const int REPLY_MAX = 1 + 4 * BANK_MAX_SLOTS;   // largest reply payload (BANK)
+static bool gBinary = false;
+static uint8_t rxEnc[FRAME_MAX + FRAME_MAX / 254 + 2];
+static int rxLen = 0;
+static bool rxOverflow = false;
+
+static uint16_t crc16(const uint8_t* d, size_t n) {
+  uint16_t crc = 0xFFFF;
+  while (n--) {
+    crc ^= (uint16_t)(*d++) << 8;
+    for (int i = 0; i < 8; i++) crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+  }
+  return crc;
+}
+
+// returns the decoded length, 0 on error
+static size_t cobsDecode(const uint8_t* in, size_t n, uint8_t* out, size_t outMax) {
+  size_t i = 0, o = 0;
+  while (i < n) {
+    uint8_t code = in[i];
+    if (code == 0 || i + code > n || o + code > outMax + 1) return 0;
+    for (uint8_t k = 1; k < code; k++) out[o++] = in[i + k];
+    i += code;
+    if (code < 255 && i < n) out[o++] = 0;
+  }
+  return o;
+}
+
+static size_t cobsEncode(const uint8_t* in, size_t n, uint8_t* out) {
+  size_t o = 1, codePos = 0;
+  uint8_t code = 1;
+  for (size_t i = 0; i < n; i++) {
+    if (in[i] == 0) {
+      out[codePos] = code; codePos = o++; code = 1;
+    } else {
+      out[o++] = in[i];
+      if (++code == 255) { out[codePos] = code; codePos = o++; code = 1; }
+    }
+  }
+  out[codePos] = code;
+  return o;
+}
+
+static void sendFrame(uint8_t op, uint8_t seq, const void* payload, size_t n) {
+  uint8_t raw[2 + REPLY_MAX + 2];
+  uint8_t enc[sizeof(raw) + 2];
+  if (n > REPLY_MAX) n = REPLY_MAX;
+  raw[0] = op;
+  raw[1] = seq;
+  if (n) memcpy(raw + 2, payload, n);
+  const uint16_t crc = crc16(raw, n + 2);
+  raw[n + 2] = crc & 0xFF;
+  raw[n + 3] = crc >> 8;
+  Serial.write(enc, cobsEncode(raw, n + 4, enc));
+  Serial.write((uint8_t)0);
+}
+
+static void frameOk(uint8_t seq) { sendFrame(OP_OK, seq, nullptr, 0); }
+static void frameErr(uint8_t seq, const char* msg) { sendFrame(OP_ERR, seq, msg, strlen(msg)); }
+
+static float f32At(const uint8_t* p) { float v; memcpy(&v, p, 4); return v; }
+
+static bool applyProfile(const char* arg);
+
+static void sendBankFrame(uint8_t seq) {
+  uint8_t p[REPLY_MAX];
+  const int n = bankSlots();
+  p[0] = (uint8_t)(int8_t)bankActive();
+  for (int i = 0; i < n; i++) {
+    const uint32_t h = bankHash(i);
+    memcpy(p + 1 + 4 * i, &h, 4);
+  }
+  sendFrame(OP_BANK_REPLY, seq, p, 1 + 4 * n);
+}
+
+static void handleFrame(const uint8_t* f, size_t n) {
+  if (n < 4) return;
+  const uint16_t crc = f[n - 2] | (f[n - 1] << 8);
+  if (crc16(f, n - 2) != crc) return;   // dropped: the host times out
+  const uint8_t op = f[0], seq = f[1];
+  const uint8_t* p = f + 2;
+  const size_t len = n - 4;
+
+  switch (op) {
+    case OP_TEST:
+      if (len != 1) break;
+      dspSetTestMode(p[0] != 0);
+      frameOk(seq);
+      return;
+    case OP_FREQ:
+      if (len != 4) break;
+      dspSetTestFreq(f32At(p));
+      frameOk(seq);
+      return;
+    case OP_LEVEL:
+      if (len != 4) break;
+      dspSetTestLevelDb(f32At(p));
+      frameOk(seq);
+      return;
+    case OP_SET:
+      if (len != 16) break;
+      dspApply({f32At(p), f32At(p + 4), f32At(p + 8), f32At(p + 12)});
+      frameOk(seq);
+      return;
+    case OP_TRIAL: {
+      if (len != 13) break;
+      const int interval = p[8];
+      if (interval != 1 && interval != 2) { frameErr(seq, "TRIAL interval must be 1 or 2"); return; }
+      const uint16_t toneMs = p[9] | (p[10] << 8), gapMs = p[11] | (p[12] << 8);
+      dspStartTrial(f32At(p), f32At(p + 4), interval, toneMs, gapMs);
+      frameOk(seq);
+      return;
+    }
+    case OP_STATUS: {
+      DspParams s = dspGet();
+      const float v[4] = {s.gainGlobal, s.g500, s.g2000, s.g4000};
+      sendFrame(OP_STATUS_REPLY, seq, v, sizeof(v));
+      return;
+    }
+    case OP_COEF: {
+      if (len < 17) break;
+      const int count = p[16];
+      if (count > COEF_MAX_RECORDS || len != 17 + (size_t)count * COEF_RECORD_BYTES) break;
+      DspCoef coefs[COEF_MAX_RECORDS];
+      decodeCoefRecords(p + 17, count, coefs);
+      if (!dspApplyCoefficients({f32At(p), f32At(p + 4), f32At(p + 8), f32At(p + 12)}, coefs, count)) {
+        frameErr(seq, "COEF bad filter/stage");
+        return;
+      }
+      frameOk(seq);
+      return;
+    }
+    case OP_PROFILE: {
+      char name[16];
+      if (len == 0 || len >= sizeof(name)) break;
+      memcpy(name, p, len);
+      name[len] = 0;
+      if (applyProfile(name)) frameOk(seq);
+      else frameErr(seq, "Unknown profile");
+      return;
+    }
+    case OP_BANK:
+      sendBankFrame(seq);
+      return;
+    case OP_STORE: {
+      if (len < 5) break;
+      uint32_t hash;
+      memcpy(&hash, p + 1, 4);
+      if (bankStore(p[0], hash, p + 5, len - 5)) frameOk(seq);
+      else frameErr(seq, "STORE bad slot/body");
+      return;
+    }
+    case OP_ERASE:
+      if (len != 1) break;
+      if (bankErase(p[0])) frameOk(seq);
+      else frameErr(seq, "ERASE bad slot");
+      return;
+    case OP_ASCII:
+      frameOk(seq);
+      gBinary = false;
+      return;
+    default:
+      frameErr(seq, "Unknown command");
+      return;
+  }
+  frameErr(seq, "Bad payload");
+}
+
+static void pollFrames() {
+  static uint8_t dec[FRAME_MAX];
+  if (!Serial.dtr()) { gBinary = false; return; }   // host closed the port
+  while (gBinary && Serial.available()) {
+    const int c = Serial.read();
+    if (c != 0) {
+      if (rxLen < (int)sizeof(rxEnc)) rxEnc[rxLen++] = (uint8_t)c;
+      else rxOverflow = true;
+      continue;
+    }
+    if (!rxOverflow && rxLen > 0) {
+      const size_t n = cobsDecode(rxEnc, rxLen, dec, sizeof(dec));
+      if (n) handleFrame(dec, n);
+    }
+    rxLen = 0;
+    rxOverflow = false;
+  }
+}
+
+// Parse up to n whitespace-separated floats from s. Returns how many were read.
+static int parseFloats(const char* s, float* out, int n) {
+  int i = 0;
+  while (i < n) {
+    char* end;
+    float v = strtof(s, &end);
+    if (end == s) break;
+    out[i++] = v;
+    s = end;
+  }
+  return i;
+}
+
 static void parseCommand(const String& lineRaw) {
   String line = lineRaw;
   line.trim();
@@ -88,19 +324,126 @@ static void parseCommand(const String& lineRaw) {
     return;
   }
 
+  // TRIAL freq level interval tone_ms gap_ms : OK now, DONE when both intervals played
+  if (cmd == "TRIAL") {
+    float v[5];
+    if (parseFloats(arg.c_str(), v, 5) != 5) {
+      Serial.println("ERR TRIAL expects freq level interval tone_ms gap_ms");
+      return;
+    }
+    int interval = (int)v[2];
+    if (interval != 1 && interval != 2) {
+      Serial.println("ERR TRIAL interval must be 1 or 2");
+      return;
+    }
+    dspStartTrial(v[0], v[1], interval, v[3], v[4]);
+    Serial.println("OK");
+    return;
+  }
+
+  // SET gain g500 g2000 g4000 : all EQ parameters in one atomic update
+  if (cmd == "SET") {
+    float v[4];
+    if (parseFloats(arg.c_str(), v, 4) != 4) {
+      Serial.println("ERR SET expects gain g500 g2000 g4000");
+      return;
+    }
+    dspApply({v[0], v[1], v[2], v[3]});
+    Serial.println("OK");
+    return;
+  }
+
+  // COEF gain g500 g2000 g4000 n, followed by n binary stage records:
+  // biquad coefficients computed on the host, loaded without any math here
+  if (cmd == "COEF") {
+    float v[5];
+    if (parseFloats(arg.c_str(), v, 5) != 5 || v[4] < 0 || v[4] > COEF_MAX_RECORDS) {
+      Serial.println("ERR COEF expects gain g500 g2000 g4000 n");
+      return;
+    }
+    DspCoef coefs[COEF_MAX_RECORDS];
+    const int n = (int)v[4];
+    if (!readCoefRecords(n, coefs)) {
+      Serial.println("ERR COEF bad payload");
+      return;
+    }
+    if (!dspApplyCoefficients({v[0], v[1], v[2], v[3]}, coefs, n)) {
+      Serial.println("ERR COEF bad filter/stage");
+      return;
+    }
+    Serial.println("OK");
+    return;
+  }
+
+  // CAPS: optional commands this firmware understands
+  if (cmd == "CAPS") {
+    Serial.println("OK COEF BIN BANK");
+    return;
+  }
+
+  // PROFILE <slot> or PROFILE <name>: switch to a bank program
   if (cmd == "PROFILE") {
-    String name = arg; name.toUpperCase();
-    if (name == "ALICE") {
-      dspApply({ALICE.gainGlobal, ALICE.g500, ALICE.g2000, ALICE.g4000});
-      Serial.println("OK");
+    if (applyProfile(arg.c_str())) Serial.println("OK");
+    else Serial.println("ERR Unknown profile");
+    return;
+  }
+
+  // BANK: OK BANK <active slot> <hash of slot 0> ... (hex, 0 = empty)
+  if (cmd == "BANK") {
+    Serial.print("OK BANK ");
+    Serial.print(bankActive());
+    for (int i = 0; i < bankSlots(); i++) {
+      char h[10];
+      snprintf(h, sizeof(h), " %08lX", (unsigned long)bankHash(i));
+      Serial.print(h);
+    }
+    Serial.println();
+    return;
+  }
+
+  // STORE slot hash n, followed by the slot body (n COEF records) and a checksum byte
+  if (cmd == "STORE") {
+    char* end;
+    const long slot = strtol(arg.c_str(), &end, 10);
+    const uint32_t hash = strtoul(end, &end, 16);
+    const long n = strtol(end, &end, 10);
+    if (n < 0 || n > BANK_MAX_RECORDS) {
+      Serial.println("ERR STORE expects slot hash n");
       return;
     }
-    if (name == "BOB") {
-      dspApply({BOB.gainGlobal, BOB.g500, BOB.g2000, BOB.g4000});
+    static uint8_t body[BANK_BODY_MAX + 1];
+    const size_t len = BANK_HEAD_BYTES + (size_t)n * BANK_RECORD_BYTES;
+    uint8_t sum = 0;
+    const bool got = Serial.readBytes((char*)body, len + 1) == len + 1;
+    for (size_t i = 0; i < len; i++) sum += body[i];
+    if (!got || sum != body[len]) {
+      Serial.println("ERR STORE bad payload");
+      return;
+    }
+    if (bankStore(slot, hash, body, len)) Serial.println("OK");
+    else Serial.println("ERR STORE bad slot/body");
+    return;
+  }
+
+  if (cmd == "ERASE") {
+    if (arg.length() && bankErase(arg.toInt())) Serial.println("OK");
+    else Serial.println("ERR ERASE bad slot");
+    return;
+  }
+
+  // BIN ON: binary frames from the next byte on (after this OK)
+  if (cmd == "BIN") {
+    arg.toUpperCase();
+    if (arg == "ON") {
       Serial.println("OK");
+      Serial.flush();
+      rxLen = 0;
+      rxOverflow = false;
+      gBinary = true;
       return;
     }
-    Serial.println("ERR Unknown profile");
+    if (arg == "OFF") { Serial.println("OK"); return; }
+    Serial.println("ERR BIN expects ON/OFF");
     return;
   }
 
@@ -112,19 +455,47 @@ static void parseCommand(const String& lineRaw) {
   Serial.println("ERR Unknown command");
 }
 
+// all digits: a slot number, anything else ("1a" too) a profile name
+static bool applyProfile(const char* arg) {
+  const char* c = arg;
+  while (*c >= '0' && *c <= '9') c++;
+  if (c != arg && *c == 0) return bankLoad(atoi(arg));
+  return bankLoad(bankFind(arg));
+}
+
+// next stored program on every press, no serial traffic involved
+static void pollBankButton() {
+  static bool last = true;
+  static uint32_t changedMs = 0;
+  const bool up = digitalRead(BANK_BUTTON_PIN);
+  if (up == last || millis() - changedMs < BANK_BUTTON_DEBOUNCE_MS) return;
+  last = up;
+  changedMs = millis();
+  if (!up) bankLoad(bankNext());
+}
+
 void setup() {
   AudioMemory(40);
   Serial.begin(115200);
   delay(200);
 
   dspInit();
+  bankInit();
+  pinMode(BANK_BUTTON_PIN, INPUT_PULLUP);
 
   Serial.println("READY");
 }
 
 void loop() {
-  if (Serial.available()) {
+  if (gBinary) {
+    pollFrames();
+  } else if (Serial.available()) {
     String line = Serial.readStringUntil('\n');
     parseCommand(line);
   }
+  pollBankButton();
+  if (dspTrialDone()) {
+    if (gBinary) sendFrame(OP_DONE, 0, nullptr, 0);
+    else Serial.println("DONE");
+  }
 }
\ No newline at end of file
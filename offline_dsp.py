@@ -0,0 +1,432 @@
+"""
+Offline (host-side) copy of the firmware signal path.
+
+    inMix -> amp (gainGlobal) -> eq1 (500 Hz) -> eq2 (2 kHz) -> eq3 (4 kHz)
+
+with the same RBJ peaking biquads as biquadPeaking() in dsp.cpp and the
+same clamping as dspApply(). Filtering is done block-wise with
+scipy.signal.sosfilt (no per-sample Python loops), so a profile can be
+rendered on WAV material many times faster than real time.
+
+N-band mode puts one peaking stage per audiogram frequency into the
+stages of eq1..eq3; fit_nband() picks their gains by least squares
+against a target gain curve (see "N-band EQ" below).
+
+    python offline_dsp.py profiles/clara.json in.wav out.wav
+    python offline_dsp.py "Clara" in.wav out.wav --version 2   (profiles.db)
+"""
+import argparse, json, os, struct, sys, time, wave
+from functools import lru_cache
+import numpy as np
+# scipy is imported by EqChain only: TeensyLink packs COEF payloads with NumPy alone
+
+import profile_db
+from profile_db import bands_from_profile
+
+# =========================
+# Firmware constants
+# =========================
+AUDIO_SAMPLE_RATE_EXACT = 44117.64706   # Teensy Audio library sample rate
+
+# (center Hz, Q) of eq1, eq2, eq3
+EQ_BANDS = ((500.0, 1.0), (2000.0, 1.0), (4000.0, 1.0))
+
+GAIN_MIN, GAIN_MAX = 0.0, 4.0
+EQ_MIN_DB, EQ_MAX_DB = -20.0, 30.0
+
+EQ_STAGES = 4   # biquad stages per AudioFilterBiquad
+
+BLOCK_SIZE = 4096
+
+# N-band fit: per-band responses are tabulated once per set of band frequencies
+NBAND_GAIN_STEP = 0.5   # dB grid of the tabulated band responses
+NBAND_FIT_POINTS = 64   # log-spaced frequencies the fit matches
+NBAND_ITERATIONS = 3    # re-linearizations of the band shapes at the current gains
+NBAND_BW_SCALE = 1.5    # band width in units of the mean distance to the neighbouring bands
+NBAND_SMOOTH = 0.05     # weight pulling neighbouring gains together (no +x/-x pairs, flat stays flat)
+
+# dense log-frequency grid for magnitude responses
+RESPONSE_FREQS = np.geomspace(100.0, 10000.0, 400)
+RESPONSE_CACHE_SIZE = 256
+
+# COEF command payload (see readCoefRecords() in hearing.ino)
+COEF_RECORD = struct.Struct("<BB5i")   # filter, stage, b0 b1 b2 -a1 -a2 (Q30)
+Q30 = float(1 << 30)
+
+
+# =========================
+# Coefficients
+# =========================
+def clamp_params(gain_global, g500, g2000, g4000):
+    """Same limits as dspApply()."""
+    return (
+        float(np.clip(gain_global, GAIN_MIN, GAIN_MAX)),
+        float(np.clip(g500, EQ_MIN_DB, EQ_MAX_DB)),
+        float(np.clip(g2000, EQ_MIN_DB, EQ_MAX_DB)),
+        float(np.clip(g4000, EQ_MIN_DB, EQ_MAX_DB)),
+    )
+
+
+def biquad_peaking(freq_hz, q, gain_db, fs=AUDIO_SAMPLE_RATE_EXACT):
+    """
+    RBJ peaking EQ, normalized so a0 = 1. Arguments broadcast; returns an
+    array of SOS rows [b0, b1, b2, 1, a1, a2] with shape (..., 6).
+    """
+    freq_hz, q, gain_db = np.broadcast_arrays(
+        np.asarray(freq_hz, dtype=float), np.asarray(q, dtype=float), np.asarray(gain_db, dtype=float))
+    A = 10.0 ** (gain_db / 40.0)
+    w0 = 2.0 * np.pi * freq_hz / fs
+    alpha = np.sin(w0) / (2.0 * q)
+    cosw0 = np.cos(w0)
+
+    a0 = 1.0 + alpha / A
+    sos = np.empty(freq_hz.shape + (6,))
+    sos[..., 0] = (1.0 + alpha * A) / a0
+    sos[..., 1] = (-2.0 * cosw0) / a0
+    sos[..., 2] = (1.0 - alpha * A) / a0
+    sos[..., 3] = 1.0
+    sos[..., 4] = (-2.0 * cosw0) / a0
+    sos[..., 5] = (1.0 - alpha / A) / a0
+    return sos
+
+
+def eq_sos(g500, g2000, g4000, fs=AUDIO_SAMPLE_RATE_EXACT):
+    """SOS matrix (3, 6) for eq1 -> eq2 -> eq3."""
+    freqs = [f for f, _ in EQ_BANDS]
+    qs = [q for _, q in EQ_BANDS]
+    return biquad_peaking(freqs, qs, [g500, g2000, g4000], fs=fs)
+
+
+def q30_coefficients(sos):
+    """
+    SOS rows -> Teensy Audio integer biquad format (what setCoefficients()
+    makes of its double[5]): b0 b1 b2 -a1 -a2 scaled by 2^30, int32.
+    """
+    sos = np.atleast_2d(sos)
+    c = np.concatenate([sos[:, 0:3], -sos[:, 4:6]], axis=1) * Q30
+    if np.any(np.abs(c) >= 2.0 ** 31):
+        raise OverflowError("biquad coefficient outside the Q30 range (|c| >= 2)")
+    return np.round(c).astype(np.int32)
+
+
+@lru_cache(maxsize=RESPONSE_CACHE_SIZE)
+def _coef_payload(g500, g2000, g4000):
+    _, g500, g2000, g4000 = clamp_params(1.0, g500, g2000, g4000)
+    coefs = q30_coefficients(eq_sos(g500, g2000, g4000))
+    data = b"".join(COEF_RECORD.pack(i, 0, *map(int, c)) for i, c in enumerate(coefs))
+    return data + bytes([sum(data) & 0xFF])
+
+
+def coef_payload(g500, g2000, g4000):
+    """
+    Binary payload of a COEF command: stage 0 of eq1..eq3 plus checksum.
+    Memoized; gains are rounded like the COEF header TeensyLink sends.
+    Raises OverflowError for gains the Q30 format cannot hold.
+    """
+    return _coef_payload(round(float(g500), 1), round(float(g2000), 1), round(float(g4000), 1))
+
+
+# =========================
+# N-band EQ
+# =========================
+# Band i is a peaking stage at freqs[i]; its Q follows the spacing to the
+# neighbouring bands. Gains are fitted by least squares on tabulated
+# responses between the lowest and highest band: a band's dB response is
+# g * s(g), s being the response per dB at that gain, read from the table.
+# Each iteration solves the linear problem with s at the current gains
+# (bounded by EQ_MIN_DB..EQ_MAX_DB and the Q30 range), so a fit is a few
+# small lstsq calls.
+def nband_q(freqs):
+    """Q per band: bandwidth = NBAND_BW_SCALE x mean distance (octaves) to its neighbours."""
+    oct_ = np.log2(np.asarray(freqs, dtype=float))
+    d = np.diff(oct_)
+    bw = np.empty_like(oct_)
+    bw[0], bw[-1] = d[0], d[-1]
+    bw[1:-1] = (d[:-1] + d[1:]) / 2.0
+    bw *= NBAND_BW_SCALE
+    return np.sqrt(2.0 ** bw) / (2.0 ** bw - 1.0)
+
+
+def nband_layout(n):
+    """(filter, stage) per band: consecutive bands share a filter, at most EQ_STAGES each."""
+    if n > len(EQ_BANDS) * EQ_STAGES:
+        raise ValueError(f"at most {len(EQ_BANDS) * EQ_STAGES} bands")
+    filt = [i * len(EQ_BANDS) // n for i in range(n)]
+    return [(f, filt[:i].count(f)) for i, f in enumerate(filt)]
+
+
+def nband_sos(freqs, gains, fs=AUDIO_SAMPLE_RATE_EXACT):
+    """SOS matrix (n, 6), one peaking stage per band."""
+    gains = np.clip(np.asarray(gains, dtype=float), EQ_MIN_DB, EQ_MAX_DB)
+    return biquad_peaking(freqs, nband_q(freqs), gains, fs=fs)
+
+
+@lru_cache(maxsize=8)
+def _nband_tables(freqs):
+    freqs = np.asarray(freqs, dtype=float)
+    fit_f = np.geomspace(freqs[0], min(freqs[-1], 0.45 * AUDIO_SAMPLE_RATE_EXACT), NBAND_FIT_POINTS)
+    grid = np.arange(EQ_MIN_DB, EQ_MAX_DB + 1e-9, NBAND_GAIN_STEP)
+    sos = biquad_peaking(freqs[:, None], nband_q(freqs)[:, None], grid[None, :])   # (n, G, 6)
+    resp = section_response_db(sos, fit_f)                                          # (n, G, P)
+
+    # per-dB shapes; at 0 dB the derivative from the neighbouring grid gains
+    z = int(np.argmin(np.abs(grid)))
+    g = np.where(grid == 0.0, 1.0, grid)
+    slope = resp / g[None, :, None]
+    slope[:, z] = (resp[:, z + 1] - resp[:, z - 1]) / (grid[z + 1] - grid[z - 1])
+
+    # gains whose coefficients the Teensy's Q30 format can hold
+    c = np.concatenate([sos[..., 0:3], -sos[..., 4:6]], axis=-1) * Q30
+    ok = np.all(np.abs(c) < 2.0 ** 31, axis=-1)
+    lo = np.array([grid[row].min() for row in ok])
+    hi = np.array([grid[row].max() for row in ok])
+
+    tables = {"fit_f": fit_f, "grid": grid, "slope": slope, "lo": lo, "hi": hi}
+    for a in tables.values():
+        a.flags.writeable = False
+    return tables
+
+
+def _bounded_lstsq(A, b, lo, hi):
+    """min |A x - b| with lo <= x <= hi: clip the violators, solve again for the rest."""
+    n = A.shape[1]
+    x = np.zeros(n)
+    fixed = np.zeros(n, dtype=bool)
+    for _ in range(n):
+        free = ~fixed
+        r = b - A[:, fixed] @ x[fixed]
+        x[free] = np.linalg.lstsq(A[:, free], r, rcond=None)[0]
+        out = free & ((x < lo) | (x > hi))
+        if not out.any():
+            break
+        x[out] = np.clip(x[out], lo[out], hi[out])
+        fixed |= out
+    return x
+
+
+def fit_nband(freqs, target_db):
+    """
+    Band gains (dB) at freqs whose cascaded response best matches the
+    target gain curve target_db (one value per band frequency,
+    interpolated on a log-frequency axis). Returns (gains, rms error dB
+    between freqs[0] and freqs[-1]).
+    """
+    freqs = tuple(float(f) for f in freqs)
+    t = _nband_tables(freqs)
+    n = len(freqs)
+    target = np.interp(np.log(t["fit_f"]), np.log(freqs), np.asarray(target_db, dtype=float))
+    # smoothing rows (gain[i+1] - gain[i]): overlapping bands would otherwise
+    # trade +x/-x pairs and spread a flat target over very uneven gains
+    b = np.concatenate([target, np.zeros(n - 1)])
+    smooth = np.sqrt(NBAND_SMOOTH * len(target)) * np.diff(np.eye(n), axis=0)
+    grid, idx = t["grid"], np.arange(n)
+    gains = np.clip(np.asarray(target_db, dtype=float), t["lo"], t["hi"])
+    for _ in range(NBAND_ITERATIONS):
+        k = np.clip(np.rint((gains - grid[0]) / NBAND_GAIN_STEP).astype(int), 0, len(grid) - 1)
+        S = t["slope"][idx, k].T   # (P, n): response per dB of every band at its current gain
+        gains = _bounded_lstsq(np.vstack([S, smooth]), b, t["lo"], t["hi"])
+    # error of the gains as sent
+    gains = np.round(gains, 1) + 0.0   # no -0.0 in profiles
+    resp = section_response_db(nband_sos(freqs, gains), t["fit_f"]).sum(axis=0)
+    err = np.sqrt(np.mean((resp - target) ** 2))
+    return gains, float(err)
+
+
+@lru_cache(maxsize=RESPONSE_CACHE_SIZE)
+def _nband_coef_payload(freqs, gains):
+    coefs = q30_coefficients(nband_sos(freqs, gains))
+    data = b"".join(COEF_RECORD.pack(f, st, *map(int, c)) for (f, st), c in zip(nband_layout(len(freqs)), coefs))
+    return data + bytes([sum(data) & 0xFF])
+
+
+def nband_coef_payload(freqs, gains):
+    """
+    COEF payload of an N-band EQ: one record per band, in ascending stage
+    order per filter (the last stage written ends an AudioFilterBiquad's
+    cascade, so leftovers of an earlier layout are cut off). Memoized.
+    """
+    return _nband_coef_payload(tuple(float(f) for f in freqs), tuple(round(float(g), 1) for g in gains))
+
+
+@lru_cache(maxsize=RESPONSE_CACHE_SIZE)
+def _nband_response_db(gain_global, freqs, gains):
+    db = sos_response_db(nband_sos(freqs, gains))
+    db += 20.0 * np.log10(max(min(gain_global, GAIN_MAX), 1e-6))
+    db.flags.writeable = False
+    return db
+
+
+def nband_response_db(gain_global, freqs, gains):
+    """Response (dB) of amp + N-band stages on RESPONSE_FREQS, memoized like eq_response_db."""
+    return _nband_response_db(round(float(gain_global), 3), tuple(float(f) for f in freqs),
+                              tuple(round(float(g), 1) for g in gains))
+
+
+def load_profile(profile, version=None) -> dict:
+    """A profile JSON file, or a profile name (and version) from the GUI's profiles.db."""
+    if version is None and os.path.isfile(profile):
+        with open(profile, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return profile_db.profile_store().load(profile, version=version)
+
+
+def params_from_profile(data: dict):
+    """(gain_global, g500, g2000, g4000) from a saved profile dict."""
+    eq = data.get("eq", {})
+    return (
+        float(eq.get("GAIN_global", 1.0)),
+        float(eq.get("EQ500_db", 0.0)),
+        float(eq.get("EQ2000_db", 0.0)),
+        float(eq.get("EQ4000_db", 0.0)),
+    )
+
+
+# =========================
+# Frequency response
+# =========================
+def section_response_db(sos, freqs=RESPONSE_FREQS, fs=AUDIO_SAMPLE_RATE_EXACT):
+    """Magnitude (dB) of every SOS row (..., 6) at freqs: shape (..., len(freqs))."""
+    sos = np.asarray(sos)[..., None, :]
+    z1 = np.exp(-1j * 2.0 * np.pi * np.asarray(freqs) / fs)   # z^-1
+    z2 = z1 * z1
+    num = sos[..., 0] + sos[..., 1] * z1 + sos[..., 2] * z2
+    den = sos[..., 3] + sos[..., 4] * z1 + sos[..., 5] * z2
+    return 20.0 * np.log10(np.abs(num / den))
+
+
+def sos_response_db(sos, freqs=RESPONSE_FREQS, fs=AUDIO_SAMPLE_RATE_EXACT):
+    """Magnitude (dB) of a biquad cascade at freqs, all sections in one pass."""
+    return section_response_db(np.atleast_2d(sos), freqs, fs).sum(axis=0)
+
+
+@lru_cache(maxsize=RESPONSE_CACHE_SIZE)
+def _eq_response_db(gain_global, g500, g2000, g4000):
+    gain_global, g500, g2000, g4000 = clamp_params(gain_global, g500, g2000, g4000)
+    db = sos_response_db(eq_sos(g500, g2000, g4000))
+    db += 20.0 * np.log10(max(gain_global, 1e-6))
+    db.flags.writeable = False   # shared by the cache
+    return db
+
+
+def eq_response_db(gain_global, g500, g2000, g4000):
+    """
+    Response (dB) of amp + eq1..eq3 on RESPONSE_FREQS, memoized per
+    parameter tuple. Values are rounded like TeensyLink sends them
+    (gain .3f, EQ .1f), so slider noise does not defeat the cache.
+    """
+    return _eq_response_db(round(float(gain_global), 3), round(float(g500), 1),
+                           round(float(g2000), 1), round(float(g4000), 1))
+
+
+# =========================
+# Processing
+# =========================
+class EqChain:
+    """
+    Streaming amp + 3 biquads. process() keeps the filter state between
+    calls, so audio can be fed in blocks of any size.
+
+    x is (n,) or (n, channels), float in [-1, 1]. With saturate=True every
+    stage is clipped to [-1, 1] like the int16 saturation in the firmware.
+    bands = (freqs, gains) runs the N-band stages instead of eq1..eq3.
+    """
+
+    def __init__(self, gain_global=1.0, g500=0.0, g2000=0.0, g4000=0.0,
+                 fs=AUDIO_SAMPLE_RATE_EXACT, saturate=True, bands=None):
+        from scipy.signal import sosfilt
+        self._sosfilt = sosfilt
+        self.fs = fs
+        self.saturate = saturate
+        self._zi = None
+        self.set_params(gain_global, g500, g2000, g4000, bands=bands)
+
+    def set_params(self, gain_global, g500, g2000, g4000, bands=None):
+        # like dspApply: new coefficients, filter state is kept unless the stage count changes
+        self.gain_global, g500, g2000, g4000 = clamp_params(gain_global, g500, g2000, g4000)
+        self.eq_db = (g500, g2000, g4000)
+        n = None if self._zi is None else len(self.sos)
+        self.sos = nband_sos(*bands, fs=self.fs) if bands else eq_sos(g500, g2000, g4000, fs=self.fs)
+        if n is not None and n != len(self.sos):
+            self._zi = None
+
+    def reset(self):
+        self._zi = None
+
+    def process(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if self._zi is None:
+            self._zi = np.zeros((len(self.sos), 2) + x.shape[1:])
+
+        y = x * self.gain_global
+        if not self.saturate:
+            y, self._zi = self._sosfilt(self.sos, y, axis=0, zi=self._zi)
+            return y
+
+        np.clip(y, -1.0, 1.0, out=y)
+        for i in range(len(self.sos)):
+            y, self._zi[i:i + 1] = self._sosfilt(self.sos[i:i + 1], y, axis=0, zi=self._zi[i:i + 1])
+            np.clip(y, -1.0, 1.0, out=y)
+        return y
+
+
+def render(x, gain_global, g500, g2000, g4000, fs=AUDIO_SAMPLE_RATE_EXACT,
+           block_size=BLOCK_SIZE, saturate=True, bands=None):
+    """Run a whole signal through the chain, block by block."""
+    x = np.asarray(x, dtype=np.float64)
+    chain = EqChain(gain_global, g500, g2000, g4000, fs=fs, saturate=saturate, bands=bands)
+    out = np.empty_like(x)
+    for start in range(0, len(x), block_size):
+        out[start:start + block_size] = chain.process(x[start:start + block_size])
+    return out
+
+
+# =========================
+# WAV I/O (16-bit PCM)
+# =========================
+def read_wav(path):
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+        fs = w.getframerate()
+        ch = w.getnchannels()
+        data = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2")
+    x = data.reshape(-1, ch).astype(np.float64) / 32768.0
+    return (x[:, 0] if ch == 1 else x), fs
+
+
+def write_wav(path, x, fs):
+    x = np.asarray(x)
+    ch = 1 if x.ndim == 1 else x.shape[1]
+    pcm = np.clip(np.round(x * 32768.0), -32768, 32767).astype("<i2")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(ch)
+        w.setsampwidth(2)
+        w.setframerate(int(fs))
+        w.writeframes(pcm.tobytes())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Render a hearing profile on a WAV file")
+    ap.add_argument("profile", help="profile JSON file, or the name of a saved profile")
+    ap.add_argument("src", help="input WAV (16-bit PCM)")
+    ap.add_argument("dst", help="output WAV")
+    ap.add_argument("--version", type=int, default=None, help="older version of a saved profile")
+    ap.add_argument("--no-saturate", action="store_true", help="do not clip between stages")
+    args = ap.parse_args()
+
+    data = load_profile(args.profile, args.version)
+    params = params_from_profile(data)
+    x, fs = read_wav(args.src)
+    EqChain(*params, fs=fs).process(np.zeros(1))   # warm-up: EqChain's lazy SciPy import stays out of the timing
+
+    t0 = time.perf_counter()
+    y = render(x, *params, fs=fs, saturate=not args.no_saturate, bands=bands_from_profile(data))
+    dt = time.perf_counter() - t0
+
+    write_wav(args.dst, y, fs)
+    dur = len(x) / fs
+    print(f"{dur:.1f} s of audio in {dt * 1e3:.1f} ms ({dur / max(dt, 1e-9):.0f}x real time)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Overrides of the audiogram test parameters (module constants of gui.py
+and psi_estimator.py), shared by benchmark.py and replay.py for their
+--set NAME=VALUE options.
+"""
+from contextlib import contextmanager
+
+import gui
+import psi_estimator
+
+
+def parse_value(v):
+    """int or float of a NAME=VALUE command-line value."""
+    try:
+        return int(v)
+    except ValueError:
+        return float(v)
+
+
+def _module(name):
+    mod = gui if hasattr(gui, name) else psi_estimator
+    if not hasattr(mod, name):
+        raise ValueError(f"Unknown parameter {name}")
+    return mod
+
+
+def apply_overrides(overrides) -> dict:
+    """Set the constants by name. Returns their previous values (all or nothing on an unknown name)."""
+    mods = {name: _module(name) for name in overrides}
+    previous = {name: getattr(mod, name) for name, mod in mods.items()}
+    for name, value in overrides.items():
+        setattr(mods[name], name, value)
+    return previous
+
+
+@contextmanager
+def overridden(overrides):
+    """apply_overrides() for the duration of a with block."""
+    previous = apply_overrides(overrides)
+    try:
+        yield
+    finally:
+        apply_overrides(previous)
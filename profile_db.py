@@ -0,0 +1,302 @@
+"""
+Saved hearing profiles: the SQLite store behind the GUI's profile list,
+and the helpers that read a profile dict.
+
+Standard library only, so offline_dsp.py can render saved profiles
+without the GUI's Tk and pyserial imports.
+"""
+import copy, glob, json, os, sqlite3, threading, time
+from collections import OrderedDict
+
+PROFILES_DIR = "profiles"
+PROFILES_DB = "profiles.db"   # SQLite store; profiles/*.json are imported once
+PROFILE_CACHE_SIZE = 64       # parsed current versions kept by SqliteProfileStore
+
+
+# =========================
+# Profile dicts
+# =========================
+def bands_from_profile(data: dict):
+    """(freqs, gains) of a saved N-band profile (eq.bands_db), None for a 3-band one."""
+    bands = data.get("eq", {}).get("bands_db")
+    if not bands:
+        return None
+    freqs = sorted(bands, key=float)
+    return [float(f) for f in freqs], [float(bands[f]) for f in freqs]
+
+
+# =========================
+# Profile storage (SQLite)
+# =========================
+_PROFILE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    id              INTEGER PRIMARY KEY,
+    name            TEXT NOT NULL UNIQUE,
+    created_at      REAL NOT NULL,
+    updated_at      REAL NOT NULL,
+    current_version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_profiles_name_nocase ON profiles(name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_profiles_updated ON profiles(updated_at);
+CREATE TABLE IF NOT EXISTS profile_versions (
+    id          INTEGER PRIMARY KEY,
+    profile_id  INTEGER NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    version     INTEGER NOT NULL,
+    saved_at    REAL NOT NULL,
+    kind        TEXT NOT NULL,          -- 'manual' | 'audiogram'
+    method      TEXT,
+    gain_global REAL NOT NULL,
+    eq500_db    REAL NOT NULL,
+    eq2000_db   REAL NOT NULL,
+    eq4000_db   REAL NOT NULL,
+    data        TEXT NOT NULL,          -- full profile JSON
+    UNIQUE (profile_id, version)
+);
+CREATE INDEX IF NOT EXISTS idx_versions_saved ON profile_versions(saved_at);
+CREATE INDEX IF NOT EXISTS idx_versions_kind ON profile_versions(kind, saved_at);
+"""
+
+# columns find() may filter on with (low, high) ranges
+_PROFILE_RANGE_COLUMNS = ("gain_global", "eq500_db", "eq2000_db", "eq4000_db", "saved_at")
+
+
+def profile_kind(data: dict) -> str:
+    return "manual" if data.get("method") == "manual sliders" else "audiogram"
+
+
+class SqliteProfileStore:
+    """
+    Profiles in one SQLite database (WAL mode).
+
+    Every save adds a row to profile_versions (full JSON + the EQ fields
+    as columns), so history is kept and queries such as "audiograms with
+    EQ4000 > 15 dB" run on indexed columns without parsing JSON.
+
+    Reads are cached: an index of name -> (current version, method, EQ
+    summary) loaded with one query, and an LRU of parsed current versions.
+    Both are dropped on save/delete/restore, and when another connection
+    has written to the database (PRAGMA data_version).
+    """
+
+    def __init__(self, path=PROFILES_DB, cache_size=PROFILE_CACHE_SIZE):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_PROFILE_SCHEMA)
+        self._lock = threading.RLock()
+        self._cache_size = cache_size
+        self._data_version = None
+        self._index = None                # name -> (version, method, (gain, g500, g2000, g4000))
+        self._sorted = None
+        self._parsed = OrderedDict()      # name -> (version, data), LRU order
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---------- cache ----------
+    def _invalidate(self, name=None):
+        """Drop the index, and the parsed copy of name (all of them if None)."""
+        self._index = None
+        self._sorted = None
+        if name is None:
+            self._parsed.clear()
+        else:
+            self._parsed.pop(name.strip(), None)
+
+    def _check(self):
+        """Drop the caches if another connection committed since the last look."""
+        dv = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if dv != self._data_version:
+            self._data_version = dv
+            self._invalidate()
+
+    def _load_index(self):
+        self._check()
+        if self._index is None:
+            rows = self._conn.execute(
+                "SELECT p.name, p.current_version, v.method, v.gain_global, v.eq500_db, v.eq2000_db, "
+                "v.eq4000_db FROM profiles p JOIN profile_versions v "
+                "ON v.profile_id = p.id AND v.version = p.current_version")
+            self._index = {r[0]: (r[1], r[2], tuple(r[3:7])) for r in rows}
+        return self._index
+
+    def _entry(self, name):
+        entry = self._load_index().get(name.strip())
+        if entry is None:
+            raise FileNotFoundError(f"No profile named '{name}'")
+        return entry
+
+    # ---------- public API ----------
+    def names(self):
+        with self._lock:
+            index = self._load_index()
+            if self._sorted is None:
+                self._sorted = sorted(index, key=str.lower)
+            return list(self._sorted)
+
+    def summary(self, name):
+        with self._lock:
+            _, method, eq = self._entry(name)
+            return method, eq
+
+    def load(self, name, version=None) -> dict:
+        """A copy of the profile (current version unless version is given)."""
+        with self._lock:
+            if version is None:
+                version = self._entry(name)[0]
+                hit = self._parsed.get(name.strip())
+                if hit is not None and hit[0] == version:
+                    self._parsed.move_to_end(name.strip())
+                    return copy.deepcopy(hit[1])
+            row = self._conn.execute(
+                "SELECT v.data FROM profiles p JOIN profile_versions v ON v.profile_id = p.id "
+                "WHERE p.name = ? AND v.version = ?", (name.strip(), version)).fetchone()
+            if row is None:
+                raise FileNotFoundError(f"No version {version} of profile '{name}'")
+            data = json.loads(row["data"])
+            if version == self._entry(name)[0]:
+                self._parsed[name.strip()] = (version, data)
+                self._parsed.move_to_end(name.strip())
+                while len(self._parsed) > self._cache_size:
+                    self._parsed.popitem(last=False)
+                return copy.deepcopy(data)
+            return data
+
+    def save(self, name, data: dict, saved_at=None):
+        """Store data as the next version of profile name. Returns the version number."""
+        with self._lock, self._conn:   # one transaction
+            return self._insert(name, data, time.time() if saved_at is None else saved_at)
+
+    def _insert(self, name, data, now):
+        name = name.strip()
+        data = dict(data, name=name)
+        eq = data.get("eq", {})
+        row = self._conn.execute("SELECT id, current_version FROM profiles WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            pid = self._conn.execute(
+                "INSERT INTO profiles(name, created_at, updated_at, current_version) VALUES (?, ?, ?, 1)",
+                (name, now, now)).lastrowid
+            version = 1
+        else:
+            pid, version = row["id"], row["current_version"] + 1
+            self._conn.execute("UPDATE profiles SET updated_at = ?, current_version = ? WHERE id = ?",
+                               (now, version, pid))
+        self._conn.execute(
+            "INSERT INTO profile_versions(profile_id, version, saved_at, kind, method, gain_global, "
+            "eq500_db, eq2000_db, eq4000_db, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (pid, version, now, profile_kind(data), data.get("method"),
+             float(eq.get("GAIN_global", 1.0)), float(eq.get("EQ500_db", 0.0)),
+             float(eq.get("EQ2000_db", 0.0)), float(eq.get("EQ4000_db", 0.0)),
+             json.dumps(data)))
+        self._invalidate(name)
+        return version
+
+    def delete(self, name):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM profiles WHERE name = ?", (name.strip(),))
+            self._invalidate(name)
+
+    # ---------- history / queries ----------
+    def restore(self, name, version):
+        """Make an older version current again, as a new version (history is kept). Returns it."""
+        with self._lock, self._conn:
+            return self._insert(name, self.load(name, version), time.time())
+
+    def history(self, name):
+        """[(version, saved_at, kind, method, (gain, g500, g2000, g4000)), ...] oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT v.version, v.saved_at, v.kind, v.method, v.gain_global, v.eq500_db, v.eq2000_db, "
+                "v.eq4000_db FROM profiles p JOIN profile_versions v ON v.profile_id = p.id "
+                "WHERE p.name = ? ORDER BY v.version", (name.strip(),)).fetchall()
+        return [(r[0], r[1], r[2], r[3], tuple(r[4:8])) for r in rows]
+
+    def find(self, kind=None, all_versions=False, **ranges):
+        """
+        Names (current versions unless all_versions) matching column ranges, e.g.
+        find(kind="audiogram", eq4000_db=(15, None)) -> EQ4000 > 15 dB.
+        """
+        where, args = [], []
+        if not all_versions:
+            where.append("v.version = p.current_version")
+        if kind is not None:
+            where.append("v.kind = ?")
+            args.append(kind)
+        for col, (lo, hi) in ranges.items():
+            if col not in _PROFILE_RANGE_COLUMNS:
+                raise ValueError(f"Cannot filter on '{col}'")
+            if lo is not None:
+                where.append(f"v.{col} > ?")
+                args.append(lo)
+            if hi is not None:
+                where.append(f"v.{col} < ?")
+                args.append(hi)
+        sql = ("SELECT DISTINCT p.name FROM profiles p JOIN profile_versions v ON v.profile_id = p.id"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + " ORDER BY p.name COLLATE NOCASE")
+        with self._lock:
+            return [r[0] for r in self._conn.execute(sql, args)]
+
+    # ---------- JSON import ----------
+    def import_json(self, json_dir=PROFILES_DIR, force=False):
+        """
+        One-shot import of profiles/*.json (saved_at = file mtime). Runs once
+        per database unless force; names already in the database are skipped.
+        Returns the number of imported profiles.
+        """
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone()
+            if done and not force:
+                return 0
+            existing = set(self.names())
+            n = 0
+            with self._conn:   # all or nothing
+                for path in sorted(glob.glob(os.path.join(json_dir, "*.json"))):
+                    try:
+                        with open(path, "r", encoding="utf-8") as f:
+                            data = json.load(f)
+                    except (OSError, ValueError):
+                        continue
+                    # the display name is in the JSON; older files only have the file name
+                    name = (data.get("name") or os.path.splitext(os.path.basename(path))[0].replace("_", " ")).strip()
+                    if name in existing:
+                        continue
+                    self._insert(name, data, os.path.getmtime(path))
+                    existing.add(name)
+                    n += 1
+                self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('json_imported', ?)",
+                                   (str(time.time()),))
+            return n
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def profile_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SqliteProfileStore()
+            _store.import_json()
+        return _store
+
+def list_profiles():
+    return profile_store().names()
+
+def save_profile(name: str, data: dict):
+    profile_store().save(name, data)
+
+def load_profile(name: str) -> dict:
+    return profile_store().load(name)
+
+def delete_profile(name: str):
+    profile_store().delete(name)
@@ -0,0 +1,120 @@
+"""
+Bayesian adaptive threshold estimator (psi method, Kontsevich & Tyler 1999).
+
+Keeps a posterior over (threshold, slope) of a 2AFC logistic psychometric
+function and presents, at each trial, the level that minimizes the
+expected entropy of the posterior. Same interface as Staircase2Down1Up
+(level_db, update(correct), done(), threshold()).
+
+All likelihood tables depend only on the grids, so they are computed once
+per grid and shared by every estimator instance.
+"""
+from functools import lru_cache
+import numpy as np
+
+# =========================
+# Config
+# =========================
+PSI_GUESS = 0.5          # 2AFC
+PSI_LAPSE = 0.02
+PSI_THRESH_STEP = 1.0    # dB, threshold grid resolution
+PSI_LEVEL_STEP = 2.0     # dB, candidate stimulus levels
+PSI_SLOPES = (0.1, 0.15, 0.2, 0.3, 0.45, 0.7, 1.0, 1.5)   # logistic slope, 1/dB
+
+# benchmark.py -n 1000: 28.9 trials/freq on average (cap reached in few runs),
+# threshold RMS 3.9 dB; the staircase needs 34.5 trials for 5.8 dB
+PSI_MIN_TRIALS = 12
+PSI_MAX_TRIALS = 40
+PSI_SD_TARGET = 5.0      # dB, stop when posterior SD of threshold is below this
+
+
+def p_correct(level_db, threshold_db, slope, guess=PSI_GUESS, lapse=PSI_LAPSE):
+    """2AFC logistic psychometric function (broadcasts)."""
+    return guess + (1.0 - guess - lapse) / (1.0 + np.exp(-slope * (level_db - threshold_db)))
+
+
+@lru_cache(maxsize=8)
+def _tables(min_db, max_db):
+    levels = np.arange(min_db, max_db + 1e-9, PSI_LEVEL_STEP)
+    # thresholds may lie a bit outside the playable range
+    thresholds = np.arange(min_db - 10.0, max_db + 10.0 + 1e-9, PSI_THRESH_STEP)
+    slopes = np.asarray(PSI_SLOPES, dtype=float)
+
+    # L[x, a, b] = p(correct | level x, threshold a, slope b), flattened to (x, a*b)
+    L = p_correct(levels[:, None, None], thresholds[None, :, None], slopes[None, None, :])
+    L = L.reshape(len(levels), -1)
+    logL, log1mL = np.log(L), np.log1p(-L)
+    tables = {
+        "levels": levels,
+        "thresholds": thresholds,
+        "slopes": slopes,
+        "L": L,
+        "logL": logL,
+        "log1mL": log1mL,
+        "LlogL": L * logL,
+        "WlogW": (1.0 - L) * log1mL,
+    }
+    for a in tables.values():
+        a.flags.writeable = False
+    return tables
+
+
+class PsiEstimator:
+    def __init__(self, start_db=-10.0, min_db=-80.0, max_db=-3.0):
+        t = _tables(float(min_db), float(max_db))
+        self.levels = t["levels"]
+        self.thresholds = t["thresholds"]
+        self._L, self._logL, self._log1mL = t["L"], t["logL"], t["log1mL"]
+        self._LlogL, self._WlogW = t["LlogL"], t["WlogW"]
+
+        self._shape = (len(self.thresholds), len(PSI_SLOPES))
+        n = self._shape[0] * self._shape[1]
+        self.log_post = np.full(n, -np.log(n))   # flat prior over (threshold, slope), flattened
+        self.trials = 0
+        # first trial at the usual start level, then info-driven
+        self._ix = int(np.argmin(np.abs(self.levels - start_db)))
+        self.level_db = float(self.levels[self._ix])
+
+    def _posterior(self):
+        p = np.exp(self.log_post - self.log_post.max())
+        return p / p.sum()
+
+    def _next_index(self):
+        # Expected posterior entropy for every candidate level. With
+        # post_c = P*L/pc, sum(post_c log post_c) expands into products of
+        # the precomputed tables with P, i.e. a few matrix-vector products.
+        P = self._posterior()
+        PlogP = P * np.log(np.maximum(P, 1e-300))
+        pc = self._L @ P
+        pw = 1.0 - pc
+        LPlogP = self._L @ PlogP
+        slc = LPlogP + self._LlogL @ P
+        slw = (PlogP.sum() - LPlogP) + self._WlogW @ P
+        h_c = np.log(pc) - slc / pc
+        h_w = np.log(pw) - slw / pw
+        return int(np.argmin(pc * h_c + pw * h_w))
+
+    def update(self, correct: bool):
+        table = self._logL if correct else self._log1mL
+        self.log_post = self.log_post + table[self._ix]
+        self.log_post -= self.log_post.max()
+        self.trials += 1
+        self._ix = self._next_index()
+        self.level_db = float(self.levels[self._ix])
+
+    def threshold_sd(self):
+        pa = self._posterior().reshape(self._shape).sum(axis=1)
+        mean = float(pa @ self.thresholds)
+        return float(np.sqrt(pa @ (self.thresholds - mean) ** 2))
+
+    def uncertainty(self):
+        return self.threshold_sd()
+
+    def done(self):
+        if self.trials >= PSI_MAX_TRIALS:
+            return True
+        return self.trials >= PSI_MIN_TRIALS and self.threshold_sd() < PSI_SD_TARGET
+
+    def threshold(self):
+        pa = self._posterior().reshape(self._shape).sum(axis=1)
+        return float(pa @ self.thresholds)
@@ -0,0 +1,158 @@
+"""
+Re-score logged audiogram sessions (sessions/*.jsonl) without the patient.
+
+The logged answers are fed back through the real TrackScheduler /
+estimator classes from gui.py. When the estimator asks for a level that
+was presented at that frequency (and track) in the log, the logged answer
+is used, in order; with unchanged parameters this reproduces the session
+exactly. Levels that were never presented are answered by a logistic
+psychometric function fitted to that frequency's logged trials, so
+parameter changes can be explored too (then --reps > 1 gives the spread).
+
+    python replay.py sessions/20261017-101500.jsonl
+    python replay.py sessions/*.jsonl --set AVG_LAST_REVERSALS=6
+    python replay.py sessions/*.jsonl --method "Psi (Bayesian)" --reps 200
+"""
+import argparse, time
+import numpy as np
+
+import gui
+import psi_estimator
+from overrides import overridden, parse_value
+
+LEVEL_TOL_DB = 0.5   # a requested level matches a logged one within this
+
+
+# =========================
+# Logged listener
+# =========================
+def fit_psychometric(trials):
+    """Maximum-likelihood (threshold, slope) of a 2AFC logistic on (level, correct) pairs."""
+    levels = np.array([t["level_db"] for t in trials], dtype=float)
+    correct = np.array([t["correct"] for t in trials], dtype=bool)
+    thr = np.arange(gui.MIN_DB - 10.0, gui.MAX_DB + 10.0 + 1e-9, 0.5)
+    slopes = np.asarray(psi_estimator.PSI_SLOPES, dtype=float)
+    p = psi_estimator.p_correct(levels[:, None, None], thr[None, :, None], slopes[None, None, :])
+    ll = np.where(correct[:, None, None], np.log(p), np.log1p(-p)).sum(axis=0)
+    a, b = np.unravel_index(np.argmax(ll), ll.shape)
+    return float(thr[a]), float(slopes[b])
+
+
+class LoggedListener:
+    """Answers like the logged patient: logged answers first, fitted model otherwise."""
+
+    def __init__(self, trials, rng):
+        self.rng = rng
+        self.pools = {}    # (freq, track) -> [(level, correct), ...] in logged order
+        self.by_freq = {}  # freq -> same, all tracks
+        for t in trials:
+            rec = (float(t["level_db"]), bool(t["correct"]))
+            self.pools.setdefault((t["freq"], t.get("track", 0)), []).append(rec)
+            self.by_freq.setdefault(t["freq"], []).append(rec)
+        self.model = {f: fit_psychometric([{"level_db": l, "correct": c} for l, c in recs])
+                      for f, recs in self.by_freq.items()}
+        self.logged = 0
+        self.modelled = 0
+
+    def _take(self, pool, level):
+        for i, (l, c) in enumerate(pool):
+            if abs(l - level) <= LEVEL_TOL_DB:
+                del pool[i]
+                return c
+        return None
+
+    def answer(self, freq, track, level):
+        c = self._take(self.pools.get((freq, track), []), level)
+        if c is None:
+            # the other track of this frequency may have been there
+            for (f, k), pool in self.pools.items():
+                if f == freq and k != track:
+                    c = self._take(pool, level)
+                    if c is not None:
+                        break
+        if c is not None:
+            self.logged += 1
+            return c
+        self.modelled += 1
+        thr, slope = self.model.get(freq, (gui.START_DB, 0.3))
+        return self.rng.random() < psi_estimator.p_correct(level, thr, slope)
+
+
+def replay_once(header, trials, method, rng):
+    """One replay. Returns ({freq: threshold}, trials, logged answers, modelled answers)."""
+    listener = LoggedListener(trials, rng)
+    freqs = [f for f in header["freqs_hz"] if f in listener.by_freq]
+    sched = gui.TrackScheduler(freqs, method=method, interleave=header["interleave"],
+                               tracks_per_freq=header["tracks"])
+    est = {}
+    n = 0
+    while not sched.done() and n < 100 * max(1, len(trials)):
+        t = sched.next_track()
+        k = sched.tracks[t.freq].index(t)
+        t.est.update(listener.answer(t.freq, k, t.est.level_db))
+        n += 1
+        r = sched.trial_done(t)
+        if r is not None:
+            est[t.freq] = r
+    return est, n, listener.logged, listener.modelled
+
+
+def replay(path, method=None, overrides=None, reps=1, seed=0):
+    header, trials, result = gui.load_session(path)
+    method = method or header["method"]
+    rng = np.random.default_rng(seed)
+    # the session's own parameters, then the requested changes; restored for the next session
+    with overridden(dict(header.get("params", {}), **(overrides or {}))):
+        runs = [replay_once(header, trials, method, rng) for _ in range(reps)]
+    freqs = sorted({f for est, *_ in runs for f in est})
+    thr = {f: np.array([est[f] for est, *_ in runs if f in est]) for f in freqs}
+    return {
+        "header": header,
+        "method": method,
+        "logged": {int(k): v for k, v in (result or {}).get("thresholds_db_rel", {}).items()},
+        "thresholds": thr,
+        "trials": np.mean([n for _, n, _, _ in runs]),
+        "logged_share": np.mean([lg / max(1, lg + md) for _, _, lg, md in runs]),
+        "session_seconds": trials[-1]["t"] if trials else 0.0,
+    }
+
+
+# =========================
+# Report
+# =========================
+def report(path, res, elapsed, reps):
+    h = res["header"]
+    method = res["method"] if res["method"] == h["method"] else f"{h['method']} -> {res['method']}"
+    speed = res["session_seconds"] * reps / max(elapsed, 1e-9)
+    print(f"\n== {path}  ({h['started']}, {method}, {res['trials']:.0f} trials, "
+          f"{100 * res['logged_share']:.0f}% logged answers, {speed:,.0f}x real time)")
+    print(f"{'freq':>6} {'logged':>7} {'replay':>7} {'sd':>5}")
+    for f, v in res["thresholds"].items():
+        logged = res["logged"].get(f)
+        logged = f"{logged:7.1f}" if logged is not None else f"{'—':>7}"
+        print(f"{f:>6} {logged} {v.mean():>7.1f} {v.std():>5.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-score logged audiogram sessions")
+    ap.add_argument("sessions", nargs="+", help="session logs (sessions/*.jsonl)")
+    ap.add_argument("--method", default=None, choices=list(gui.METHODS), help="default: the logged one")
+    ap.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                    help="override a gui.py / psi_estimator.py constant, e.g. STEP_SMALL=1")
+    ap.add_argument("--reps", type=int, default=1, help="replays per session (spread of modelled answers)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    overrides = {}
+    for item in args.set:
+        k, v = item.split("=", 1)
+        overrides[k] = parse_value(v)
+
+    for path in args.sessions:
+        t0 = time.perf_counter()
+        res = replay(path, args.method, overrides, reps=args.reps, seed=args.seed)
+        report(path, res, time.perf_counter() - t0, args.reps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import emulator
+import gui
+
+
+@pytest.fixture
+def emu():
+    e = emulator.TeensyEmulator()
+    e.start()
+    yield e
+    e.stop()
+
+
+def open_link(emu, binary):
+    link = gui.TeensyLink()
+    link.use_binary = binary
+    link.connect(emu.port)
+    return link
+
+
+@pytest.fixture(params=[False, True], ids=["ascii", "binary"])
+def link(request, emu):
+    link = open_link(emu, request.param)
+    yield link
+    link.close()
@@ -0,0 +1,54 @@
+import zlib
+
+import pytest
+
+import binary_protocol
+import emulator
+import gui
+import offline_dsp
+
+
+def test_slot_hash_is_crc32_of_the_body():
+    h, body = binary_protocol.bank_slot("ANN", (1.0, 2.0, 3.0, 4.0))
+    assert h == zlib.crc32(body)
+    assert len(body) == binary_protocol.BANK_HEAD_BYTES
+    assert binary_protocol.bank_slot_info(body) == ("ANN", (1.0, 2.0, 3.0, 4.0), 0)
+
+
+def test_slot_with_records():
+    records = offline_dsp.coef_payload(1.0, 2.0, 3.0)[:-1]
+    h, body = binary_protocol.bank_slot("A-VERY-LONG-NAME", (1.0, 1.0, 2.0, 3.0), records)
+    name, _, n = binary_protocol.bank_slot_info(body)
+    assert (name, n) == ("A-VERY-LONG", 3)   # NUL-terminated in 12 bytes
+    assert body.endswith(records)
+    with pytest.raises(ValueError):
+        binary_protocol.bank_slot("X", (1, 0, 0, 0), records * 3)
+
+
+def test_bank_reply_round_trip():
+    line = "OK BANK 1 0000ABCD 00000000"
+    raw = binary_protocol.encode_reply([line], 7)[:-1]
+    op, seq, payload = binary_protocol.decode_frame(raw)
+    assert (op, seq) == (binary_protocol.OP_BANK_REPLY, 7)
+    assert binary_protocol.bank_line(payload) == line
+
+
+@pytest.mark.parametrize("arg", ["1a", "9", "NOBODY", ""])
+def test_profile_bad_argument(arg):
+    st = emulator.FirmwareState(emulator.ProfileBank())
+    assert emulator.handle_line(st, f"PROFILE {arg}".strip()) == ["ERR Unknown profile"]
+
+
+def test_sync_writes_only_changed_slots(emu, link):
+    entries = [("ANN", (1.0, 2.0, 4.0, 6.0), None), None, ("BOB", (1.0, 0.0, 8.0, 10.0), None)]
+    first = link.sync_bank(entries)
+    assert first[0] == "stored" and first[1] == "erased" and first[2] == "stored"
+    again = link.sync_bank(entries)
+    assert again[0] == again[2] == "same" and again[1] == "empty"
+
+    link.select_slot(2)
+    assert emu.state.params()[2] == pytest.approx(8.0)
+    assert link.send("PROFILE ann") == "OK"
+    assert emu.bank.active == 0
+    with pytest.raises(gui.TeensyError):
+        link.send("PROFILE 1a")
@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+import binary_protocol as bp
+
+
+@pytest.mark.parametrize("data", [b"", b"\x00", b"\x00\x00", b"abc", bytes(range(256)), b"\x01" * 600,
+                                  bytes(random.Random(0).randrange(256) for _ in range(1000))])
+def test_cobs_round_trip(data):
+    enc = bp.cobs_encode(data)
+    assert b"\x00" not in enc
+    assert bp.cobs_decode(enc) == data
+
+
+def test_crc16_check_value():
+    assert bp.crc16(b"123456789") == 0x29B1   # CRC-16/CCITT-FALSE
+
+
+def test_frame_round_trip_and_corruption():
+    f = bp.frame(bp.OP_SET, 300, b"\x00\x01\x02")
+    assert f.endswith(b"\x00") and f.count(b"\x00") == 1
+    assert bp.decode_frame(f[:-1]) == (bp.OP_SET, 300 & 0xFF, b"\x00\x01\x02")
+    bad = bytearray(f[:-1])
+    bad[3] ^= 0x40
+    with pytest.raises(ValueError):
+        bp.decode_frame(bytes(bad))
+    with pytest.raises(ValueError):
+        bp.decode_frame(b"\x02\x01")
+
+
+def tokens(line):
+    out = []
+    for x in line.split():
+        try:
+            out.append(float(x))
+        except ValueError:
+            out.append(x)
+    return out
+
+
+@pytest.mark.parametrize("cmd", ["TEST ON", "TEST OFF", "FREQ 1000.0", "LEVEL -42.5", "SET 1.0 3.0 6.0 9.0",
+                                 "TRIAL 1000.0 -30.0 2 900 600", "STATUS", "PROFILE ALICE", "PROFILE 3",
+                                 "BANK", "ERASE 2", "BIN OFF"])
+def test_command_round_trip(cmd):
+    op, seq, payload = bp.decode_frame(bp.encode_command(cmd, 5)[:-1])
+    line, extra = bp.decode_command(op, payload)
+    assert seq == 5 and extra == b""
+    assert tokens(line) == tokens(cmd)
+
+
+def test_coef_command_keeps_records_and_checksum():
+    records = bytes(range(44))
+    ascii_payload = records + bytes([sum(records) & 0xFF])
+    op, _, payload = bp.decode_frame(bp.encode_command("COEF 1.000 2.0 3.0 4.0 2", 1, ascii_payload)[:-1])
+    line, extra = bp.decode_command(op, payload)
+    assert line.split()[-1] == "2"
+    assert extra == ascii_payload
+
+
+def test_command_without_binary_form():
+    with pytest.raises(ValueError):
+        bp.encode_command("CAPS", 1)
+    with pytest.raises(ValueError):
+        bp.encode_command("FREQ abc", 1)
+    with pytest.raises(ValueError):
+        bp.decode_command(0x7E, b"")
+
+
+def test_replies():
+    assert bp.decode_frame(bp.encode_reply(["OK"], 9)[:-1]) == (bp.OP_OK, 9, b"")
+    assert bp.decode_frame(bp.encode_reply(["ERR Unknown profile"], 9)[:-1]) == (bp.OP_ERR, 9, b"Unknown profile")
+    status = ["STATUS", "GAIN 1.000", "EQ500 2.00", "EQ2000 3.00", "EQ4000 4.00", "END"]
+    op, _, payload = bp.decode_frame(bp.encode_reply(status, 9)[:-1])
+    assert op == bp.OP_STATUS_REPLY
+    assert bp.status_dict(payload) == {"GAIN": 1.0, "EQ500": 2.0, "EQ2000": 3.0, "EQ4000": 4.0}
+    assert bp.decode_frame(bp.encode_reply(["DONE"], 9)[:-1])[:2] == (bp.OP_DONE, 0)
@@ -0,0 +1,34 @@
+import os, subprocess, sys
+
+import numpy as np
+import pytest
+
+import offline_dsp
+
+
+def test_payload_records_and_checksum():
+    data = offline_dsp.coef_payload(3.0, 6.0, 9.0)
+    records, checksum = data[:-1], data[-1]
+    assert len(records) == 3 * offline_dsp.COEF_RECORD.size
+    assert checksum == sum(records) & 0xFF
+    sos = offline_dsp.eq_sos(3.0, 6.0, 9.0)
+    for i, (f, st, *c) in enumerate(offline_dsp.COEF_RECORD.iter_unpack(records)):
+        assert (f, st) == (i, 0)
+        expect = np.r_[sos[i, 0:3], -sos[i, 4:6]]
+        assert np.allclose(np.array(c) / offline_dsp.Q30, expect, atol=1e-9)
+
+
+def test_payload_rounds_like_the_command_header():
+    assert offline_dsp.coef_payload(3.04, 6.0, 9.0) == offline_dsp.coef_payload(3.0, 6.0, 9.0)
+
+
+def test_gain_beyond_q30_range_overflows():
+    with pytest.raises(OverflowError):
+        offline_dsp.coef_payload(0.0, 0.0, 30.0)
+
+
+def test_packing_does_not_import_scipy():
+    code = "import sys, offline_dsp; offline_dsp.coef_payload(1, 2, 3); print('scipy' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(offline_dsp.__file__)), check=True)
+    assert out.stdout.strip() == "False"
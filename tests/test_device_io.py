@@ -0,0 +1,66 @@
+import threading, time
+
+import pytest
+
+import gui
+
+
+class FakeRoot:
+    """Tk root whose after() runs the callback at once, recording that it went through after()."""
+
+    def __init__(self):
+        self.calls = []
+
+    def after(self, ms, fn):
+        self.calls.append(ms)
+        fn()
+
+
+@pytest.fixture
+def io_root():
+    root = FakeRoot()
+    io = gui.DeviceIO(lambda fn: root.after(0, fn))   # what App._ui does
+    yield io, root
+    io.shutdown()
+
+
+def test_runs_in_order_on_one_worker_thread(io_root):
+    io, _ = io_root
+    ran = []
+
+    def op(i):
+        time.sleep(0.005 * (i % 3))   # uneven durations must not reorder anything
+        ran.append((i, threading.current_thread()))
+
+    futs = [io.submit(op, i) for i in range(20)]
+    io.call(lambda: None)
+    assert all(f.done() for f in futs)
+    assert [i for i, _ in ran] == list(range(20))
+    threads = {t for _, t in ran}
+    assert len(threads) == 1
+    t = threads.pop()
+    assert t is not threading.current_thread()
+    assert t.name.startswith("teensy-io")
+
+
+def test_callbacks_go_through_root_after(io_root):
+    io, root = io_root
+    done, errors = [], []
+
+    def fail():
+        raise gui.TeensyError("ERR nope")
+
+    io.submit(lambda x: x * 2, 21, on_done=done.append, on_error=errors.append)
+    io.submit(fail, on_done=done.append, on_error=errors.append)
+    io.call(lambda: None)   # done callbacks run on the worker before its next item
+    assert done == [42]
+    assert [str(e) for e in errors] == ["ERR nope"]
+    assert root.calls == [0, 0]
+
+
+def test_call_returns_and_raises(io_root):
+    io, root = io_root
+    assert io.call(lambda a, b=0: a + b, 1, b=2) == 3
+    with pytest.raises(ZeroDivisionError):
+        io.call(lambda: 1 / 0)
+    assert root.calls == []   # call() hands results back directly, not via the Tk loop
@@ -0,0 +1,48 @@
+import pytest
+
+import gui
+
+
+def pending(cmd, acquired, written, flushed, t0=0.0):
+    p = gui._Pending(cmd)
+    p.t_submit, p.t_acquired, p.t_written, p.t_flushed = t0, t0 + acquired, t0 + written, t0 + flushed
+    return p
+
+
+def record_total(tracer, cmd, total_ms, ok=True):
+    tracer.record(pending(cmd, 0.0, 0.0, 0.0), ok, total_ms / 1e3)
+
+
+def test_rolling_percentiles():
+    tracer = gui.LatencyTracer(window=50)
+    for ms in range(1, 101):
+        record_total(tracer, "FREQ 1000", float(ms))
+    record_total(tracer, "level -20.0", 3.0)
+    st = tracer.stats()
+    assert list(st) == ["FREQ", "LEVEL"]
+    n, p50, p95, p99 = st["FREQ"]
+    assert n == 50   # only the last 50 commands: 51..100 ms
+    assert (p50, p95, p99) == pytest.approx((76.0, 98.0, 100.0))
+    assert st["LEVEL"] == pytest.approx((1, 3.0, 3.0, 3.0))
+
+
+def test_histogram_buckets():
+    tracer = gui.LatencyTracer()
+    for ms in (0.5, 1.5, 3.0, 3.5, 7.0, 60.0, 250.0):
+        record_total(tracer, "SET 1.0 0.0 0.0 0.0", ms)
+    # edges 1/2/5/10/20/50 ms, the last bucket is everything above 50 ms
+    assert tracer.histogram() == {"SET": [1, 1, 2, 1, 0, 0, 2]}
+    tracer.reset()
+    assert tracer.histogram() == {} and tracer.stats() == {}
+
+
+def test_breakdown_and_export(tmp_path):
+    tracer = gui.LatencyTracer()
+    tracer.record(pending("STATUS", 0.001, 0.003, 0.004), True, 0.010)
+    tracer.record(pending("STATUS", 0.003, 0.005, 0.006), False, 0.012)
+    assert tracer.breakdown()["STATUS"] == pytest.approx((2.0, 2.0, 1.0, 6.0))
+    path = tmp_path / "lat.csv"
+    tracer.export_csv(str(path))
+    lines = path.read_text().splitlines()
+    assert lines[0].split(",") == list(gui.LatencyTracer.FIELDS)
+    assert len(lines) == 3
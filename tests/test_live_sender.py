@@ -0,0 +1,64 @@
+import time
+
+import gui
+
+
+def wait_for(cond, timeout=2.0):
+    t_end = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > t_end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def eq_commands(emu):
+    return [line for _, line in emu.commands if line.split(" ", 1)[0] in ("SET", "COEF")]
+
+
+def test_latest_value_wins_and_repeats_are_skipped(emu, link):
+    sender = gui.LiveEqSender(link, rate_hz=20)
+    try:
+        for g in range(10):
+            sender.update(g500=float(g), g2000=0.0, g4000=0.0, gain_global=1.0)
+        assert wait_for(lambda: emu.state.g500 == 9.0)
+        n = len(eq_commands(emu))
+        assert n < 10
+        sender.update(g500=9.0, g2000=0.0, g4000=0.0, gain_global=1.0)
+        time.sleep(0.2)
+        assert len(eq_commands(emu)) == n
+    finally:
+        sender.close()
+
+
+def test_reset_sends_the_same_value_again(emu, link):
+    sender = gui.LiveEqSender(link, rate_hz=50)
+    try:
+        p = dict(g500=3.0, g2000=0.0, g4000=0.0, gain_global=1.0)
+        sender.update(**p)
+        assert wait_for(lambda: emu.state.g500 == 3.0)
+        emu.state.apply(1.0, 0.0, 0.0, 0.0)   # the board lost its state (replug)
+        sender.reset()
+        assert wait_for(lambda: emu.state.g500 == 3.0)
+    finally:
+        sender.close()
+
+
+def test_close_stops_the_thread(link):
+    sender = gui.LiveEqSender(link)
+    sender.update(g500=1.0, g2000=0.0, g4000=0.0, gain_global=1.0)
+    sender.close()
+    sender._thread.join(timeout=1.0)
+    assert not sender._thread.is_alive()
+
+
+def test_update_while_disconnected_is_sent_after_connect(emu, link):
+    sender = gui.LiveEqSender(link, rate_hz=50)
+    try:
+        link.close()
+        sender.update(g500=5.0, g2000=0.0, g4000=0.0, gain_global=1.0)
+        time.sleep(0.1)
+        link.connect(emu.port)
+        assert wait_for(lambda: emu.state.g500 == 5.0)
+    finally:
+        sender.close()
@@ -0,0 +1,55 @@
+import pytest
+
+import emulator
+import gui
+
+
+THRESHOLDS = {250: -60, 500: -58, 1000: -55, 2000: -45, 4000: -35, 8000: -30}
+
+
+def test_station_applies_nband_eq():
+    bands, _ = gui.fit_nband_eq(gui.target_gains_from_thresholds(THRESHOLDS))
+    emus = [emulator.TeensyEmulator() for _ in range(2)]
+    for e in emus:
+        e.start()
+    dm = gui.DeviceManager()
+    try:
+        ports = [e.port for e in emus]
+        assert all(ok for ok, _, _ in dm.open(ports).values())
+        g500, g2000, g4000 = gui.band_summary(bands)
+        res = dm.apply_eq(g500, g2000, g4000, gain_global=1.0, bands=bands, ports=ports)
+        assert all(ok for ok, _, _ in res.values()), res
+        for e in emus:
+            assert len(e.state.coefs) == len(gui.FREQS)
+            assert e.state.g2000 == pytest.approx(g2000, abs=0.05)
+    finally:
+        dm.shutdown()
+        for e in emus:
+            e.stop()
+
+
+def test_fit_error_is_measured_between_the_outer_bands():
+    import numpy as np
+    import offline_dsp
+    gains, err = offline_dsp.fit_nband(gui.FREQS, [25.0] * len(gui.FREQS))
+    at_freqs = offline_dsp.section_response_db(offline_dsp.nband_sos(gui.FREQS, gains),
+                                               np.array(gui.FREQS, dtype=float)).sum(axis=0)
+    assert np.all(np.abs(at_freqs - 25.0) < 3.0)
+    assert err < 3.0   # extrapolated edges no longer count
+
+
+def test_flat_target_fits_near_flat_gains():
+    import numpy as np
+    import offline_dsp
+    gains, err = offline_dsp.fit_nband(gui.FREQS, [25.0] * len(gui.FREQS))
+    assert np.ptp(gains) < 6.0   # within +-3 dB; the denser 2-8 kHz bands sit a little lower
+    assert err < 2.0
+
+
+def test_nband_payload_layout():
+    import offline_dsp
+    bands, _ = gui.fit_nband_eq(gui.target_gains_from_thresholds(THRESHOLDS))
+    data = offline_dsp.nband_coef_payload(gui.FREQS, bands)
+    records = [r[:2] for r in offline_dsp.COEF_RECORD.iter_unpack(data[:-1])]
+    assert records == [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2), (2, 0), (2, 1)]
+    assert data[-1] == sum(data[:-1]) & 0xFF
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from scipy.signal import sosfilt, sosfreqz
+
+import offline_dsp
+
+PARAMS = (1.5, 6.0, -3.0, 12.0)   # gain_global, g500, g2000, g4000
+
+
+def test_render_matches_sosfilt():
+    rng = np.random.default_rng(0)
+    x = 0.05 * rng.standard_normal((10000, 2))   # quiet enough that no stage saturates
+    gain, g500, g2000, g4000 = PARAMS
+    expect = sosfilt(offline_dsp.eq_sos(g500, g2000, g4000), gain * x, axis=0)
+    for saturate in (False, True):
+        y = offline_dsp.render(x, *PARAMS, block_size=777, saturate=saturate)   # state carried across blocks
+        assert np.allclose(y, expect, rtol=0, atol=1e-12)
+
+
+def test_render_saturates_every_stage():
+    y = offline_dsp.render(np.full(2000, 0.9), 4.0, 0.0, 0.0, 20.0)
+    assert np.abs(y).max() <= 1.0
+
+
+def test_response_matches_sosfreqz():
+    gain, g500, g2000, g4000 = PARAMS
+    _, h = sosfreqz(offline_dsp.eq_sos(g500, g2000, g4000), worN=offline_dsp.RESPONSE_FREQS,
+                    fs=offline_dsp.AUDIO_SAMPLE_RATE_EXACT)
+    expect = 20.0 * np.log10(np.abs(h)) + 20.0 * np.log10(gain)
+    assert np.allclose(offline_dsp.eq_response_db(*PARAMS), expect, rtol=0, atol=1e-9)
+
+
+def test_response_cache_hit():
+    offline_dsp._eq_response_db.cache_clear()
+    first = offline_dsp.eq_response_db(*PARAMS)
+    again = offline_dsp.eq_response_db(1.5, 6.04, -3.0, 12.0)   # same once rounded like the SET command
+    info = offline_dsp._eq_response_db.cache_info()
+    assert (info.misses, info.hits) == (1, 1)
+    assert again is first
+    with pytest.raises(ValueError):
+        first[0] = 0.0   # the cached array is read-only
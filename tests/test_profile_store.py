@@ -0,0 +1,112 @@
+import json, os
+
+import pytest
+
+import offline_dsp
+import profile_db
+
+
+def eq(gain=1.0, g500=0.0, g2000=0.0, g4000=0.0, method="manual sliders"):
+    return {"method": method, "eq": {"GAIN_global": gain, "EQ500_db": g500, "EQ2000_db": g2000, "EQ4000_db": g4000}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = profile_db.SqliteProfileStore(str(tmp_path / "profiles.db"))
+    yield s
+    s.close()
+
+
+def test_versions_and_restore(store):
+    assert store.save("Ann", eq(g4000=10.0), saved_at=100.0) == 1
+    assert store.save("Ann", eq(g4000=20.0), saved_at=200.0) == 2
+    assert store.load("Ann")["eq"]["EQ4000_db"] == 20.0
+    assert store.load("Ann", version=1)["eq"]["EQ4000_db"] == 10.0
+    with pytest.raises(FileNotFoundError):
+        store.load("Ann", version=3)
+
+    assert store.restore("Ann", 1) == 3
+    assert store.summary("Ann")[1][3] == 10.0
+    hist = store.history("Ann")
+    assert [h[0] for h in hist] == [1, 2, 3]
+    assert [h[4][3] for h in hist] == [10.0, 20.0, 10.0]
+    assert hist[0][1] == 100.0 and hist[0][2] == "manual"
+
+
+def test_find_ranges(store):
+    store.save("Ann", eq(g4000=18.0, method="Staircase"), saved_at=100.0)
+    store.save("Bob", eq(g4000=8.0, method="Staircase"), saved_at=200.0)
+    store.save("Cid", eq(g4000=20.0), saved_at=300.0)
+    store.save("Bob", eq(g4000=5.0), saved_at=400.0)   # current Bob: manual, 5 dB
+
+    assert store.find(eq4000_db=(15, None)) == ["Ann", "Cid"]
+    assert store.find(kind="audiogram", eq4000_db=(15, None)) == ["Ann"]
+    assert store.find(eq4000_db=(None, 10)) == ["Bob"]
+    assert store.find(kind="audiogram") == ["Ann"]
+    assert store.find(kind="audiogram", all_versions=True) == ["Ann", "Bob"]
+    assert store.find(saved_at=(150, 350)) == ["Cid"]
+    with pytest.raises(ValueError):
+        store.find(data=(0, 1))
+
+
+def test_delete_drops_history(store):
+    store.save("Ann", eq())
+    store.save("Ann", eq(g500=3.0))
+    store.delete("Ann")
+    assert store.names() == []
+    assert store.history("Ann") == []
+
+
+def test_import_json_once(store, tmp_path):
+    d = tmp_path / "json"
+    d.mkdir()
+    (d / "clara.json").write_text(json.dumps(dict(eq(g2000=6.0), name="Clara B")))
+    (d / "old_one.json").write_text(json.dumps(eq(g500=2.0)))
+    (d / "broken.json").write_text("{")
+    assert store.import_json(str(d)) == 2
+    assert store.names() == ["Clara B", "old one"]
+    assert store.load("Clara B")["eq"]["EQ2000_db"] == 6.0
+    assert store.history("old one")[0][1] == pytest.approx(os.path.getmtime(d / "old_one.json"))
+    assert store.import_json(str(d)) == 0
+    assert store.import_json(str(d), force=True) == 0   # names already there are skipped
+
+
+def test_offline_dsp_loads_saved_profile_by_name(store, monkeypatch):
+    monkeypatch.setattr(profile_db, "_store", store)
+    store.save("Ann", eq(g2000=4.0))
+    store.save("Ann", eq(g2000=9.0))
+    assert offline_dsp.params_from_profile(offline_dsp.load_profile("Ann"))[2] == 9.0
+    assert offline_dsp.params_from_profile(offline_dsp.load_profile("Ann", version=1))[2] == 4.0
+
+
+def test_parsed_cache(store, monkeypatch):
+    store.save("Ann", eq(g4000=10.0))
+    first = store.load("Ann")
+    first["eq"]["EQ4000_db"] = 99.0            # callers get copies
+    parsed = []
+    monkeypatch.setattr(profile_db.json, "loads", lambda s: parsed.append(s) or json.JSONDecoder().decode(s))
+    assert store.load("Ann")["eq"]["EQ4000_db"] == 10.0
+    assert parsed == []                        # served from the LRU
+
+    store.save("Ann", eq(g4000=20.0))
+    assert store.load("Ann")["eq"]["EQ4000_db"] == 20.0
+    assert store.restore("Ann", 1) == 3
+    assert store.load("Ann")["eq"]["EQ4000_db"] == 10.0
+    store.delete("Ann")
+    assert store.names() == []
+    with pytest.raises(FileNotFoundError):
+        store.load("Ann")
+
+
+def test_cache_sees_other_connections(store):
+    store.save("Ann", eq(g4000=10.0))
+    assert store.load("Ann")["eq"]["EQ4000_db"] == 10.0
+    other = profile_db.SqliteProfileStore(store.path)
+    try:
+        other.save("Ann", eq(g4000=20.0))
+        other.save("Bob", eq())
+    finally:
+        other.close()
+    assert store.names() == ["Ann", "Bob"]
+    assert store.load("Ann")["eq"]["EQ4000_db"] == 20.0
+    assert store.summary("Ann")[1][3] == 20.0
@@ -0,0 +1,34 @@
+import numpy as np
+
+import psi_estimator
+from psi_estimator import PsiEstimator
+
+
+def run(true_db, slope=0.5, seed=0):
+    rng = np.random.default_rng(seed)
+    est = PsiEstimator()
+    while not est.done():
+        est.update(rng.random() < psi_estimator.p_correct(est.level_db, true_db, slope))
+    return est
+
+
+def test_sd_rule_stops_before_the_cap():
+    runs = [run(-40.0, seed=s) for s in range(10)]
+    assert all(psi_estimator.PSI_MIN_TRIALS <= e.trials for e in runs)
+    assert any(e.trials < psi_estimator.PSI_MAX_TRIALS for e in runs)
+    for e in runs:
+        if e.trials < psi_estimator.PSI_MAX_TRIALS:
+            assert e.threshold_sd() < psi_estimator.PSI_SD_TARGET
+
+
+def test_threshold_close_to_truth():
+    errs = [run(t, seed=s).threshold() - t for s, t in enumerate((-60.0, -40.0, -20.0) * 4)]
+    assert np.sqrt(np.mean(np.square(errs))) < 8.0
+
+
+def test_levels_stay_on_the_grid():
+    est = PsiEstimator(start_db=-10.0)
+    assert est.level_db == -10.0 or abs(est.level_db + 10.0) <= psi_estimator.PSI_LEVEL_STEP
+    for c in (True, False, True, True):
+        est.update(c)
+        assert est.level_db in est.levels
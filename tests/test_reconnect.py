@@ -0,0 +1,113 @@
+import threading, time
+
+import pytest
+
+import emulator
+import gui
+
+
+@pytest.fixture
+def plug(tmp_path, monkeypatch):
+    """Emulator behind a stable symlink, so unplug()/replug() keep the port name."""
+    monkeypatch.setattr(gui, "RECONNECT_POLL", 0.05)
+    monkeypatch.setattr(gui, "READY_TIMEOUT", 0.5)   # the banner is written before the port is reopened
+    e = emulator.TeensyEmulator(link=str(tmp_path / "ttyTeensy"))
+    e.start()
+    yield e
+    e.stop()
+
+
+@pytest.fixture(params=[False, True], ids=["ascii", "binary"])
+def link(request, plug):
+    link = gui.TeensyLink()
+    link.use_binary = request.param
+    link.states = []
+    link.on_state = lambda state, detail: link.states.append(state)
+    link.connect(plug.port)
+    yield link
+    link.close()
+
+
+def wait_for(cond, timeout=5.0):
+    t_end = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < t_end, "timed out"
+        time.sleep(0.01)
+
+
+def wait_offline(link):
+    wait_for(lambda: not link.online.is_set())
+
+
+def set_state(link):
+    link.apply_eq(2.0, 3.0, 4.0, gain_global=1.5)
+    link.set_test_mode(True)
+    link.set_freq(2000)
+
+
+def assert_restored(link, plug, binary):
+    st = link.status()
+    assert (st["GAIN"], st["EQ500"], st["EQ2000"], st["EQ4000"]) == pytest.approx((1.5, 2.0, 3.0, 4.0))
+    assert plug.state.test_mode
+    assert plug.state.test_freq == 2000
+    assert link.binary == binary
+
+
+def test_unplug_fails_commands_and_replug_restores(plug, link):
+    binary = link.binary
+    set_state(link)
+    trial = link.trial(2000, -20.0, 1, 2.0, 0.1)
+    plug.unplug()
+    wait_offline(link)
+    assert isinstance(trial.exception(timeout=1.0), gui.LinkLost)
+    with pytest.raises(gui.LinkLost):
+        link.send("FREQ 500")
+
+    plug.replug()   # fresh firmware state: flat EQ, TEST off
+    assert link.online.wait(5.0)
+    assert link.states == ["lost", "reconnected"]
+    assert_restored(link, plug, binary)
+
+
+def test_ready_banner_resets_and_restores(plug, link):
+    binary = link.binary
+    set_state(link)
+    # the firmware reboots without the port going away
+    plug.state = emulator.FirmwareState(plug.bank)
+    plug._write_lines(["READY"])
+    wait_for(lambda: "reconnected" in link.states)   # may be offline only briefly
+    assert link.online.is_set()
+    assert link.states == ["lost", "reconnected"]
+    assert_restored(link, plug, binary)
+
+
+class Worker:
+    """The audiogram worker's resume logic, without the Tk window."""
+    _resumable = gui.App._resumable
+    _await_link = gui.App._await_link
+
+    def __init__(self, link):
+        self.link = link
+        self.stop_event = threading.Event()
+        self.current_freq = 1000
+        self._next_start = 0.0
+        self._ui = lambda fn: None
+
+
+def test_worker_resumes_after_replug(plug, link):
+    worker = Worker(link)
+    plug.unplug()
+    wait_offline(link)
+    threading.Timer(0.3, plug.replug).start()
+    worker._resumable(link.set_freq, 500)
+    assert plug.state.test_freq == 500
+    assert worker._next_start > 0.0   # the outage does not count as trial lateness
+
+
+def test_worker_stop_ends_the_wait(plug, link):
+    worker = Worker(link)
+    plug.unplug()
+    wait_offline(link)
+    worker.stop_event.set()
+    with pytest.raises(gui.LinkLost):
+        worker._resumable(link.set_freq, 500)
@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pytest
+
+import gui
+import psi_estimator
+import replay
+
+
+def record_session(path, method, interleave, tracks, seed=0):
+    """A simulated audiogram, logged the way the GUI worker logs it."""
+    rng = np.random.default_rng(seed)
+    true = {f: -60.0 + 4.0 * i for i, f in enumerate(gui.FREQS)}
+    rec = gui.SessionRecorder(str(path), method, interleave, tracks)
+    sched = gui.TrackScheduler(method=method, interleave=interleave, tracks_per_freq=tracks)
+    results = {}
+    while not sched.done():
+        t = sched.next_track()
+        level = t.est.level_db
+        correct = bool(rng.random() < psi_estimator.p_correct(level, true[t.freq], 0.3))
+        t.est.update(correct)
+        rec.trial(freq=t.freq, track=sched.tracks[t.freq].index(t), level_db=level, correct=correct)
+        r = sched.trial_done(t)
+        if r is not None:
+            results[t.freq] = r
+    rec.close(completed=True, thresholds_db_rel={str(k): float(v) for k, v in results.items()})
+    return results
+
+
+@pytest.mark.parametrize("method,interleave,tracks", [
+    (gui.METHOD_STAIRCASE, False, 1),
+    (gui.METHOD_STAIRCASE, True, 2),
+    (gui.METHOD_PSI, True, 1),
+])
+def test_replay_reproduces_the_session(tmp_path, method, interleave, tracks):
+    path = tmp_path / "s.jsonl"
+    logged = record_session(path, method, interleave, tracks)
+    res = replay.replay(str(path))
+    assert res["logged_share"] == 1.0
+    assert res["logged"] == pytest.approx(logged)
+    assert {f: float(v[0]) for f, v in res["thresholds"].items()} == pytest.approx(logged)
+
+
+def test_changed_parameters_use_the_fitted_listener(tmp_path, monkeypatch):
+    for k in gui.SESSION_PARAMS:
+        monkeypatch.setattr(gui, k, getattr(gui, k))   # replay overrides module constants
+    path = tmp_path / "s.jsonl"
+    record_session(path, gui.METHOD_STAIRCASE, False, 1)
+    res = replay.replay(str(path), overrides={"STEP_SMALL": 1.0}, reps=3)
+    assert res["logged_share"] < 1.0
+    assert set(res["thresholds"]) == set(gui.FREQS)
+
+
+def test_parameters_do_not_leak_between_sessions(tmp_path, monkeypatch):
+    default, step = gui.AVG_LAST_REVERSALS, gui.STEP_SMALL
+    a, b = tmp_path / "a.jsonl", tmp_path / "b.jsonl"
+    monkeypatch.setattr(gui, "AVG_LAST_REVERSALS", default + 2)
+    record_session(a, gui.METHOD_STAIRCASE, False, 1)
+    monkeypatch.undo()
+    logged_b = record_session(b, gui.METHOD_STAIRCASE, False, 1, seed=1)
+    # an older log that did not record this parameter
+    lines = b.read_text().splitlines()
+    header = json.loads(lines[0])
+    del header["params"]["AVG_LAST_REVERSALS"]
+    b.write_text("\n".join([json.dumps(header)] + lines[1:]) + "\n")
+
+    replay.replay(str(a), overrides={"STEP_SMALL": 1.0})
+    assert (gui.AVG_LAST_REVERSALS, gui.STEP_SMALL) == (default, step)   # restored, also the --set one
+    res = replay.replay(str(b))
+    assert res["logged_share"] == 1.0
+    assert {f: float(v[0]) for f, v in res["thresholds"].items()} == pytest.approx(logged_b)
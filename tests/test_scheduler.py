@@ -0,0 +1,47 @@
+import pytest
+
+import gui
+
+
+TRUE = {f: -70.0 + 5.0 * i for i, f in enumerate(gui.FREQS)}
+
+
+def run(sched):
+    order, results = [], {}
+    while not sched.done():
+        t = sched.next_track()
+        order.append(t.freq)
+        t.est.update(t.est.level_db > TRUE[t.freq])   # ideal listener
+        r = sched.trial_done(t)
+        if r is not None:
+            results[t.freq] = r
+        assert len(order) < 10000
+    return order, results
+
+
+@pytest.mark.parametrize("method", list(gui.METHODS))
+def test_sequential_runs_frequencies_in_order(method):
+    order, results = run(gui.TrackScheduler(method=method))
+    blocks = [f for i, f in enumerate(order) if i == 0 or order[i - 1] != f]
+    assert blocks == gui.FREQS   # one block of trials per frequency
+    assert set(results) == set(gui.FREQS)
+    for f, thr in results.items():
+        assert abs(thr - TRUE[f]) < 6.0
+
+
+@pytest.mark.parametrize("tracks", [1, 2])
+def test_interleaved_avoids_repeats_and_finishes(tracks):
+    sched = gui.TrackScheduler(interleave=True, tracks_per_freq=tracks)
+    order, results = run(sched)
+    repeats = sum(a == b for a, b in zip(order, order[1:]))
+    assert repeats <= len(gui.FREQS) * tracks   # only when one track is left
+    assert set(results) == set(gui.FREQS)
+    assert sched.finished_count() == len(gui.FREQS)
+
+
+def test_dual_track_threshold_is_the_mean():
+    sched = gui.TrackScheduler(freqs=[1000], tracks_per_freq=2)
+    _, results = run(sched)
+    thrs = [t.est.threshold() for t in sched.tracks[1000]]
+    assert results[1000] == pytest.approx(sum(thrs) / 2)
+    assert sched.tracks[1000][1].trials > 0
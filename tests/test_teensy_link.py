@@ -0,0 +1,110 @@
+import threading, time
+
+import pytest
+
+import gui
+
+
+def test_replies_match_pipelined_commands(link):
+    futs = [link.submit(f"FREQ {hz}") for hz in (250, 500, 1000)] + [link.submit("STATUS")]
+    res = link.wait_all(futs)
+    assert res[:3] == ["OK"] * 3
+    assert res[3]["GAIN"] == pytest.approx(1.0)
+
+
+def test_err_reply(link):
+    with pytest.raises(gui.TeensyError):
+        link.send("PROFILE NOBODY")
+    assert link.send("FREQ 1000") == "OK"
+
+
+def test_lost_reply_frees_slot_and_resyncs(emu, link):
+    # more lost replies than window slots: each timeout must give its slot back
+    for _ in range(gui.MAX_IN_FLIGHT + 1):
+        emu.drop_replies = 1
+        with pytest.raises(TimeoutError):
+            link.send("FREQ 500", timeout=0.2)
+    assert not link._pending
+    assert link.send("FREQ 1000") == "OK"
+    link.apply_eq(1.0, 2.0, 3.0)
+    assert link.status()["EQ4000"] == pytest.approx(3.0)
+
+
+def test_late_reply_does_not_shift_later_replies(emu, link):
+    emu.cmd_latency = {"FREQ": 0.4}
+    with pytest.raises(TimeoutError):
+        link.send("FREQ 500", timeout=0.1)
+    emu.cmd_latency = {}
+    st = link.status()   # the late OK must not be taken as this reply
+    assert st["GAIN"] == pytest.approx(1.0)
+    with pytest.raises(gui.TeensyError):
+        link.send("PROFILE NOBODY")
+
+
+def test_lost_status_reply_in_pipeline(emu, link):
+    emu.drop_replies = 1
+    futs = [link.submit("STATUS"), link.submit("FREQ 500")]
+    with pytest.raises(TimeoutError):
+        link.wait_all(futs, timeout=0.2)
+    if link.binary:
+        assert futs[1].result(timeout=0) == "OK"
+    else:
+        # the END owed by the lost STATUS never comes: the second marker resyncs
+        with pytest.raises(TimeoutError):
+            futs[1].result(timeout=0)
+    assert link.online.is_set()
+    assert link.send("SET 1.0 1.0 2.0 3.0") == "OK"
+    assert link.status()["EQ2000"] == pytest.approx(2.0)
+
+
+def test_lost_marker_reply_retries_without_reconnect(emu, link):
+    # the FREQ reply, and in ASCII mode the first resync marker's
+    emu.drop_replies = 1 if link.binary else 2
+    with pytest.raises(TimeoutError):
+        link.send("FREQ 500", timeout=0.2)
+    assert link.online.is_set()
+    assert link.send("FREQ 1000") == "OK"
+    assert link.status()["GAIN"] == pytest.approx(1.0)
+
+
+def test_writers_not_blocked_by_resync(emu, link):
+    if link.binary:
+        pytest.skip("binary replies carry their seq, no resync")
+    emu.drop_replies = 1
+    emu.cmd_latency = {"STATUS": 0.5}
+    expired = threading.Thread(target=lambda: pytest.raises(TimeoutError, link.send, "FREQ 500", timeout=0.2))
+    expired.start()
+    time.sleep(0.4)   # now waiting for the marker's END
+    t0 = time.monotonic()
+    fut = link.submit("FREQ 1000")
+    assert time.monotonic() - t0 < 0.1
+    expired.join()
+    assert fut.result(timeout=gui.CMD_TIMEOUT) == "OK"
+
+
+def test_trial_resolves_on_done(emu, link):
+    done = link.trial(1000, -20.0, 2, 0.05, 0.02)
+    assert done.result(timeout=1.0) == "DONE"
+    assert not emu.state.trial_running
+    assert link.test_freq == 1000
+    assert link._trial_done is None
+
+
+def test_cancel_trial_ignores_the_late_done(emu, link):
+    done = link.trial(1000, -20.0, 1, 0.2, 0.1)
+    link.cancel_trial()
+    assert done.cancelled()
+    time.sleep(0.7)   # the firmware still plays and prints DONE
+    assert not emu.state.trial_running
+    assert link.send("FREQ 500") == "OK"
+    nxt = link.trial(500, -20.0, 1, 0.05, 0.02)
+    assert nxt.result(timeout=1.0) == "DONE"
+
+
+def test_failed_trial_clears_its_future(emu, link):
+    emu.drop_replies = 1   # the TRIAL ran, but its OK is lost
+    with pytest.raises(TimeoutError):
+        link.trial(1000, -20.0, 1, 2.0, 0.1)
+    assert link._trial_done is None   # before that trial's DONE comes in
+    link.set_level_db(-90.0)          # silences it, as Stop does
+    assert not emu.state.trial_running
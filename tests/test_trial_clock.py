@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+import gui
+
+
+class FakeTime:
+    """Clock + stop event + sleep: wait(dt) advances the clock by dt plus a fixed oversleep."""
+
+    def __init__(self, oversleep=0.0):
+        self.now = 100.0
+        self.oversleep = oversleep
+        self.stopped = False
+        self.waits = []
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def wait(self, dt):
+        self.waits.append(dt)
+        self.now += dt + self.oversleep
+        return self.stopped
+
+    def sleep(self, dt):
+        self.sleeps.append(dt)
+        self.now += dt
+
+    def is_set(self):
+        return self.stopped
+
+
+def test_wait_until_sleeps_not_spins():
+    ft = FakeTime(oversleep=0.003)
+    clock = gui.TrialClock(ft, clock=ft, sleep=ft.sleep)
+    assert clock.wait_until(100.5)
+    assert len(ft.waits) == 1   # one Event.wait, no polling loop
+    assert ft.sleeps == []      # overslept past the deadline, nothing left to sleep
+    assert ft.waits[0] == pytest.approx(0.5 - gui.TIMING_MARGIN_S)
+    assert clock.errors["wake"] == [pytest.approx(0.003 - gui.TIMING_MARGIN_S)]
+
+
+def test_deadline_errors_and_lead():
+    ft = FakeTime()
+    clock = gui.TrialClock(ft, clock=ft, sleep=ft.sleep)
+
+    def command():   # acted on halfway through a 10 ms round trip
+        ft.now += 0.010
+        return "OK"
+
+    for i in range(1, 31):
+        t, res = clock.at(100.0 + i, "tone_on", command)
+        assert res == "OK"
+    # the write-to-act delay (5 ms) is learned and sent ahead of the deadline
+    assert clock.lead == pytest.approx(0.005, abs=1e-4)
+    # one Event.wait and one short sleep per deadline
+    assert len(ft.waits) == 30
+    assert ft.sleeps == [pytest.approx(gui.TIMING_MARGIN_S)] * 30
+    errors = clock.errors["tone_on"]
+    assert errors[0] == pytest.approx(0.005)
+    assert abs(errors[-1]) < 1e-4
+    st = clock.stats()["tone_on"]
+    assert st["n"] == 30
+    assert st["max_ms"] == pytest.approx(5.0)
+    assert 0.0 < st["mean_ms"] < 5.0
+
+
+def test_stop_interrupts_wait():
+    stop = threading.Event()
+    stop.set()
+    clock = gui.TrialClock(stop)
+    assert clock.at(gui.time.monotonic() + 10.0, "tone_on", lambda: "OK") is None
+    assert "tone_on" not in clock.errors